@@ -0,0 +1,113 @@
+# core/bench_gitignore.py
+# Микробенчмарк пропускной способности gitignore-матчера.
+# Запуск из корня проекта: python core/bench_gitignore.py [--paths 200000] [--rules 60]
+import argparse
+import random
+import sys
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.vendor.gitignore_parser import Matcher
+
+_DIR_NAMES = ["src", "lib", "build", "dist", "node_modules", "tests", "docs", "pkg", "vendor", "gen", "cache", "assets"]
+_FILE_STEMS = ["main", "util", "index", "config", "readme", "data", "model", "view", "test_app", "setup"]
+_EXTENSIONS = [".py", ".js", ".ts", ".log", ".tmp", ".json", ".md", ".min.js", ".pyc", ".txt", ".o"]
+
+def generate_synthetic_rules(rule_count, seed=0):
+    """Mix of the rule shapes real projects use: names, extensions, anchored paths, '**', negations."""
+    rng = random.Random(seed)
+    rules = []
+    while len(rules) < rule_count:
+        kind = rng.randrange(8)
+        d, d2 = rng.choice(_DIR_NAMES), rng.choice(_DIR_NAMES)
+        stem, ext = rng.choice(_FILE_STEMS), rng.choice(_EXTENSIONS)
+        if kind == 0:
+            rules.append(f"*{ext}")
+        elif kind == 1:
+            rules.append(f"{d}/")
+        elif kind == 2:
+            rules.append(f"/{d}/{stem}{ext}")
+        elif kind == 3:
+            rules.append(f"**/{d}/*{ext}")
+        elif kind == 4:
+            rules.append(f"{d}/**/{stem}*")
+        elif kind == 5:
+            rules.append(f"!{stem}{ext}")
+        elif kind == 6:
+            rules.append(f"{stem}?{ext}")
+        else:
+            rules.append(f"{d}/[a-m]*{ext}")
+    return rules
+
+def generate_synthetic_paths(path_count, seed=0, max_depth=6):
+    """Returns [(relative_posix_path, is_dir)] that look like a project tree."""
+    rng = random.Random(seed)
+    paths = []
+    while len(paths) < path_count:
+        depth = rng.randint(0, max_depth)
+        parts = [rng.choice(_DIR_NAMES) + (str(rng.randrange(3)) if rng.random() < 0.3 else "") for _ in range(depth)]
+        if rng.random() < 0.2 and parts:
+            paths.append(("/".join(parts), True))
+        else:
+            parts.append(rng.choice(_FILE_STEMS) + str(rng.randrange(5)) + rng.choice(_EXTENSIONS))
+            paths.append(("/".join(parts), False))
+    return paths
+
+def fnmatch_baseline(rules, relative_path_posix, is_dir):
+    """The previous algorithm: fnmatch of every rule against every path part."""
+    parts = relative_path_posix.split('/')
+    ignored = False
+    for line in rules:
+        negation = line.startswith('!')
+        pattern = line[1:] if negation else line
+        dir_only = pattern.endswith('/')
+        if dir_only and not is_dir:
+            continue
+        pattern = pattern.strip('/')
+        if '/' in pattern:
+            hit = fnmatch(relative_path_posix, pattern)
+        else:
+            hit = any(fnmatch(part, pattern) for part in parts)
+        if hit:
+            ignored = not negation
+    return ignored
+
+def _measure(label, func, paths, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for rel_path, is_dir in paths:
+            func(rel_path, is_dir)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rate = len(paths) / best if best else float('inf')
+    print(f"{label:<32} {rate:>14,.0f} путей/с  ({best * 1000:.1f} мс на {len(paths)} путей)")
+    return rate
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пропускная способность gitignore-матчера.")
+    parser.add_argument("--paths", type=int, default=200000)
+    parser.add_argument("--rules", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rules = generate_synthetic_rules(args.rules, args.seed)
+    paths = generate_synthetic_paths(args.paths, args.seed)
+
+    start = time.perf_counter()
+    matcher = Matcher(rules, ".")
+    print(f"Компиляция {len(rules)} правил: {(time.perf_counter() - start) * 1000:.2f} мс")
+
+    compiled_rate = _measure("Matcher.match (одно имя)", matcher.match, paths, args.repeat)
+    _measure("Matcher.is_ignored (весь путь)", matcher.is_ignored, paths, args.repeat)
+    baseline_paths = paths[:max(1, len(paths) // 10)]
+    baseline_rate = _measure("fnmatch по правилам (прежний)", lambda p, d: fnmatch_baseline(rules, p, d), baseline_paths, 1)
+    print(f"Ускорение match относительно fnmatch: x{compiled_rate / baseline_rate:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# core/bench_tokenizers.py
+# Сравнение скорости бэкендов токенизатора (токенов/с) на файлах проекта.
+# Запуск из корня проекта: python core/bench_tokenizers.py [--path каталог] [--repeat 3]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.file_processing import TOKENIZER_BACKENDS, create_tokenizer_backend
+from core.content_sniffer import read_text_file
+
+_SAMPLE_SUFFIXES = {".py", ".md", ".json", ".txt", ".js", ".ts", ".html", ".css"}
+
+def collect_sample_texts(root_dir, limit_bytes):
+    """Text files under root_dir (sorted, so runs are comparable) up to roughly limit_bytes."""
+    texts, total = [], 0
+    for path in sorted(Path(root_dir).rglob("*")):
+        if total >= limit_bytes:
+            break
+        if path.suffix.lower() not in _SAMPLE_SUFFIXES or not path.is_file():
+            continue
+        if any(part.startswith('.') or part == "__pycache__" for part in path.parts):
+            continue
+        content = read_text_file(str(path))
+        if content:
+            texts.append(content)
+            total += len(content.encode('utf-8'))
+    return texts, total
+
+def _measure(backend, texts, total_bytes, repeat):
+    """First pass is reported separately: the bundled backend memoises pieces, so later passes are warm."""
+    timings, token_count = [], 0
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        token_count = sum(backend.count_tokens(text) for text in texts)
+        timings.append(time.perf_counter() - start)
+    cold, warm = timings[0], min(timings)
+    print(
+        f"{backend.name:<10} {token_count / cold:>12,.0f} токенов/с (первый проход)"
+        f" {token_count / warm:>12,.0f} токенов/с (лучший)  {total_bytes / warm / 1e6:>7.2f} МБ/с  ({token_count} токенов)"
+    )
+    return token_count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Скорость бэкендов токенизатора.")
+    parser.add_argument("--path", default=str(Path(__file__).resolve().parent.parent))
+    parser.add_argument("--limit-mb", type=float, default=4.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    texts, total_bytes = collect_sample_texts(args.path, int(args.limit_mb * 1024 * 1024))
+    print(f"Выборка: {len(texts)} файлов, {total_bytes / 1e6:.2f} МБ из '{args.path}'")
+
+    counts = {}
+    for backend_name in TOKENIZER_BACKENDS:
+        start = time.perf_counter()
+        try:
+            backend = create_tokenizer_backend(backend_name)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"{backend_name:<10} недоступен: {e}")
+            continue
+        print(f"{backend_name:<10} загрузка: {(time.perf_counter() - start) * 1000:.0f} мс")
+        counts[backend_name] = _measure(backend, texts, total_bytes, args.repeat)
+
+    if len(set(counts.values())) > 1:
+        print("Внимание: бэкенды дали разное число токенов:", counts)
+
+if __name__ == "__main__":
+    main()
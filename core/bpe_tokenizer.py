@@ -0,0 +1,101 @@
+# core/bpe_tokenizer.py
+# Офлайн byte-level BPE токенизатор GPT-2 на основе словаря слияний (vocab.bpe),
+# который поставляется вместе с приложением. Сеть и transformers не нужны.
+import re
+
+# Оригинальный шаблон предразбиения GPT-2 (\p{..} понимают модуль regex и tiktoken).
+GPT2_SPLIT_PATTERN = r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+# Приближение для стандартного re: буквы = \w без цифр и '_', числа = \d.
+_STDLIB_GPT2_SPLIT_PATTERN = r"""'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+"""
+
+GPT2_END_OF_TEXT_TOKEN = "<|endoftext|>"
+_PIECE_CACHE_LIMIT = 100000
+
+def compile_gpt2_split_regex():
+    """
+    Compiled GPT-2 pre-split pattern and whether it is the exact one; regex is
+    imported here, not at module import. Without it the stdlib approximation is
+    returned, which splits some non-ASCII text differently.
+    """
+    try:
+        import regex
+    except ImportError:
+        return re.compile(_STDLIB_GPT2_SPLIT_PATTERN), False
+    return regex.compile(GPT2_SPLIT_PATTERN), True
+
+def _gpt2_byte_to_unicode():
+    """GPT-2 maps every byte to a printable character so merges can be stored as text."""
+    printable = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    chars = printable[:]
+    extra = 0
+    for b in range(256):
+        if b not in printable:
+            printable.append(b)
+            chars.append(256 + extra)
+            extra += 1
+    return {b: chr(c) for b, c in zip(printable, chars)}
+
+def load_bpe_ranks(vocab_bpe_path):
+    """
+    Reads a GPT-2 vocab.bpe merge list.
+    Returns {token_bytes: rank}: the 256 single bytes first, then one entry per merge
+    in file order (the layout tiktoken calls mergeable_ranks).
+    Raises OSError if the file can't be read and ValueError if it is malformed.
+    """
+    byte_to_unicode = _gpt2_byte_to_unicode()
+    unicode_to_byte = {ch: b for b, ch in byte_to_unicode.items()}
+    ranks = {bytes([b]): rank for rank, b in enumerate(byte_to_unicode)}
+
+    with open(vocab_bpe_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip('\n')
+            if not line or line.startswith('#version'):
+                continue
+            parts = line.split(' ')
+            if len(parts) != 2:
+                raise ValueError(f"{vocab_bpe_path}:{line_no}: ожидалась пара токенов, получено {line!r}")
+            try:
+                merged = bytes(unicode_to_byte[ch] for ch in parts[0] + parts[1])
+            except KeyError:
+                raise ValueError(f"{vocab_bpe_path}:{line_no}: символ вне байтового алфавита GPT-2") from None
+            ranks.setdefault(merged, len(ranks))
+    return ranks
+
+class BytePairEncoder:
+    """
+    Pure-Python byte-level BPE. Only token counts are needed by the app, so pieces
+    are merged but never mapped to ids; results are memoised per pre-split piece,
+    which makes repeated identifiers and whitespace runs nearly free.
+    """
+    def __init__(self, ranks):
+        self._ranks = ranks
+        self._split_regex, self.exact_split = compile_gpt2_split_regex()
+        self._piece_cache = {}
+
+    def _count_piece(self, piece_bytes):
+        parts = [piece_bytes[i:i + 1] for i in range(len(piece_bytes))]
+        ranks = self._ranks
+        while len(parts) > 1:
+            best_rank, best_index = None, -1
+            for i in range(len(parts) - 1):
+                rank = ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank, best_index = rank, i
+            if best_rank is None:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+        return len(parts)
+
+    def count_tokens(self, text):
+        cache = self._piece_cache
+        if len(cache) > _PIECE_CACHE_LIMIT:
+            cache.clear()
+        total = 0
+        for piece in self._split_regex.findall(text):
+            count = cache.get(piece)
+            if count is None:
+                piece_bytes = piece.encode('utf-8')
+                count = 1 if piece_bytes in self._ranks else self._count_piece(piece_bytes)
+                cache[piece] = count
+            total += count
+        return total
@@ -7,6 +7,11 @@ import subprocess
 from pathlib import Path
 from datetime import datetime
 
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.file_processing import BUNDLED_BPE_VOCAB_RELATIVE_PATH
+
 def check_upx():
     """Checks if UPX is available in the system's PATH."""
     return shutil.which("upx") is not None
@@ -43,6 +48,7 @@ def build_executable():
         "--hidden-import=tkinter.ttk",
         "--hidden-import=diff_match_patch",
         "--hidden-import=fnmatch", 
+        "--hidden-import=tiktoken",
         "--hidden-import=transformers",
         "--hidden-import=transformers.models",
         "--hidden-import=transformers.tokenization_utils",
@@ -82,6 +88,15 @@ def build_executable():
     else:
         print(f"Предупреждение: Папка инструкций '{instructions_source_dir}' не найдена. Инструкции не будут включены.")
     
+    bundled_vocab_path = Path(BUNDLED_BPE_VOCAB_RELATIVE_PATH)
+    if bundled_vocab_path.is_file():
+        args.append(f"--add-data={str(bundled_vocab_path.resolve())}{os.pathsep}{bundled_vocab_path.parent.as_posix()}")
+        print(f"Добавление словаря токенизатора: {bundled_vocab_path.as_posix()}")
+    else:
+        # Без словаря у сборки нет офлайн-токенизатора, поэтому собирать ее нельзя.
+        print(f"Ошибка: словарь токенизатора '{bundled_vocab_path.as_posix()}' не найден. Выполните: python core/fetch_tokenizer_vocab.py")
+        sys.exit(1)
+
     if use_upx and check_upx():
         print("UPX найден, будет использован.")
         upx_executable_path = shutil.which("upx")
@@ -0,0 +1,162 @@
+# core/check_gitignore_conformance.py
+# Сверка gitignore-матчера с настоящим git: генерирует синтетические деревья и наборы
+# правил, спрашивает `git check-ignore --stdin -z` и сравнивает ответы с Matcher
+# (только корневой .gitignore) и с GitignoreRules (плюс вложенные .gitignore).
+# Запуск из корня проекта: python core/check_gitignore_conformance.py [--cases 20] [--paths 3000]
+# Код возврата 1, если найдены расхождения.
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.vendor.gitignore_parser import Matcher
+from core.gitignore_rules import GitignoreRules
+from core.bench_gitignore import generate_synthetic_rules, generate_synthetic_paths
+
+# Формы правил, которые синтетический генератор выдает редко или не выдает вовсе.
+EDGE_CASE_RULES = [
+    "/build", "build/", "src/**", "**/cache", "a/**/b", "docs/*.md", "!docs/index.md",
+    "*.min.js", "!keep.min.js", "lib*/", "[!a-f]*.txt", "\\#notes", "\\!bang", "trailing\\ ",
+    "node_modules/", "!node_modules/keep/", "**/gen/*.py", "*.[oa]", "tests/?ata*",
+]
+MAX_REPORTED_MISMATCHES = 20
+
+def _materialize_tree(root_dir, paths):
+    for rel_path, is_dir in paths:
+        target = os.path.join(root_dir, *rel_path.split('/'))
+        if is_dir:
+            os.makedirs(target, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            open(target, 'a').close()
+
+def _unique_existing_paths(root_dir, paths):
+    """Deduplicates and keeps only paths whose kind on disk matches (a dir may also be created as a parent)."""
+    seen = {}
+    for rel_path, is_dir in paths:
+        seen[rel_path] = os.path.isdir(os.path.join(root_dir, *rel_path.split('/')))
+    # Родительские папки тоже проверяем: именно они отсекают поддеревья.
+    for rel_path in list(seen):
+        parts = rel_path.split('/')
+        for depth in range(1, len(parts)):
+            seen.setdefault('/'.join(parts[:depth]), True)
+    return sorted(seen.items())
+
+def git_check_ignore(root_dir, rel_paths):
+    """Returns (set of ignored paths, seconds) according to `git check-ignore --stdin -z`."""
+    payload = b''.join(p.encode('utf-8') + b'\0' for p in rel_paths)
+    start = time.perf_counter()
+    result = subprocess.run(
+        ["git", "-C", root_dir, "check-ignore", "--stdin", "-z", "--no-index"],
+        input=payload, capture_output=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode not in (0, 1):  # 1 - ни один путь не игнорируется
+        raise RuntimeError(f"git check-ignore завершился с кодом {result.returncode}: {result.stderr.decode(errors='replace')}")
+    return {p.decode('utf-8') for p in result.stdout.split(b'\0') if p}, elapsed
+
+def _rules_is_ignored(gitignore_rules, root_dir, rel_path, is_dir):
+    """GitignoreRules answers per entry during a pruned walk; here every parent is checked as the walk would."""
+    parts = rel_path.split('/')
+    for depth in range(1, len(parts) + 1):
+        item_path = os.path.join(root_dir, *parts[:depth])
+        if gitignore_rules(item_path, is_dir if depth == len(parts) else True):
+            return True
+    return False
+
+def _compare(label, expected_ignored, checked_paths, predicate, mismatches):
+    start = time.perf_counter()
+    for rel_path, is_dir in checked_paths:
+        got = predicate(rel_path, is_dir)
+        if got != (rel_path in expected_ignored):
+            mismatches.append((label, rel_path, is_dir, rel_path in expected_ignored, got))
+    return time.perf_counter() - start
+
+def run_case(case_index, path_count, rule_count):
+    rng = random.Random(case_index)
+    rules = generate_synthetic_rules(rule_count, seed=case_index) + rng.sample(EDGE_CASE_RULES, 6)
+    rng.shuffle(rules)
+    paths = generate_synthetic_paths(path_count, seed=case_index)
+    paths += [("#notes", False), ("!bang", False), ("trailing ", False), ("docs/index.md", False), ("x/keep.min.js", False)]
+
+    root_dir = tempfile.mkdtemp(prefix="gitignore_conformance_")
+    try:
+        subprocess.run(["git", "init", "-q", root_dir], check=True)
+        _materialize_tree(root_dir, paths)
+        with open(os.path.join(root_dir, ".gitignore"), 'w', encoding='utf-8') as f:
+            f.write("\n".join(rules) + "\n")
+        checked_paths = _unique_existing_paths(root_dir, paths)
+        rel_paths = [p for p, _ in checked_paths]
+        mismatches = []
+
+        expected, git_seconds = git_check_ignore(root_dir, rel_paths)
+        matcher = Matcher(rules, root_dir)
+        matcher_seconds = _compare("Matcher", expected, checked_paths, matcher.is_ignored, mismatches)
+
+        # Вложенные .gitignore в нескольких случайных папках.
+        dirs = [p for p, is_dir in checked_paths if is_dir]
+        for dir_rel in rng.sample(dirs, min(5, len(dirs))):
+            nested_rules = generate_synthetic_rules(8, seed=case_index * 1000 + len(dir_rel)) + rng.sample(EDGE_CASE_RULES, 2)
+            with open(os.path.join(root_dir, *dir_rel.split('/'), ".gitignore"), 'w', encoding='utf-8') as f:
+                f.write("\n".join(nested_rules) + "\n")
+        expected_nested, nested_git_seconds = git_check_ignore(root_dir, rel_paths)
+        gitignore_rules = GitignoreRules(root_dir)
+        rules_seconds = _compare(
+            "GitignoreRules", expected_nested, checked_paths,
+            lambda p, d: _rules_is_ignored(gitignore_rules, root_dir, p, d), mismatches
+        )
+        return len(checked_paths), mismatches, git_seconds + nested_git_seconds, matcher_seconds, rules_seconds
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сверка gitignore-матчера с git check-ignore.")
+    parser.add_argument("--cases", type=int, default=20)
+    parser.add_argument("--paths", type=int, default=3000)
+    parser.add_argument("--rules", type=int, default=40)
+    args = parser.parse_args(argv)
+
+    if shutil.which("git") is None:
+        print("Ошибка: git не найден в PATH.")
+        return 2
+
+    # Изолируем от пользовательских настроек git (глобальный excludesFile и т.п.).
+    isolated_home = tempfile.mkdtemp(prefix="gitignore_conformance_home_")
+    os.environ.update({"HOME": isolated_home, "XDG_CONFIG_HOME": isolated_home, "GIT_CONFIG_NOSYSTEM": "1"})
+
+    total_paths, all_mismatches = 0, []
+    git_seconds = matcher_seconds = rules_seconds = 0.0
+    try:
+        for case_index in range(args.cases):
+            count, mismatches, case_git, case_matcher, case_rules = run_case(case_index, args.paths, args.rules)
+            total_paths += count
+            all_mismatches.extend((case_index,) + m for m in mismatches)
+            git_seconds += case_git
+            matcher_seconds += case_matcher
+            rules_seconds += case_rules
+    finally:
+        shutil.rmtree(isolated_home, ignore_errors=True)
+
+    print(f"Случаев: {args.cases}, проверено путей: {total_paths}")
+    print(f"git check-ignore:  {2 * total_paths / git_seconds:>12,.0f} путей/с (с учетом запуска процесса)")
+    print(f"Matcher:           {total_paths / matcher_seconds:>12,.0f} путей/с")
+    print(f"GitignoreRules:    {total_paths / rules_seconds:>12,.0f} путей/с")
+    if not all_mismatches:
+        print("Расхождений нет.")
+        return 0
+    print(f"Расхождений: {len(all_mismatches)}")
+    for case_index, label, rel_path, is_dir, expected, got in all_mismatches[:MAX_REPORTED_MISMATCHES]:
+        kind = "папка" if is_dir else "файл"
+        print(f"  [случай {case_index}] {label}: {rel_path!r} ({kind}) git={expected} матчер={got}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,15 +9,11 @@ try:
 except ImportError:
     pyperclip = None
 
-from core.treeview_logic import (
-    generate_project_structure_text, 
-    tree_item_data, tree_item_paths
-)
-from core.treeview_constants import CHECKED_TAG, TRISTATE_TAG
-from core.fs_scanner_utils import DISABLED_LOOK_TAGS_UI
+from core.treeview_logic import generate_project_structure_text, get_checked_file_ids, tree_model
 from core.file_processing import resource_path 
 from core.project_structure_utils import generate_full_project_structure 
-from core.vendor.gitignore_parser import Matcher
+from core.gitignore_rules import GitignoreRules
+from core.content_sniffer import read_text_file
 
 INSTRUCTION_FILE_NAMES = {
     "Markdown": "markdown_method.md",
@@ -88,18 +84,13 @@ def copy_project_files(
             elif selected_structure_type == "all":
                 if log_widget_ref and log_widget_ref.winfo_exists(): log_widget_ref.insert(tk.END, "Генерация структуры проекта (все файлы)...\n", ('info',))
                 
-                current_gitignore_matcher = None
-                project_root_path = Path(project_dir_str)
-                path_to_gitignore_in_project = project_root_path / ".gitignore"
-                if path_to_gitignore_in_project.is_file():
-                    with path_to_gitignore_in_project.open('r', encoding='utf-8') as f_gi:
-                        gi_lines = f_gi.readlines()
-                    base_dir_str = str(path_to_gitignore_in_project.parent.resolve())
-                    current_gitignore_matcher = Matcher(gi_lines, base_dir_str)
-                    if log_widget_ref and log_widget_ref.winfo_exists():
-                        log_widget_ref.insert(tk.END, f"Структура (полная): Используется .gitignore из '{path_to_gitignore_in_project}'.\n", ('info',))
-                elif log_widget_ref and log_widget_ref.winfo_exists():
-                    log_widget_ref.insert(tk.END, f"Структура (полная): Файл .gitignore не найден в '{project_dir_str}'.\n", ('info',))
+                project_root_str = str(Path(project_dir_str).resolve())
+                current_gitignore_matcher = GitignoreRules(
+                    project_root_str,
+                    lambda msg: log_widget_ref.insert(tk.END, f"Структура (полная): {msg}\n", ('warning',)) if log_widget_ref and log_widget_ref.winfo_exists() else None
+                )
+                if log_widget_ref and log_widget_ref.winfo_exists():
+                    log_widget_ref.insert(tk.END, "Структура (полная): Учитываются .gitignore проекта (включая вложенные) и .git/info/exclude.\n", ('info',))
 
                 structure_text_output = generate_full_project_structure(project_dir_str, log_widget_ref, current_gitignore_matcher)
             
@@ -114,38 +105,23 @@ def copy_project_files(
 
     file_blocks = []
     num_files_copied = 0
+    skipped_binary_files = []
     
-    all_item_ids_in_tree = [] 
-    def _collect_all_tree_ids_safe(parent_id_str=""): 
-        if tree_widget.exists(parent_id_str) or parent_id_str == "":
-            for child_id_str in tree_widget.get_children(parent_id_str):
-                if tree_widget.exists(child_id_str): 
-                    all_item_ids_in_tree.append(child_id_str)
-                    _collect_all_tree_ids_safe(child_id_str)
-    
-    _collect_all_tree_ids_safe() 
-
-    for item_id_str_from_tree in all_item_ids_in_tree:
-        if item_id_str_from_tree not in tree_item_data or not tree_item_data[item_id_str_from_tree].get('is_file'):
-            continue 
+    for item_id_str in get_checked_file_ids():
+        # id файла в дереве - его абсолютный путь.
+        abs_file_path_str = item_id_str
+        relative_path_for_display = tree_model.get(item_id_str).rel_path or Path(abs_file_path_str).name
         
-        if not tree_widget.exists(item_id_str_from_tree):
+        file_content_str = read_text_file(abs_file_path_str)
+        if file_content_str is None:
+            skipped_binary_files.append(relative_path_for_display)
             continue
-            
-        current_item_tags_set = set(tree_widget.item(item_id_str_from_tree, 'tags'))
-
-        if CHECKED_TAG in current_item_tags_set and not DISABLED_LOOK_TAGS_UI.intersection(current_item_tags_set):
-            abs_file_path_str = tree_item_paths.get(item_id_str_from_tree) 
-            if not abs_file_path_str: continue 
+        
+        file_blocks.append(f"<<<FILE: {relative_path_for_display}>>>\n{file_content_str}\n<<<END_FILE>>>")
+        num_files_copied += 1
 
-            file_path_obj = Path(abs_file_path_str)
-            relative_path_for_display = tree_item_data[item_id_str_from_tree].get('rel_path', file_path_obj.name)
-            
-            with open(file_path_obj, 'r', encoding='utf-8') as f_content:
-                file_content_str = f_content.read()
-            
-            file_blocks.append(f"<<<FILE: {relative_path_for_display}>>>\n{file_content_str}\n<<<END_FILE>>>")
-            num_files_copied += 1
+    if skipped_binary_files and log_widget_ref and log_widget_ref.winfo_exists():
+        log_widget_ref.insert(tk.END, f"Пропущены бинарные файлы ({len(skipped_binary_files)}): {', '.join(skipped_binary_files)}\n", ('warning',))
 
     if file_blocks: 
         final_text_parts_list.append("\n\n".join(file_blocks))
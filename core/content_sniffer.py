@@ -0,0 +1,121 @@
+# core/content_sniffer.py
+# Определение бинарных файлов и кодировки текста по первым килобайтам содержимого.
+# Вердикт кэшируется по (размер, mtime_ns), поэтому повторные проверки не читают диск;
+# между запусками вердикты хранятся рядом с индексом сканирования (core/scan_index.py).
+import os
+import codecs
+
+SNIFF_BYTES = 8 * 1024
+# Если текст не в UTF-8 и без BOM, считаем его однобайтовой кодировкой Windows.
+LEGACY_TEXT_ENCODING = "cp1251"
+# Доля управляющих байтов, начиная с которой не-UTF-8 содержимое считается бинарным.
+MAX_CONTROL_BYTES_RATIO = 0.05
+
+# UTF-32 проверяется раньше UTF-16: BOM UTF-32-LE начинается с BOM UTF-16-LE.
+_BOM_ENCODINGS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# Управляющие символы, которые встречаются в обычном тексте: \b \t \n \f \r ESC.
+_TEXT_CONTROL_BYTES = frozenset(b"\b\t\n\f\r\x1b")
+_CONTROL_BYTES = bytes(b for b in range(32) if b not in _TEXT_CONTROL_BYTES) + b"\x7f"
+
+_verdict_cache = {}  # path -> (size, mtime_ns, encoding or None)
+# Растет с каждым новым вердиктом: по нему видно, есть ли что сохранять.
+_verdict_generation = 0
+
+def classify_content(head, truncated):
+    """
+    head: the first bytes of a file; truncated: True if the file is longer than head.
+    Returns the text encoding to read the file with, or None for binary content.
+    """
+    for bom, encoding in _BOM_ENCODINGS:
+        if head.startswith(bom):
+            return encoding
+    if b"\0" in head:
+        return None
+    try:
+        # Многобайтовый символ может быть обрезан на границе прочитанного куска.
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=not truncated)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    control_bytes = len(head) - len(head.translate(None, _CONTROL_BYTES))
+    if control_bytes > len(head) * MAX_CONTROL_BYTES_RATIO:
+        return None
+    return LEGACY_TEXT_ENCODING
+
+def sniff_file_encoding(file_path_str, size=None, mtime_ns=None):
+    """
+    Encoding of a file's text or None if it looks binary. size/mtime_ns from an earlier
+    stat avoid another one; a cached verdict is reused while both stay the same.
+    Raises OSError if the file cannot be read.
+    """
+    global _verdict_generation
+    if size is None or mtime_ns is None:
+        st = os.stat(file_path_str)
+        size, mtime_ns = st.st_size, st.st_mtime_ns
+    cached = _verdict_cache.get(file_path_str)
+    if cached is not None and cached[0] == size and cached[1] == mtime_ns:
+        return cached[2]
+
+    with open(file_path_str, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    encoding = classify_content(head, size > len(head))
+    _verdict_cache[file_path_str] = (size, mtime_ns, encoding)
+    _verdict_generation += 1
+    return encoding
+
+def remember_verdicts(verdicts):
+    """Adds saved verdicts {path: (size, mtime_ns, encoding)}; verdicts sniffed in this session win."""
+    for path, verdict in verdicts.items():
+        _verdict_cache.setdefault(path, tuple(verdict))
+
+def verdict_generation():
+    return _verdict_generation
+
+def verdicts_under(dir_path_str):
+    """Cached verdicts {path: (size, mtime_ns, encoding)} for the files below dir_path_str."""
+    prefix = os.path.join(dir_path_str, "")
+    # dict() копирует кэш атомарно, пока потоки подсчета токенов могут его пополнять.
+    return {path: verdict for path, verdict in dict(_verdict_cache).items() if path.startswith(prefix)}
+
+def decode_text_bytes(data, encoding):
+    """Decodes raw file bytes the way read_text_file reads them, including newline translation."""
+    return data.decode(encoding, errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+def iter_decoded_text_chunks(binary_file, encoding, chunk_bytes, on_raw_chunk=None):
+    """
+    Decodes an open binary file piece by piece, the same way decode_text_bytes
+    decodes it whole. on_raw_chunk(raw_bytes) sees every block that was read
+    (for hashing and progress). Yields non-empty text chunks.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pending_cr = False
+    while True:
+        raw_chunk = binary_file.read(chunk_bytes)
+        if on_raw_chunk is not None and raw_chunk:
+            on_raw_chunk(raw_chunk)
+        text = decoder.decode(raw_chunk, final=not raw_chunk)
+        if pending_cr:
+            text = '\r' + text
+        # \r в конце куска может оказаться первой половиной \r\n из следующего.
+        pending_cr = bool(raw_chunk) and text.endswith('\r')
+        if pending_cr:
+            text = text[:-1]
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if text:
+            yield text
+        if not raw_chunk:
+            return
+
+def read_text_file(file_path_str):
+    """Reads a whole text file in its sniffed encoding; returns None for binary files."""
+    encoding = sniff_file_encoding(file_path_str)
+    if encoding is None:
+        return None
+    with open(file_path_str, 'r', encoding=encoding, errors='replace') as f:
+        return f.read()
@@ -0,0 +1,61 @@
+# core/context_packer.py
+# Подбор файлов под бюджет токенов: жадное заполнение по правилам приоритета
+# (закрепленные, недавно измененные, маленькие). Работает только с уже известными
+# числами токенов (точными или оценкой), поэтому не читает диск.
+import time
+from collections import namedtuple
+
+PRIORITY_PINNED = "pinned"
+PRIORITY_RECENT = "recent"
+PRIORITY_SMALL = "small"
+PACK_PRIORITY_RULES = (PRIORITY_PINNED, PRIORITY_RECENT, PRIORITY_SMALL)
+DEFAULT_PACK_PRIORITIES = PACK_PRIORITY_RULES
+
+# Возраст файла округляется до корзин (час, день, неделя, месяц), чтобы внутри
+# одной корзины решали следующие правила, а не секунды mtime.
+RECENCY_BUCKETS_SEC = (3600, 86400, 7 * 86400, 30 * 86400)
+# Обертка <<<FILE: путь>>> ... <<<END_FILE>>> вокруг содержимого каждого файла.
+FILE_BLOCK_OVERHEAD_TOKENS = 12
+
+PackCandidate = namedtuple("PackCandidate", ["item_id", "tokens", "mtime", "pinned"])
+
+def _recency_bucket(mtime, now):
+    age = now - (mtime or 0)
+    for bucket_index, bucket_limit in enumerate(RECENCY_BUCKETS_SEC):
+        if age <= bucket_limit:
+            return bucket_index
+    return len(RECENCY_BUCKETS_SEC)
+
+def _priority_key(candidate, priorities, now):
+    key = []
+    for rule in priorities:
+        if rule == PRIORITY_PINNED:
+            key.append(not candidate.pinned)
+        elif rule == PRIORITY_RECENT:
+            key.append(_recency_bucket(candidate.mtime, now))
+        elif rule == PRIORITY_SMALL:
+            key.append(candidate.tokens)
+    return key
+
+def pack_to_budget(candidates, budget_tokens, priorities=DEFAULT_PACK_PRIORITIES, now=None):
+    """
+    Greedy first-fit: candidates are taken in priority order and every one that still
+    fits is kept, so a large file does not stop smaller ones behind it from fitting.
+    candidates: PackCandidate with tokens already including per-file overhead.
+    Returns (chosen, left_out, used_tokens); chosen and left_out keep the priority order.
+    Raises ValueError for an unknown priority rule.
+    """
+    unknown_rules = [rule for rule in priorities if rule not in PACK_PRIORITY_RULES]
+    if unknown_rules:
+        raise ValueError(f"Неизвестные правила приоритета: {', '.join(unknown_rules)}")
+    now = time.time() if now is None else now
+
+    ordered = sorted(candidates, key=lambda candidate: _priority_key(candidate, priorities, now))
+    chosen, left_out, used_tokens = [], [], 0
+    for candidate in ordered:
+        if used_tokens + candidate.tokens <= budget_tokens:
+            chosen.append(candidate)
+            used_tokens += candidate.tokens
+        else:
+            left_out.append(candidate)
+    return chosen, left_out, used_tokens
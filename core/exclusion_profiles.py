@@ -0,0 +1,95 @@
+# core/exclusion_profiles.py
+# Именованные профили исключений. Каждый профиль один раз компилируется в
+# множество точных имен, множество расширений и одну общую регулярку, поэтому
+# классификация файла стоит нескольких поисков в хеш-таблицах вместо десятков fnmatch.
+import os
+import re
+import json
+import hashlib
+import fnmatch as fnmatch_lib
+
+DEFAULT_PROFILE_NAME = "default"
+PROFILE_KEYS = ("ignored_dirs", "ignored_files", "excluded_by_default")
+
+# fnmatch на Windows не различает регистр, профили ведут себя так же.
+_CASE_INSENSITIVE = os.name == 'nt'
+_GLOB_CHARS = frozenset('*?[')
+
+def _fold_case(name):
+    return name.lower() if _CASE_INSENSITIVE else name
+
+class CompiledPatternSet:
+    """fnmatch-style name patterns split into exact names, '*.ext' suffixes and one regex for the rest."""
+    def __init__(self, patterns):
+        self.patterns = tuple(sorted(set(patterns)))
+        self.names = set()
+        self.suffixes = set()
+        globs = []
+        for pattern in self.patterns:
+            if not _GLOB_CHARS.intersection(pattern):
+                self.names.add(_fold_case(pattern))
+            elif pattern.startswith('*.') and not _GLOB_CHARS.intersection(pattern[1:]):
+                self.suffixes.add(_fold_case(pattern[1:]))
+            else:
+                globs.append(fnmatch_lib.translate(pattern))
+        flags = re.IGNORECASE if _CASE_INSENSITIVE else 0
+        self.regex = re.compile('|'.join(globs), flags) if globs else None
+
+    def matches(self, name):
+        folded = _fold_case(name)
+        if folded in self.names:
+            return True
+        if self.suffixes:
+            dot = folded.find('.')
+            while dot != -1:
+                if folded[dot:] in self.suffixes:
+                    return True
+                dot = folded.find('.', dot + 1)
+        return self.regex is not None and self.regex.match(name) is not None
+
+class ExclusionProfile:
+    """
+    ignored_dirs / ignored_files: entries that are not shown in the tree at all.
+    excluded_by_default: files that are shown but start unchecked.
+    """
+    def __init__(self, name, ignored_dirs, ignored_files, excluded_by_default):
+        self.name = name
+        self.ignored_dirs = CompiledPatternSet(ignored_dirs)
+        self.ignored_files = CompiledPatternSet(ignored_files)
+        self.excluded_by_default = CompiledPatternSet(excluded_by_default)
+        spec = {key: list(getattr(self, key).patterns) for key in PROFILE_KEYS}
+        # Отпечаток попадает в индекс сканирования: смена правил делает индекс недействительным.
+        self.fingerprint = hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def to_spec(self):
+        return {key: list(getattr(self, key).patterns) for key in PROFILE_KEYS}
+
+def load_exclusion_profiles(config_data, default_profile):
+    """
+    Profiles from app_config.json ("exclusion_profiles": {name: spec}) plus the built-in default.
+    A spec may omit any of PROFILE_KEYS; omitted lists are taken from the default profile.
+    Returns ({name: ExclusionProfile}, [error messages]).
+    """
+    profiles = {DEFAULT_PROFILE_NAME: default_profile}
+    errors = []
+    base_spec = default_profile.to_spec()
+    for name, spec in (config_data.get("exclusion_profiles") or {}).items():
+        if not isinstance(spec, dict):
+            errors.append(f"Профиль исключений '{name}' пропущен: ожидался объект.")
+            continue
+        merged = {}
+        for key in PROFILE_KEYS:
+            value = spec.get(key, base_spec[key])
+            if not isinstance(value, list) or not all(isinstance(p, str) for p in value):
+                errors.append(f"Профиль исключений '{name}': '{key}' должен быть списком строк, взято значение по умолчанию.")
+                value = base_spec[key]
+            merged[key] = value
+        profiles[name] = ExclusionProfile(name, merged["ignored_dirs"], merged["ignored_files"], merged["excluded_by_default"])
+    return profiles, errors
+
+def profile_name_for_project(config_data, root_path_str):
+    """Name of the profile selected for a project root, or the default one."""
+    if not root_path_str:
+        return DEFAULT_PROFILE_NAME
+    per_project = config_data.get("project_exclusion_profiles") or {}
+    return per_project.get(os.path.normcase(root_path_str), DEFAULT_PROFILE_NAME)
@@ -0,0 +1,65 @@
+# core/fetch_tokenizer_vocab.py
+# Кладет словарь слияний GPT-2 (vocab.bpe) в tokenizer/, откуда его берут офлайн-токенизаторы
+# и сборка PyInstaller. Словарь хранится в репозитории; скрипт нужен, чтобы восстановить его
+# из сети или из готового файла (контрольная сумма проверяется).
+# Запуск из корня проекта: python core/fetch_tokenizer_vocab.py [--source путь_или_URL]
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import urllib.request
+from pathlib import Path
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.bpe_tokenizer import load_bpe_ranks
+from core.file_processing import BUNDLED_BPE_VOCAB_RELATIVE_PATH
+
+GPT2_VOCAB_BPE_URL = "https://openaipublic.blob.core.windows.net/gpt-2/encodings/main/vocab.bpe"
+GPT2_VOCAB_SIZE = 50256  # 256 байтов + 50000 слияний, без <|endoftext|>
+# SHA-256 оригинального vocab.bpe (та же сумма проверяется в tiktoken_ext.openai_public).
+GPT2_VOCAB_BPE_SHA256 = "1ce1664773c50f3e0cc8842619a93edc4624525b728b188a9e0be33b7726adc5"
+
+def fetch_vocab(source=GPT2_VOCAB_BPE_URL):
+    """
+    Downloads (or copies) vocab.bpe into tokenizer/ and checks its checksum and size.
+    Returns the saved path; raises OSError (including network errors) or ValueError.
+    """
+    target_path = Path(__file__).resolve().parent.parent / BUNDLED_BPE_VOCAB_RELATIVE_PATH
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target_path.with_suffix(".tmp")
+
+    if "://" in source:
+        print(f"Загрузка {source}...")
+        with urllib.request.urlopen(source, timeout=60) as response, open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(response, f)
+    else:
+        shutil.copyfile(source, tmp_path)
+
+    with open(tmp_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    if digest != GPT2_VOCAB_BPE_SHA256:
+        os.remove(tmp_path)
+        raise ValueError(f"контрольная сумма словаря {digest} не совпадает с оригинальным vocab.bpe GPT-2")
+    ranks = load_bpe_ranks(tmp_path)
+    if len(ranks) != GPT2_VOCAB_SIZE:
+        os.remove(tmp_path)
+        raise ValueError(f"в словаре {len(ranks)} токенов, для GPT-2 ожидалось {GPT2_VOCAB_SIZE}")
+    os.replace(tmp_path, target_path)
+    print(f"Словарь сохранен: {target_path} ({len(ranks)} токенов)")
+    return target_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Загрузка словаря BPE GPT-2 для офлайн-токенизатора.")
+    parser.add_argument("--source", default=GPT2_VOCAB_BPE_URL, help="URL или локальный путь к vocab.bpe")
+    args = parser.parse_args(argv)
+    try:
+        fetch_vocab(args.source)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
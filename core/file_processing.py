@@ -3,36 +3,178 @@ import os
 import sys
 from pathlib import Path
 import hashlib
+import sqlite3
+import threading
 import tkinter as tk 
 
-# This import will crash the app if 'transformers' is not installed.
-from transformers import AutoTokenizer
+from core.content_sniffer import sniff_file_encoding, decode_text_bytes, iter_decoded_text_chunks
+from core.bpe_tokenizer import load_bpe_ranks, BytePairEncoder, GPT2_SPLIT_PATTERN, GPT2_END_OF_TEXT_TOKEN
 
-# Global variable for storing the initialized tokenizer
+# Global variable for storing the initialized tokenizer backend
 tokenizer = None
 tokenizer_initialization_error = None
+tokenizer_initialization_details = None
+tokenizer_ready_event = threading.Event()
+_tokenizer_initialization_started = False
+
+TOKENIZER_LOADING = "loading"
+TOKENIZER_READY = "ready"
+TOKENIZER_FAILED = "failed"
+# Сколько подсчет токенов ждет токенизатор, который еще загружается в фоне.
+TOKENIZER_READY_WAIT_SEC = 120
 
 # Constants
 BINARY_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', '.svg', '.ico', '.mp3', '.wav', '.aac', '.ogg', '.flac', '.m4a', '.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods', '.odp', '.zip', '.rar', '.tar', '.gz', '.bz2', '.7z', '.jar', '.war', '.exe', '.dll', '.so', '.dylib', '.app', '.msi', '.sqlite', '.db', '.mdb', '.ttf', '.otf', '.woff', '.woff2', '.pyc', '.pyo', '.pyd', '.class', '.bundle', '.swf', '.dat', '.bin', '.obj', '.lib', '.a', '.pak', '.assets', '.resource', '.resS'}
 MAX_FILE_SIZE_BYTES = 1 * 1024 * 1024
 MAX_TOKENS_FOR_DISPLAY = 50000
+APP_CACHE_DIR_NAME = "project_agent"
+# Словарь слияний GPT-2, поставляемый с приложением (см. core/fetch_tokenizer_vocab.py).
+BUNDLED_BPE_VOCAB_RELATIVE_PATH = "tokenizer/gpt2_vocab.bpe"
+AUTO_TOKENIZER_BACKEND = "auto"
+# Файлы от этого размера токенизируются потоково, кусками по STREAMING_CHUNK_BYTES.
+STREAMING_TOKENIZE_THRESHOLD_BYTES = 4 * 1024 * 1024
+STREAMING_CHUNK_BYTES = 1 * 1024 * 1024
+# Насколько далеко от конца куска искать безопасную границу разреза (в символах).
+_SAFE_SPLIT_WINDOW_CHARS = 64 * 1024
 
-def initialize_tokenizer(log_widget_ref=None):
+class TokenizerBackend:
     """
-    Initializes the Hugging Face tokenizer. This will crash if it fails.
+    Counts tokens of a text. Backends are created by name through
+    create_tokenizer_backend and may raise ImportError (missing optional
+    dependency) or OSError (missing bundled vocabulary) while loading.
     """
-    global tokenizer, tokenizer_initialization_error
+    name = ""
+    description = ""
+    # Бэкенды с одинаковым tokenizer_id дают одинаковые числа и делят кэш токенов.
+    tokenizer_id = ""
+
+    def count_tokens(self, text):
+        raise NotImplementedError
+
+    def count_tokens_batch(self, texts, num_threads=1):
+        """Token counts for several texts at once; backends with a native batch API override this."""
+        return [self.count_tokens(text) for text in texts]
+
+class TiktokenBackend(TokenizerBackend):
+    """GPT-2 encoding in tiktoken (Rust byte-level BPE), built from the bundled vocabulary."""
+    name = "tiktoken"
+    description = "tiktoken (встроенный словарь GPT-2)"
+    tokenizer_id = "gpt2-bpe"
+
+    def __init__(self):
+        import tiktoken
+        ranks = load_bpe_ranks(resource_path(BUNDLED_BPE_VOCAB_RELATIVE_PATH))
+        self._encoding = tiktoken.Encoding(
+            name="gpt2_bundled", pat_str=GPT2_SPLIT_PATTERN, mergeable_ranks=ranks,
+            special_tokens={GPT2_END_OF_TEXT_TOKEN: len(ranks)}
+        )
+
+    def count_tokens(self, text):
+        return len(self._encoding.encode_ordinary(text))
+
+    def count_tokens_batch(self, texts, num_threads=1):
+        return [len(tokens) for tokens in self._encoding.encode_ordinary_batch(texts, num_threads=num_threads)]
+
+class BundledBpeBackend(TokenizerBackend):
+    """Pure-Python GPT-2 BPE over the bundled vocabulary; needs no extra packages."""
+    name = "bundled"
+    description = "встроенный BPE GPT-2"
+    tokenizer_id = "gpt2-bpe"
+
+    def __init__(self):
+        self._encoder = BytePairEncoder(load_bpe_ranks(resource_path(BUNDLED_BPE_VOCAB_RELATIVE_PATH)))
+        if not self._encoder.exact_split:
+            # Приближенное предразбиение stdlib re дает другие счета: им нужен свой ключ в кэше токенов.
+            self.tokenizer_id = "gpt2-bpe-re"
+            self.description = "встроенный BPE GPT-2 (приближенное разбиение re)"
+
+    def count_tokens(self, text):
+        return self._encoder.count_tokens(text)
+
+class HuggingFaceBackend(TokenizerBackend):
+    """transformers' GPT-2 tokenizer; needs the package and a network or HF cache on first use."""
+    name = "hf"
+    description = "Hugging Face 'gpt2'"
+    tokenizer_id = "hf-gpt2"
+
+    def __init__(self):
+        from transformers import AutoTokenizer
+        self._tokenizer = AutoTokenizer.from_pretrained("gpt2")
+
+    def count_tokens(self, text):
+        return len(self._tokenizer.encode(text))
+
+    def count_tokens_batch(self, texts, num_threads=1):
+        return [len(ids) for ids in self._tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+TOKENIZER_BACKENDS = {
+    backend.name: backend for backend in (TiktokenBackend, BundledBpeBackend, HuggingFaceBackend)
+}
+# Порядок перебора для "auto": быстрый и офлайн, затем офлайн без зависимостей, затем HF.
+AUTO_TOKENIZER_BACKEND_ORDER = ("tiktoken", "bundled", "hf")
+
+def create_tokenizer_backend(backend_name):
+    """Instantiates a backend from TOKENIZER_BACKENDS; raises KeyError for unknown names."""
+    return TOKENIZER_BACKENDS[backend_name]()
+
+def initialize_tokenizer(log_widget_ref=None, backend_name=AUTO_TOKENIZER_BACKEND):
+    """
+    Initializes the tokenizer backend. "auto" takes the first backend from
+    AUTO_TOKENIZER_BACKEND_ORDER that loads; if none does, the reason is kept
+    in tokenizer_initialization_error and token counts report it.
+    tokenizer_ready_event is set once the outcome is known either way.
+    """
+    global tokenizer, tokenizer_initialization_error, tokenizer_initialization_details
     if tokenizer is not None or tokenizer_initialization_error is not None:
         return
+    try:
+        if backend_name == AUTO_TOKENIZER_BACKEND:
+            candidates = AUTO_TOKENIZER_BACKEND_ORDER
+        elif backend_name in TOKENIZER_BACKENDS:
+            candidates = (backend_name,)
+        else:
+            tokenizer_initialization_error = f"неизвестный токенизатор '{backend_name}'"
+            tokenizer_initialization_details = tokenizer_initialization_error
+            if log_widget_ref and log_widget_ref.winfo_exists():
+                log_widget_ref.insert(tk.END, f"Ошибка: {tokenizer_initialization_error}.\n", ('error',))
+            return
 
-    if log_widget_ref and log_widget_ref.winfo_exists():
-        log_widget_ref.insert(tk.END, "Инициализация токенизатора 'gpt2'...\n", ('info',))
-    
-    # This will crash on network error or other issues.
-    tokenizer = AutoTokenizer.from_pretrained("gpt2")
-    
-    if log_widget_ref and log_widget_ref.winfo_exists():
-        log_widget_ref.insert(tk.END, "Токенизатор успешно инициализирован.\n", ('success',))
+        failures = []
+        for candidate_name in candidates:
+            try:
+                tokenizer = create_tokenizer_backend(candidate_name)
+            except (ImportError, OSError, ValueError) as e:
+                failures.append(f"{candidate_name}: {e}")
+                continue
+            if log_widget_ref and log_widget_ref.winfo_exists():
+                log_widget_ref.insert(tk.END, f"Токенизатор: {tokenizer.description}.\n", ('success',))
+            return
+
+        tokenizer_initialization_error = "токенизатор недоступен"
+        tokenizer_initialization_details = "; ".join(failures)
+        if log_widget_ref and log_widget_ref.winfo_exists():
+            log_widget_ref.insert(tk.END, f"Ошибка инициализации токенизатора ({tokenizer_initialization_details}).\n", ('error',))
+    finally:
+        tokenizer_ready_event.set()
+
+def start_tokenizer_initialization(backend_name=AUTO_TOKENIZER_BACKEND):
+    """
+    Loads the tokenizer on a daemon thread so the window can appear first.
+    Progress is read with get_tokenizer_status(); nothing touches Tk from the thread.
+    """
+    global _tokenizer_initialization_started
+    if _tokenizer_initialization_started:
+        return
+    _tokenizer_initialization_started = True
+    threading.Thread(target=initialize_tokenizer, args=(None, backend_name), daemon=True).start()
+
+def get_tokenizer_status():
+    """Returns (state, text): state is TOKENIZER_LOADING, TOKENIZER_READY or TOKENIZER_FAILED."""
+    if not tokenizer_ready_event.is_set():
+        return TOKENIZER_LOADING, "загрузка..."
+    if tokenizer is not None:
+        return TOKENIZER_READY, tokenizer.description
+    return TOKENIZER_FAILED, tokenizer_initialization_details or tokenizer_initialization_error or ""
 
 def resource_path(relative_path_from_root):
     """
@@ -44,6 +186,21 @@ def resource_path(relative_path_from_root):
         base_path = Path(__file__).resolve().parent.parent
     return os.path.join(base_path, relative_path_from_root)
 
+def get_app_cache_dir(subdir_name=""):
+    """
+    Returns the per-user cache directory for persistent app data, creating it if needed.
+    """
+    if os.name == 'nt':
+        base_path = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base_path = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    cache_dir = os.path.join(base_path, APP_CACHE_DIR_NAME, subdir_name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def calculate_content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
 def calculate_file_hash(file_path):
     hasher = hashlib.sha256()
     if not os.path.isfile(file_path):
@@ -55,29 +212,148 @@ def calculate_file_hash(file_path):
             hasher.update(chunk)
     return hasher.hexdigest()
 
-def count_file_tokens(file_path_str, log_widget_ref, model_name="gpt2"):
-    file_path_obj = Path(file_path_str)
-    file_name_for_log = file_path_obj.name 
-
+def wait_for_tokenizer():
+    """
+    Waits for a background tokenizer load (only call from worker threads).
+    Returns None once the tokenizer is usable, otherwise the error message to show.
+    """
+    if tokenizer is None and _tokenizer_initialization_started:
+        tokenizer_ready_event.wait(TOKENIZER_READY_WAIT_SEC)
     if tokenizer is None:
         if tokenizer_initialization_error:
-            return None, tokenizer_initialization_error
-        return None, "Токенизатор не инициализирован."
+            return tokenizer_initialization_error
+        return "Токенизатор не инициализирован."
+    return None
 
+def check_file_for_token_count(file_path_str):
+    """
+    Returns (stat_result, encoding, error_message); error_message is None when the
+    file can be tokenized. The binary check reuses the cached content sniff.
+    """
+    file_path_obj = Path(file_path_str)
     if not file_path_obj.is_file():
-        return None, "файл не найден"
+        return None, None, "файл не найден"
 
-    file_size = file_path_obj.stat().st_size
-    if file_size > MAX_FILE_SIZE_BYTES * 5: 
-         return None, f"файл > {MAX_FILE_SIZE_BYTES*5 // (1024*1024)} MB"
+    st = file_path_obj.stat()
+    encoding = sniff_file_encoding(file_path_str, st.st_size, st.st_mtime_ns)
+    if encoding is None:
+        return st, None, "бинарный файл"
+    return st, encoding, None
 
-    # This block will crash on UnicodeDecodeError or other read errors.
-    with open(file_path_obj, 'r', encoding='utf-8') as f:
-        content = f.read()
+def find_safe_token_split(text):
+    """
+    Index where text can be cut without changing its token count: a space or newline
+    between two non-whitespace characters always starts a new GPT-2 pre-split piece,
+    and BPE never merges across pieces. Looks only at the last _SAFE_SPLIT_WINDOW_CHARS;
+    returns len(text) if there is no such place (the cut may then shift a token or two).
+    """
+    window_start = max(1, len(text) - _SAFE_SPLIT_WINDOW_CHARS)
+    for separator in ('\n', ' '):
+        pos = text.rfind(separator, window_start, len(text) - 1)
+        while pos >= window_start:
+            if not text[pos - 1].isspace() and not text[pos + 1].isspace():
+                return pos
+            pos = text.rfind(separator, window_start, pos)
+    return len(text)
 
+def count_tokens_streaming(file_path_str, encoding, hasher=None, progress_callback=None):
+    """
+    Counts tokens of a file without holding it in memory: the text is decoded
+    STREAMING_CHUNK_BYTES at a time and every chunk is cut at find_safe_token_split,
+    the remainder is carried over to the next one. hasher (hashlib object) receives
+    the raw bytes; progress_callback(bytes_read) is called after every chunk.
+    Uses the module tokenizer, which must be ready.
+    """
+    def on_raw_chunk(raw_chunk):
+        if hasher is not None:
+            hasher.update(raw_chunk)
+
+    num_tokens, carry = 0, ""
+    # This block will crash on read errors.
+    with open(file_path_str, 'rb') as f:
+        for text in iter_decoded_text_chunks(f, encoding, STREAMING_CHUNK_BYTES, on_raw_chunk):
+            buffer = carry + text
+            split_at = find_safe_token_split(buffer)
+            if split_at > 0:
+                num_tokens += tokenizer.count_tokens(buffer[:split_at])
+            carry = buffer[split_at:]
+            if progress_callback is not None:
+                progress_callback(f.tell())
+    if carry:
+        num_tokens += tokenizer.count_tokens(carry)
+    return num_tokens
+
+def count_file_tokens(file_path_str, log_widget_ref, model_name="gpt2", token_cache=None, progress_callback=None):
+    """
+    Returns (token_count, error_message, from_cache). With token_cache (see
+    core/token_cache.py) a file whose (size, mtime_ns) is unchanged is not read at
+    all, and a file with already counted content is hashed but not tokenized;
+    from_cache tells such answers from fresh counts. Files of at least
+    STREAMING_TOKENIZE_THRESHOLD_BYTES are streamed (see count_tokens_streaming) and
+    report progress_callback(bytes_read, total_bytes).
+    """
+    file_path_obj = Path(file_path_str)
+    file_name_for_log = file_path_obj.name 
+
+    tokenizer_error = wait_for_tokenizer()
+    if tokenizer_error is not None:
+        return None, tokenizer_error, False
+
+    st, encoding, error_msg = check_file_for_token_count(file_path_str)
+    if error_msg is not None:
+        return None, error_msg, False
+
+    tokenizer_id = tokenizer.tokenizer_id
+    if token_cache is not None:
+        try:
+            cached_tokens = token_cache.lookup_by_stat(file_path_str, st.st_size, st.st_mtime_ns, tokenizer_id)
+        except sqlite3.Error:
+            token_cache, cached_tokens = None, None
+        if cached_tokens is not None:
+            return cached_tokens, None, True
+
+    if st.st_size >= STREAMING_TOKENIZE_THRESHOLD_BYTES:
+        # Хэш считается попутно, поэтому кэш по содержимому большие файлы не экономит,
+        # но повторный подсчет без изменений отвечается по (size, mtime_ns).
+        hasher = hashlib.sha256() if token_cache is not None else None
+        stream_progress = None
+        if progress_callback is not None:
+            stream_progress = lambda bytes_read: progress_callback(bytes_read, st.st_size)
+        num_tokens = count_tokens_streaming(file_path_str, encoding, hasher, stream_progress)
+        if token_cache is not None:
+            content_hash = hasher.hexdigest()
+            try:
+                token_cache.remember_file(file_path_str, st.st_size, st.st_mtime_ns, content_hash)
+                token_cache.store_tokens(content_hash, tokenizer_id, num_tokens)
+            except sqlite3.Error:
+                pass
+        return num_tokens, None, False
+
+    # This block will crash on read errors.
+    with open(file_path_obj, 'rb') as f:
+        raw_content = f.read()
+
+    content_hash = None
+    if token_cache is not None:
+        content_hash = calculate_content_hash(raw_content)
+        try:
+            token_cache.remember_file(file_path_str, st.st_size, st.st_mtime_ns, content_hash)
+            cached_tokens = token_cache.lookup_by_hash(content_hash, tokenizer_id)
+        except sqlite3.Error:
+            token_cache, cached_tokens = None, None
+        if cached_tokens is not None:
+            return cached_tokens, None, True
+
+    content = decode_text_bytes(raw_content, encoding)
     if not content.strip(): 
-        return 0, None 
+        num_tokens = 0
+    else:
+        # This will crash if the tokenizer fails on the content.
+        num_tokens = tokenizer.count_tokens(content)
 
-    # This will crash if the tokenizer fails on the content.
-    num_tokens = len(tokenizer.encode(content))
-    return num_tokens, None
\ No newline at end of file
+    if token_cache is not None:
+        try:
+            token_cache.store_tokens(content_hash, tokenizer_id, num_tokens)
+        except sqlite3.Error:
+            pass
+    return num_tokens, None, False
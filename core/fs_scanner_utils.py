@@ -1,12 +1,16 @@
 # core/fs_scanner_utils.py
 import os
+import stat
+from collections import namedtuple
 from pathlib import Path
-import fnmatch as fnmatch_lib
 import tkinter as tk
 
 from core.file_processing import (
     count_file_tokens, BINARY_EXTENSIONS, MAX_FILE_SIZE_BYTES, MAX_TOKENS_FOR_DISPLAY
 )
+from core.exclusion_profiles import ExclusionProfile, DEFAULT_PROFILE_NAME
+from core.content_sniffer import sniff_file_encoding
+from core.treeview_constants import DISABLED_LOOK_TAGS_UI
 
 BINARY_STATUS_TAG = "status_binary"
 LARGE_FILE_STATUS_TAG = "status_large_file"
@@ -14,12 +18,6 @@ ERROR_STATUS_TAG = "status_error"
 EXCLUDED_BY_DEFAULT_STATUS_TAG = "status_excluded_default"
 TOO_MANY_TOKENS_STATUS_TAG = "status_too_many_tokens"
 
-DISABLED_LOOK_TAGS_UI = {
-    BINARY_STATUS_TAG,
-    LARGE_FILE_STATUS_TAG,
-    ERROR_STATUS_TAG
-}
-
 GLOBAL_IGNORED_DIRS = {
     '.git', '__pycache__', '.vscode', '.idea', 'node_modules', 'venv', '.env',
     'build', 'dist', 'out', 'target', '.pytest_cache', '.mypy_cache', '.tox',
@@ -38,22 +36,115 @@ EXCLUDED_BY_DEFAULT_PATTERNS = {
     'LICENSE', 'LICENSE.*', 'COPYING', 'NOTICE', '*.ipynb_checkpoints*', 'go.sum'
 }
 
+# Встроенный профиль исключений собран из наборов выше; остальные профили задаются в app_config.json.
+DEFAULT_EXCLUSION_PROFILE = ExclusionProfile(
+    DEFAULT_PROFILE_NAME, GLOBAL_IGNORED_DIRS, GLOBAL_IGNORED_FILES, EXCLUDED_BY_DEFAULT_PATTERNS
+)
+_active_exclusion_profile = DEFAULT_EXCLUSION_PROFILE
+
+def get_active_exclusion_profile():
+    return _active_exclusion_profile
+
+def set_active_exclusion_profile(profile):
+    """Profile used by should_exclude_item / get_item_status_info; set before a scan starts."""
+    global _active_exclusion_profile
+    _active_exclusion_profile = profile or DEFAULT_EXCLUSION_PROFILE
+
+# Политика для символических ссылок: "follow" — раскрывать папки-ссылки,
+# "show" — показывать, но не раскрывать, "hide" — не показывать ссылки вовсе.
+SYMLINK_FOLLOW = "follow"
+SYMLINK_SHOW = "show"
+SYMLINK_HIDE = "hide"
+SYMLINK_POLICIES = (SYMLINK_FOLLOW, SYMLINK_SHOW, SYMLINK_HIDE)
+_symlink_policy = SYMLINK_FOLLOW
+
+def get_symlink_policy():
+    return _symlink_policy
+
+def set_symlink_policy(policy):
+    """One of SYMLINK_POLICIES; unknown values fall back to SYMLINK_FOLLOW. Set before a scan starts."""
+    global _symlink_policy
+    _symlink_policy = policy if policy in SYMLINK_POLICIES else SYMLINK_FOLLOW
+
+def get_scan_settings_key():
+    """Identifies the settings a scan result depends on (exclusion profile and symlink policy)."""
+    return f"{_active_exclusion_profile.fingerprint}|symlinks={_symlink_policy}"
+
+# Запись о файле/папке, полученная из os.scandir за один stat.
+# size == -1 означает, что stat не удался (например, битая символическая ссылка).
+# dir_key — (st_dev, st_ino) папки, по нему обход узнает уже пройденные папки.
+ScannedEntry = namedtuple("ScannedEntry", ["name", "path", "is_dir", "size", "mtime", "is_symlink", "dir_key", "mtime_ns"])
+
+def directory_key(dir_path_str):
+    st = os.stat(dir_path_str)
+    return (st.st_dev, st.st_ino)
+
+def scan_directory_entries(dir_path_str):
+    """
+    Lists a directory with os.scandir, stat'ing every entry exactly once.
+    Returns entries sorted dirs-first, then by lowercase name; symlinks are
+    left out entirely under the "hide" policy.
+    Raises OSError (incl. PermissionError) if the directory can't be listed.
+    """
+    entries = []
+    hide_symlinks = _symlink_policy == SYMLINK_HIDE
+    with os.scandir(dir_path_str) as it:
+        for entry in it:
+            is_symlink = entry.is_symlink()
+            if is_symlink and hide_symlinks:
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                entries.append(ScannedEntry(entry.name, entry.path, False, -1, 0.0, is_symlink, None, 0))
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            dir_key = None
+            if is_dir:
+                dir_key = (st.st_dev, st.st_ino)
+                if st.st_ino == 0:
+                    # DirEntry.stat() на Windows не заполняет st_ino/st_dev.
+                    try:
+                        dir_key = directory_key(entry.path)
+                    except OSError:
+                        dir_key = None
+            entries.append(ScannedEntry(
+                entry.name, entry.path, is_dir, 0 if is_dir else st.st_size, st.st_mtime, is_symlink, dir_key, st.st_mtime_ns
+            ))
+    entries.sort(key=lambda e: (not e.is_dir, e.name.lower()))
+    return entries
+
+def should_descend_directory(is_symlink, dir_key, visited_dir_keys):
+    """
+    Decides whether a walk enters a directory and, if so, marks it visited.
+    Symlinked directories are entered only under the "follow" policy, and a
+    directory already reached by another path (symlink loop, junction, bind
+    mount) is never entered twice.
+    """
+    if is_symlink and _symlink_policy != SYMLINK_FOLLOW:
+        return False
+    if dir_key is None:
+        return True
+    if dir_key in visited_dir_keys:
+        return False
+    visited_dir_keys.add(dir_key)
+    return True
+
 def should_exclude_item(
     item_path_obj: Path,
     item_name: str,
     is_dir: bool,
     gitignore_matcher_func
 ):
+    profile = _active_exclusion_profile
     if is_dir:
-        if item_name in GLOBAL_IGNORED_DIRS:
+        if profile.ignored_dirs.matches(item_name):
             return True
-    else: 
-        for pattern in GLOBAL_IGNORED_FILES:
-            if fnmatch_lib.fnmatch(item_name, pattern):
-                return True
+    elif profile.ignored_files.matches(item_name):
+        return True
 
     if gitignore_matcher_func and callable(gitignore_matcher_func):
-        if gitignore_matcher_func(item_path_obj): 
+        if gitignore_matcher_func(item_path_obj, is_dir): 
             return True
             
     return False
@@ -62,8 +153,15 @@ def get_item_status_info(
     item_path_obj: Path,
     item_name: str,
     is_dir: bool,
-    log_widget_ref
+    log_widget_ref,
+    file_size=None,
+    file_mtime_ns=None
 ):
+    """
+    file_size / file_mtime_ns: результат уже выполненного stat (см. scan_directory_entries).
+    Если не переданы, файл будет stat'нут здесь; размер -1 означает недоступный объект.
+    Файлы с незнакомым расширением классифицируются по первым килобайтам содержимого.
+    """
     status_tags = set()
     status_message = ""
     token_count = 0  # По умолчанию токены не считаются
@@ -71,34 +169,41 @@ def get_item_status_info(
     if is_dir:
         return status_tags, status_message, token_count
 
-    if item_path_obj.suffix.lower() in BINARY_EXTENSIONS:
+    if os.path.splitext(item_name)[1].lower() in BINARY_EXTENSIONS:
         status_tags.add(BINARY_STATUS_TAG)
         status_message = "бинарный"
         token_count = None  
     else:
-        file_size = -1
-        if item_path_obj.exists():
-            stat_result = item_path_obj.stat()
-            file_size = stat_result.st_size
-        else: 
+        if file_size is None:
+            file_size = -1
+            item_path_obj = Path(item_path_obj)
+            if item_path_obj.exists():
+                st = item_path_obj.stat()
+                file_size, file_mtime_ns = st.st_size, st.st_mtime_ns
+        if file_size == -1:
             status_tags.add(ERROR_STATUS_TAG)
             status_message = "неверный объект пути"
             token_count = None
         
         if token_count is not None and file_size != -1: 
-            if file_size > MAX_FILE_SIZE_BYTES:
-                status_tags.add(LARGE_FILE_STATUS_TAG)
-                status_message = f"> {MAX_FILE_SIZE_BYTES // (1024*1024)}MB"
+            try:
+                encoding = sniff_file_encoding(str(item_path_obj), file_size, file_mtime_ns)
+            except OSError:
+                status_tags.add(ERROR_STATUS_TAG)
+                status_message = "ошибка чтения"
                 token_count = None
+            else:
+                if encoding is None:
+                    status_tags.add(BINARY_STATUS_TAG)
+                    status_message = "бинарный"
+                    token_count = None
+                elif file_size > MAX_FILE_SIZE_BYTES:
+                    # Большой текстовый файл только помечается: его можно выделить, он токенизируется потоково.
+                    status_tags.add(LARGE_FILE_STATUS_TAG)
+                    status_message = f"> {MAX_FILE_SIZE_BYTES // (1024*1024)}MB"
             # Автоматический подсчет токенов при сканировании удален
 
-    is_excluded_by_default = False
-    for pattern in EXCLUDED_BY_DEFAULT_PATTERNS:
-        if fnmatch_lib.fnmatch(item_name, pattern):
-            is_excluded_by_default = True
-            break
-    
-    if is_excluded_by_default:
+    if _active_exclusion_profile.excluded_by_default.matches(item_name):
         if EXCLUDED_BY_DEFAULT_STATUS_TAG not in status_tags:
             status_tags.add(EXCLUDED_BY_DEFAULT_STATUS_TAG)
         if not status_message: 
@@ -0,0 +1,214 @@
+# core/fs_watcher.py
+# Режим наблюдения: отслеживает изменения файлов проекта и отправляет в update_queue
+# только точечные изменения (insert_node / remove_node / refresh_node),
+# не перестраивая дерево и не сбрасывая выделение.
+import os
+import sys
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+from pathlib import Path
+
+from core.treeview_scanner import (
+    DirectoryLister, JobCancelled, load_gitignore_rules, patch_changed_directory,
+    NOT_DESCENDED_DIR_MSGS
+)
+
+DEFAULT_POLL_INTERVAL_SEC = 2.0
+INOTIFY_DEBOUNCE_SEC = 0.3
+
+# Константы из <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+    IN_CREATE | IN_DELETE | IN_ONLYDIR
+)
+_INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+def build_watch_snapshot(root_path_str, nodes):
+    """
+    Builds the watcher's view of the tree.
+    nodes: (parent_id, item_id, data_dict) tuples for everything currently shown.
+    Returns {dir_id: {item_id: data_dict}} with an entry for every directory the scan entered.
+    """
+    children_by_dir = {root_path_str: {}}
+    for parent_id, item_id, data in nodes:
+        node_copy = {
+            'is_dir': data['is_dir'], 'size': data.get('size'), 'mtime': data.get('mtime'),
+            'rel_path': data.get('rel_path', '')
+        }
+        if parent_id:
+            children_by_dir.setdefault(parent_id, {})[item_id] = node_copy
+        if data['is_dir'] and data.get('status_msg') not in NOT_DESCENDED_DIR_MSGS:
+            children_by_dir.setdefault(item_id, {})
+    return children_by_dir
+
+class _TreeWatcher(threading.Thread):
+    """Common part of the watchers: keeps the snapshot and turns a changed directory into deltas."""
+    def __init__(self, root_path_str, children_by_dir, root_mtime, update_queue, log_widget_ref):
+        super().__init__(daemon=True)
+        self.root_path_str = root_path_str
+        self.update_queue = update_queue
+        self._children_by_dir = children_by_dir
+        self._dir_mtimes = {root_path_str: root_mtime}
+        for children in children_by_dir.values():
+            for item_id, data in children.items():
+                if data['is_dir']:
+                    self._dir_mtimes[item_id] = data['mtime']
+        self._gitignore_rules = load_gitignore_rules(Path(root_path_str), update_queue)
+        self._lister = DirectoryLister(1, log_widget_ref, self._gitignore_rules)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.update_queue.cancel()
+
+    def _rel_path_of(self, dir_id_str):
+        if dir_id_str == self.root_path_str:
+            return ""
+        return self._children_by_dir[os.path.dirname(dir_id_str)][dir_id_str]['rel_path']
+
+    def _patch_directory(self, dir_id_str):
+        if dir_id_str not in self._children_by_dir:
+            return  # Уже удалена вместе с родительской папкой.
+        try:
+            self._dir_mtimes[dir_id_str] = os.stat(dir_id_str).st_mtime
+        except OSError:
+            return  # Исчезновение папки обработает ее родитель.
+        # Изменение могло затронуть .gitignore этой папки.
+        self._gitignore_rules.invalidate(dir_id_str)
+        patch_changed_directory(
+            dir_id_str, self._rel_path_of(dir_id_str), self._children_by_dir, self.update_queue, self._lister
+        )
+
+class PollingWatcher(_TreeWatcher):
+    """
+    Portable fallback: every poll_interval seconds re-stats known directories and files.
+    poll_once() can be called directly (e.g. from tests) without starting the thread.
+    """
+    def __init__(self, root_path_str, children_by_dir, root_mtime, update_queue, log_widget_ref,
+                 poll_interval=DEFAULT_POLL_INTERVAL_SEC):
+        super().__init__(root_path_str, children_by_dir, root_mtime, update_queue, log_widget_ref)
+        self.poll_interval = poll_interval
+
+    def _has_modified_files(self, children):
+        for item_id, data in children.items():
+            if data['is_dir']:
+                continue
+            try:
+                st = os.stat(item_id)
+            except OSError:
+                return True
+            if (st.st_size, st.st_mtime) != (data['size'], data['mtime']):
+                return True
+        return False
+
+    def poll_once(self):
+        changed_dirs = []
+        for dir_id_str, children in list(self._children_by_dir.items()):
+            try:
+                dir_mtime = os.stat(dir_id_str).st_mtime
+            except OSError:
+                continue
+            if dir_mtime != self._dir_mtimes.get(dir_id_str) or self._has_modified_files(children):
+                changed_dirs.append(dir_id_str)
+        for dir_id_str in changed_dirs:
+            self._patch_directory(dir_id_str)
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.poll_interval):
+                self.poll_once()
+        except JobCancelled:
+            pass
+
+class InotifyWatcher(_TreeWatcher):
+    """Linux watcher: one inotify watch per known directory, events debounced per directory."""
+    def __init__(self, root_path_str, children_by_dir, root_mtime, update_queue, log_widget_ref):
+        super().__init__(root_path_str, children_by_dir, root_mtime, update_queue, log_widget_ref)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dir_by_wd = {}
+        self._wd_by_dir = {}
+        try:
+            self._add_missing_watches()
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _add_missing_watches(self):
+        for dir_id_str in self._children_by_dir:
+            if dir_id_str in self._wd_by_dir:
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_id_str), INOTIFY_WATCH_MASK)
+            if wd < 0:
+                errno_value = ctypes.get_errno()
+                if os.path.isdir(dir_id_str):
+                    raise OSError(errno_value, f"inotify_add_watch failed for '{dir_id_str}'")
+                continue
+            self._dir_by_wd[wd] = dir_id_str
+            self._wd_by_dir[dir_id_str] = wd
+
+    def _read_changed_dirs(self, changed_dirs):
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, name_len = _INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT_HEADER.size + name_len
+            dir_id_str = self._dir_by_wd.get(wd)
+            if dir_id_str is None:
+                continue
+            if mask & IN_IGNORED:
+                # Папка удалена или перемещена: проверяем родителя, он уберет узел из дерева.
+                del self._dir_by_wd[wd]
+                self._wd_by_dir.pop(dir_id_str, None)
+                changed_dirs.add(os.path.dirname(dir_id_str))
+            else:
+                changed_dirs.add(dir_id_str)
+
+    def run(self):
+        changed_dirs = set()
+        try:
+            while not self._stop_event.is_set():
+                # Пока события идут, ждем паузу в INOTIFY_DEBOUNCE_SEC, затем применяем пачкой.
+                timeout = INOTIFY_DEBOUNCE_SEC if changed_dirs else 0.5
+                readable, _, _ = select.select([self._fd], [], [], timeout)
+                if readable:
+                    self._read_changed_dirs(changed_dirs)
+                    continue
+                if changed_dirs:
+                    for dir_id_str in sorted(changed_dirs):
+                        self._patch_directory(dir_id_str)
+                    changed_dirs.clear()
+                    try:
+                        self._add_missing_watches()
+                    except OSError as e:
+                        self.update_queue.put(("log_message", (f"Не удалось следить за новой папкой: {e}", ('warning',))))
+        except JobCancelled:
+            pass
+        finally:
+            os.close(self._fd)
+
+def create_tree_watcher(root_path_str, children_by_dir, root_mtime, update_queue, log_widget_ref,
+                        poll_interval=DEFAULT_POLL_INTERVAL_SEC):
+    """Returns an inotify watcher where available, otherwise the polling one. Not started yet."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root_path_str, children_by_dir, root_mtime, update_queue, log_widget_ref)
+        except (OSError, AttributeError) as e:
+            update_queue.put(("log_message", (f"inotify недоступен ({e}), используется опрос.", ('warning',))))
+    return PollingWatcher(root_path_str, children_by_dir, root_mtime, update_queue, log_widget_ref, poll_interval)
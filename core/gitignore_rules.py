@@ -0,0 +1,116 @@
+# core/gitignore_rules.py
+# Правила игнорирования как у git: глобальный excludesFile, .git/info/exclude,
+# корневой и вложенные .gitignore. Каждый .gitignore действует только в своей папке
+# и ниже; более глубокий файл имеет приоритет. Решение принимается по каждому
+# элементу папки до спуска в нее, поэтому игнорируемые поддеревья не обходятся вовсе.
+import os
+import re
+from pathlib import Path
+
+from core.vendor.gitignore_parser import Matcher
+
+GITIGNORE_FILE_NAME = ".gitignore"
+
+def _read_rule_lines(file_path_str):
+    with open(file_path_str, 'r', encoding='utf-8', errors='replace') as f:
+        return f.readlines()
+
+def find_global_excludes_file():
+    """Path of git's global excludes file (core.excludesFile or the XDG default), or None."""
+    home = Path.home()
+    for config_path in (home / ".gitconfig", Path(os.environ.get("XDG_CONFIG_HOME") or home / ".config") / "git" / "config"):
+        try:
+            config_text = config_path.read_text(encoding='utf-8', errors='replace')
+        except OSError:
+            continue
+        in_core_section = False
+        for line in config_text.splitlines():
+            line = line.strip()
+            if line.startswith('['):
+                in_core_section = line.lower().startswith('[core')
+                continue
+            m = re.match(r'excludesfile\s*=\s*(.+)', line, re.IGNORECASE)
+            if in_core_section and m:
+                return Path(os.path.expanduser(m.group(1).strip().strip('"')))
+    default_path = Path(os.environ.get("XDG_CONFIG_HOME") or home / ".config") / "git" / "ignore"
+    return default_path if default_path.is_file() else None
+
+class GitignoreRules:
+    """
+    Callable ignore check for paths inside one project root: rules(item_path_str, is_dir).
+    Rule levels are collected per directory the first time something inside it is checked
+    and cached, so a top-down walk reads every .gitignore exactly once.
+    warn(message) is called for rule files that exist but cannot be read.
+    """
+    def __init__(self, root_path_str, warn=None):
+        self.root_path_str = str(root_path_str)
+        self._warn = warn
+        self._levels_by_dir = {}
+        self._load_root_levels()
+
+    def _load_root_levels(self):
+        root_levels = []
+        global_excludes = find_global_excludes_file()
+        if global_excludes is not None:
+            self._append_level(root_levels, str(global_excludes), "")
+        self._append_level(root_levels, os.path.join(self.root_path_str, ".git", "info", "exclude"), "")
+        self._append_level(root_levels, os.path.join(self.root_path_str, GITIGNORE_FILE_NAME), "")
+        self._levels_by_dir[self.root_path_str] = tuple(root_levels)
+
+    def _append_level(self, levels, rules_file_str, base_rel_posix):
+        try:
+            lines = _read_rule_lines(rules_file_str)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            if self._warn and os.path.exists(rules_file_str):
+                self._warn(f"Не удалось прочитать '{rules_file_str}': {e}")
+            return
+        matcher = Matcher(lines, os.path.dirname(rules_file_str))
+        if matcher.rules:
+            levels.append((base_rel_posix, matcher))
+
+    def _rel_posix(self, path_str):
+        if path_str == self.root_path_str:
+            return ""
+        return path_str[len(self.root_path_str) + 1:].replace(os.sep, '/')
+
+    def _levels_for_dir(self, dir_path_str):
+        """Rule levels for items directly inside dir_path_str, lowest precedence first."""
+        levels = self._levels_by_dir.get(dir_path_str)
+        if levels is not None:
+            return levels
+        parent_levels = self._levels_for_dir(os.path.dirname(dir_path_str))
+        own_levels = []
+        self._append_level(own_levels, os.path.join(dir_path_str, GITIGNORE_FILE_NAME), self._rel_posix(dir_path_str))
+        levels = parent_levels + tuple(own_levels) if own_levels else parent_levels
+        # Гонка двух потоков пула здесь безвредна: оба вычислят одно и то же.
+        self._levels_by_dir[dir_path_str] = levels
+        return levels
+
+    def invalidate(self, dir_path_str):
+        """Forgets cached rules of dir_path_str and everything below it (its .gitignore may have changed)."""
+        if dir_path_str == self.root_path_str:
+            self._levels_by_dir.clear()
+            self._load_root_levels()
+            return
+        prefix = dir_path_str + os.sep
+        for cached_dir in list(self._levels_by_dir):
+            if cached_dir == dir_path_str or cached_dir.startswith(prefix):
+                self._levels_by_dir.pop(cached_dir, None)
+
+    def __call__(self, item_path, is_dir=None):
+        item_path_str = str(item_path)
+        if not item_path_str.startswith(self.root_path_str + os.sep):
+            return False
+        if is_dir is None:
+            is_dir = os.path.isdir(item_path_str)
+
+        item_rel_posix = self._rel_posix(item_path_str)
+        levels = self._levels_for_dir(os.path.dirname(item_path_str))
+        for base_rel_posix, matcher in reversed(levels):
+            rel_to_base = item_rel_posix[len(base_rel_posix) + 1:] if base_rel_posix else item_rel_posix
+            verdict = matcher.match(rel_to_base, is_dir)
+            if verdict is not None:
+                return verdict
+        return False
@@ -3,21 +3,35 @@ import os
 import sys
 from pathlib import Path
 import json
+import multiprocessing
+import importlib.machinery
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 from datetime import datetime
 
 if __name__ == "__main__":
+    # В собранном exe дочерние процессы пула токенизации запускают этот же exe;
+    # freeze_support() обслуживает их и завершается, не доходя до GUI.
+    multiprocessing.freeze_support()
+    # Без этого spawn-процессы пула заново выполнили бы этот скрипт (и построили окно):
+    # главный модуль с именем "__main__" дочерний процесс не импортирует.
+    __spec__ = importlib.machinery.ModuleSpec("__main__", None)
     current_file_path = Path(__file__).resolve()
     core_dir = current_file_path.parent
     project_root = core_dir.parent
     if str(project_root) not in sys.path:
         sys.path.insert(0, str(project_root))
 
+from core.startup_timing import mark_startup_phase, get_startup_phases, format_startup_report
 from core.patching import process_input 
 from core.treeview_logic import (
     populate_file_tree_threaded, on_tree_click, set_all_tree_check_state,
-    update_selected_tokens_display, calculate_tokens_for_selected_threaded
+    update_selected_tokens_display, calculate_tokens_for_selected_threaded,
+    set_scan_worker_count, set_token_worker_count, set_watch_mode, set_virtual_tree_mode, on_tree_open,
+    cancel_background_jobs, set_exclusion_profiles, set_project_exclusion_profile,
+    fit_selection_to_budget, toggle_pinned_item, set_pack_priorities,
+    apply_tree_filter, check_filter_matches, FILTER_MAX_SHOWN_MATCHES, FILTER_MIN_QUERY_LENGTH,
+    set_selection_presets, save_selection_preset, apply_selection_preset, delete_selection_preset
 )
 from core.treeview_constants import (
     CHECKED_TAG, TRISTATE_TAG,
@@ -28,10 +42,26 @@ from core.gui_utils import (
     create_context_menu, copy_logs, clear_input_field, select_project_dir, clear_logs
 )
 from core.clipboard_logic import copy_project_files
-from core.file_processing import resource_path, initialize_tokenizer
+from core.fs_scanner_utils import DEFAULT_EXCLUSION_PROFILE, set_symlink_policy, SYMLINK_FOLLOW
+from core.exclusion_profiles import load_exclusion_profiles, DEFAULT_PROFILE_NAME
+from core.file_processing import (
+    resource_path, start_tokenizer_initialization, get_tokenizer_status,
+    AUTO_TOKENIZER_BACKEND, TOKENIZER_LOADING, TOKENIZER_READY
+)
 from core.ui_components import LineNumberedText
+from core.token_pool import shutdown_token_pool
+from core.context_packer import PACK_PRIORITY_RULES
+from core.path_index import MATCH_GLOB, MATCH_FUZZY
+
+mark_startup_phase("imports")
 
 APP_VERSION = datetime.now().strftime("%y.%m.%d")
+# С этим флагом приложение печатает фазы запуска в stdout и закрывается (см. core/startup_report.py).
+STARTUP_REPORT_FLAG = "--startup-report"
+TOKENIZER_STATUS_POLL_MS = 100
+DEFAULT_TOKEN_BUDGET = 100000
+# Фильтр дерева применяется, когда ввод затих на это время.
+TREE_FILTER_DEBOUNCE_MS = 150
 
 root = tk.Tk()
 root.title(f"Project Agent v{APP_VERSION}") 
@@ -59,6 +89,16 @@ project_dir_entry = tk.Entry(dir_selection_frame, width=70)
 project_dir_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
 browse_button = tk.Button(dir_selection_frame, text="Обзор...") 
 browse_button.pack(side=tk.LEFT, padx=(5, 0))
+watch_mode_var = tk.BooleanVar(value=False)
+watch_mode_checkbox = tk.Checkbutton(dir_selection_frame, text="Следить за изменениями", variable=watch_mode_var)
+watch_mode_checkbox.pack(side=tk.LEFT, padx=(5, 0))
+tk.Label(dir_selection_frame, text="Профиль исключений:").pack(side=tk.LEFT, padx=(10, 5))
+exclusion_profile_var = tk.StringVar(value=DEFAULT_PROFILE_NAME)
+exclusion_profile_combobox = ttk.Combobox(
+    dir_selection_frame, textvariable=exclusion_profile_var, state="readonly", width=14,
+    values=[DEFAULT_PROFILE_NAME]
+)
+exclusion_profile_combobox.pack(side=tk.LEFT)
 create_context_menu(project_dir_entry) 
 
 progress_frame = tk.Frame(top_controls_frame) 
@@ -67,9 +107,13 @@ progress_status_label = tk.Label(progress_frame, text="", anchor="w", width=50)
 progress_status_label.grid(row=0, column=0, sticky="ew", padx=(0, 5))
 progress_bar = ttk.Progressbar(progress_frame, orient="horizontal", length=300, mode="determinate") 
 progress_bar.grid(row=0, column=1, sticky="ew")
+cancel_job_button = tk.Button(progress_frame, text="Отмена")
+cancel_job_button.grid(row=0, column=2, padx=(5, 0))
 progress_frame.columnconfigure(1, weight=1) 
 progress_bar.grid_remove()
 progress_status_label.grid_remove()
+cancel_job_button.grid_remove()
+progress_bar.cancel_button_ref = cancel_job_button
 
 main_frame = tk.Frame(root)
 main_frame.pack(pady=(0, 10), padx=10, fill=tk.BOTH, expand=True)
@@ -126,6 +170,17 @@ right_frame.pack_propagate(False)
 
 tk.Label(right_frame, text="Выберите файлы/папки для копирования:").pack(anchor=tk.W, padx=5)
 
+filter_frame = tk.Frame(right_frame)
+filter_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
+tk.Label(filter_frame, text="Фильтр:").pack(side=tk.LEFT)
+tree_filter_var = tk.StringVar()
+tree_filter_entry = tk.Entry(filter_frame, textvariable=tree_filter_var)
+tree_filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+check_matches_button = tk.Button(filter_frame, text="Выделить найденные")
+check_matches_button.pack(side=tk.LEFT, padx=(5, 0))
+tree_filter_status_label = tk.Label(right_frame, text="Подстрока, glob (*.py, src/**/test_*) или ~нечеткий", anchor=tk.W, fg='grey')
+tree_filter_status_label.pack(fill=tk.X, padx=5)
+
 tree_view_container_frame = tk.Frame(right_frame) 
 tree_view_container_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 5), padx=5)
 tree_scrollbar_y = ttk.Scrollbar(tree_view_container_frame, orient=tk.VERTICAL)
@@ -164,7 +219,48 @@ selected_tokens_label = tk.Label(right_frame, text="Выделено токен
 selected_tokens_label.pack(fill=tk.X, pady=(0, 5), padx=5)
 file_tree.selected_tokens_label_ref = selected_tokens_label 
 
+tokenizer_status_label = tk.Label(right_frame, text="Токенизатор: загрузка...", anchor=tk.W, fg='grey')
+tokenizer_status_label.pack(fill=tk.X, pady=(0, 5), padx=5)
+
 file_tree.bind("<Button-1>", lambda event: on_tree_click(event, file_tree, selected_tokens_label))
+file_tree.bind("<<TreeviewOpen>>", lambda event: on_tree_open(event, file_tree))
+file_tree.bind("<Button-3>", lambda event: toggle_pinned_item(event, file_tree))
+
+_tree_filter_after_id = None
+_FILTER_MODE_NAMES = {MATCH_GLOB: "glob", MATCH_FUZZY: "нечеткий поиск"}
+
+def _apply_tree_filter_now():
+    global _tree_filter_after_id
+    _tree_filter_after_id = None
+    query = tree_filter_var.get()
+    result = apply_tree_filter(file_tree, query)
+    if result is None:
+        if query.strip():
+            tree_filter_status_label.config(text=f"Введите не меньше {FILTER_MIN_QUERY_LENGTH} символов")
+        else:
+            tree_filter_status_label.config(text="Подстрока, glob (*.py, src/**/test_*) или ~нечеткий")
+        return
+    mode, match_count = result
+    mode_str = f" ({_FILTER_MODE_NAMES[mode]})" if mode in _FILTER_MODE_NAMES else ""
+    shown_str = f", показаны первые {FILTER_MAX_SHOWN_MATCHES}" if match_count > FILTER_MAX_SHOWN_MATCHES else ""
+    tree_filter_status_label.config(text=f"Найдено: {match_count}{mode_str}{shown_str}")
+
+def _schedule_tree_filter(*_):
+    global _tree_filter_after_id
+    if _tree_filter_after_id is not None:
+        root.after_cancel(_tree_filter_after_id)
+    _tree_filter_after_id = root.after(TREE_FILTER_DEBOUNCE_MS, _apply_tree_filter_now)
+
+def _check_filter_matches():
+    if len(tree_filter_var.get().strip()) < FILTER_MIN_QUERY_LENGTH:
+        log_widget.insert(tk.END, "Фильтр пуст: нечего выделять.\n", ('info',))
+        return
+    checked_count = check_filter_matches(file_tree, selected_tokens_label)
+    log_widget.insert(tk.END, f"Выделено найденных файлов: {checked_count}.\n", ('info',))
+
+tree_filter_var.trace_add("write", _schedule_tree_filter)
+tree_filter_entry.bind("<Escape>", lambda event: tree_filter_var.set(""))
+check_matches_button.config(command=_check_filter_matches)
 
 tree_buttons_frame = tk.Frame(right_frame) 
 tree_buttons_frame.pack(fill=tk.X, padx=5)
@@ -187,6 +283,48 @@ calculate_tokens_button = tk.Button(
 )
 calculate_tokens_button.pack(side=tk.LEFT, padx=(5, 0))
 
+budget_frame = tk.Frame(right_frame)
+budget_frame.pack(fill=tk.X, padx=5, pady=(5, 0))
+tk.Label(budget_frame, text="Бюджет токенов:").pack(side=tk.LEFT)
+token_budget_var = tk.StringVar(value=str(DEFAULT_TOKEN_BUDGET))
+token_budget_entry = tk.Entry(budget_frame, textvariable=token_budget_var, width=10)
+token_budget_entry.pack(side=tk.LEFT, padx=(5, 0))
+
+def _fit_selection_to_budget():
+    budget_str = token_budget_var.get().replace(" ", "")
+    if not budget_str.isdigit() or int(budget_str) <= 0:
+        log_widget.insert(tk.END, f"Ошибка: бюджет токенов должен быть положительным числом, получено '{token_budget_var.get()}'.\n", ('error',))
+        return
+    fit_selection_to_budget(file_tree, int(budget_str), selected_tokens_label, log_widget)
+
+fit_budget_button = tk.Button(budget_frame, text="Уложить в бюджет", command=_fit_selection_to_budget)
+fit_budget_button.pack(side=tk.LEFT, padx=(5, 0))
+tk.Label(budget_frame, text="(ПКМ по файлу - закрепить)", fg='grey').pack(side=tk.LEFT, padx=(5, 0))
+
+presets_frame = tk.Frame(right_frame)
+presets_frame.pack(fill=tk.X, padx=5, pady=(5, 0))
+tk.Label(presets_frame, text="Набор выделения:").pack(side=tk.LEFT)
+selection_preset_combobox = ttk.Combobox(presets_frame, width=16)
+selection_preset_combobox.pack(side=tk.LEFT, padx=(5, 0))
+file_tree.selection_preset_combobox_ref = selection_preset_combobox
+
+def _apply_selection_preset():
+    name = selection_preset_combobox.get().strip()
+    if not apply_selection_preset(file_tree, name, selected_tokens_label, log_widget):
+        log_widget.insert(tk.END, f"Набор выделения '{name}' не найден для этого проекта.\n", ('warning',))
+
+def _save_selection_preset():
+    if not save_selection_preset(file_tree, selection_preset_combobox.get(), log_widget):
+        log_widget.insert(tk.END, "Введите имя набора и откройте проект, чтобы сохранить выделение.\n", ('warning',))
+
+selection_preset_combobox.bind("<<ComboboxSelected>>", lambda event: _apply_selection_preset())
+tk.Button(presets_frame, text="Сохранить", command=_save_selection_preset).pack(side=tk.LEFT, padx=(5, 0))
+tk.Button(presets_frame, text="Применить", command=_apply_selection_preset).pack(side=tk.LEFT, padx=(5, 0))
+tk.Button(
+    presets_frame, text="Удалить",
+    command=lambda: delete_selection_preset(file_tree, selection_preset_combobox.get().strip(), log_widget)
+).pack(side=tk.LEFT, padx=(5, 0))
+
 copy_options_frame = tk.Frame(right_frame)
 copy_options_frame.pack(fill=tk.X, pady=(5,0), padx=5)
 
@@ -256,6 +394,11 @@ clear_log_button = tk.Button(log_buttons_frame, text="Очистить лог",
 clear_log_button.pack(side=tk.RIGHT)
 
 file_tree.log_widget_ref = log_widget 
+file_tree.exclusion_profile_var_ref = exclusion_profile_var
+
+cancel_job_button.config(command=lambda: cancel_background_jobs(
+    file_tree, log_widget, progress_bar, progress_status_label
+))
 
 browse_button.config(command=lambda: select_project_dir(
     project_dir_entry, file_tree, log_widget, progress_bar, progress_status_label
@@ -268,36 +411,104 @@ def start_populating_tree(dir_to_scan, is_initial_load=False):
         force_rescan=not is_initial_load 
     )
 
+mark_startup_phase("ui")
+
 config_file_path_obj = Path(project_root) / "app_config.json"
+config_data = {}
 if config_file_path_obj.is_file():
     with open(config_file_path_obj, 'r', encoding='utf-8') as f_config:
         config_data = json.load(f_config)
-    loaded_last_dir = config_data.get("last_project_dir")
-    
-    if loaded_last_dir and Path(loaded_last_dir).is_dir():
-        project_dir_entry.insert(0, loaded_last_dir)
-        root.after(150, lambda: start_populating_tree(loaded_last_dir, is_initial_load=True))
-    else: 
-        if not file_tree.get_children(""): 
-            root.after(150, lambda: start_populating_tree(None, is_initial_load=True)) 
-else: 
-    if not file_tree.get_children(""): 
-        root.after(150, lambda: start_populating_tree(None, is_initial_load=True))
+    if "scan_workers" in config_data:
+        set_scan_worker_count(config_data["scan_workers"])
+    if "token_workers" in config_data:
+        set_token_worker_count(config_data["token_workers"])
+    watch_mode_var.set(bool(config_data.get("watch_mode", False)))
+    set_virtual_tree_mode(config_data.get("virtual_tree", True))
+    set_symlink_policy(config_data.get("symlink_policy", SYMLINK_FOLLOW))
+    token_budget_var.set(str(config_data.get("token_budget", DEFAULT_TOKEN_BUDGET)))
+    if "budget_priorities" in config_data:
+        unknown_rules = [rule for rule in config_data["budget_priorities"] if rule not in PACK_PRIORITY_RULES]
+        if unknown_rules:
+            log_widget.insert(tk.END, f"Неизвестные правила приоритета в budget_priorities: {', '.join(unknown_rules)}\n", ('warning',))
+        set_pack_priorities(rule for rule in config_data["budget_priorities"] if rule in PACK_PRIORITY_RULES)
+
+# Словари профилей проектов и наборов выделения связываются с config_data и без файла
+# настроек, иначе созданное при первом запуске не сохранится при закрытии.
+loaded_profiles, profile_errors = load_exclusion_profiles(config_data, DEFAULT_EXCLUSION_PROFILE)
+for profile_error in profile_errors:
+    log_widget.insert(tk.END, f"{profile_error}\n", ('warning',))
+set_exclusion_profiles(loaded_profiles, config_data.setdefault("project_exclusion_profiles", {}))
+set_selection_presets(config_data.setdefault("selection_presets", {}))
+exclusion_profile_combobox.config(values=sorted(loaded_profiles, key=lambda n: (n != DEFAULT_PROFILE_NAME, n)))
+loaded_last_dir = config_data.get("last_project_dir")
+
+if loaded_last_dir and Path(loaded_last_dir).is_dir():
+    project_dir_entry.insert(0, loaded_last_dir)
+    root.after(150, lambda: start_populating_tree(loaded_last_dir, is_initial_load=True))
+elif not file_tree.get_children(""):
+    root.after(150, lambda: start_populating_tree(None, is_initial_load=True))
+
+def _apply_watch_mode():
+    set_watch_mode(
+        watch_mode_var.get(), file_tree, log_widget, progress_bar, progress_status_label,
+        poll_interval=config_data.get("watch_poll_interval")
+    )
+
+watch_mode_checkbox.config(command=_apply_watch_mode)
+exclusion_profile_combobox.bind("<<ComboboxSelected>>", lambda e: set_project_exclusion_profile(
+    exclusion_profile_var.get(), file_tree, log_widget, progress_bar, progress_status_label
+))
+_apply_watch_mode()
+mark_startup_phase("config")
 
 def on_window_closing():
     current_project_dir_str = project_dir_entry.get()
-    config_to_save = {"last_project_dir": ""}
+    config_to_save = dict(config_data)
+    config_to_save["last_project_dir"] = ""
+    config_to_save["watch_mode"] = watch_mode_var.get()
+    if token_budget_var.get().replace(" ", "").isdigit():
+        config_to_save["token_budget"] = int(token_budget_var.get().replace(" ", ""))
     if Path(current_project_dir_str).is_dir(): 
         config_to_save["last_project_dir"] = current_project_dir_str
     
     with open(config_file_path_obj, 'w', encoding='utf-8') as f_config_save:
         json.dump(config_to_save, f_config_save, indent=4)
     
+    shutdown_token_pool()
     root.destroy() 
 
 root.protocol("WM_DELETE_WINDOW", on_window_closing)
 
-initialize_tokenizer(log_widget)
+def _finish_startup_report_if_complete():
+    marked_phases = {phase_name for phase_name, _, _ in get_startup_phases()}
+    if {"first_idle", "tokenizer"} <= marked_phases and STARTUP_REPORT_FLAG in sys.argv:
+        print(format_startup_report(), flush=True)
+        root.destroy()
+
+def _poll_tokenizer_status():
+    state, status_text = get_tokenizer_status()
+    if state == TOKENIZER_LOADING:
+        root.after(TOKENIZER_STATUS_POLL_MS, _poll_tokenizer_status)
+        return
+    mark_startup_phase("tokenizer")
+    if not tokenizer_status_label.winfo_exists():
+        return
+    if state == TOKENIZER_READY:
+        tokenizer_status_label.config(text=f"Токенизатор: {status_text}", fg='green')
+        log_widget.insert(tk.END, f"Токенизатор готов: {status_text}.\n", ('success',))
+    else:
+        tokenizer_status_label.config(text="Токенизатор: ошибка загрузки", fg='red')
+        log_widget.insert(tk.END, f"Ошибка инициализации токенизатора ({status_text}).\n", ('error',))
+    _finish_startup_report_if_complete()
+
+def _on_first_idle():
+    mark_startup_phase("first_idle")
+    log_widget.insert(tk.END, f"Окно готово за {get_startup_phases()[-1][1]:.0f} мс.\n", ('info',))
+    _finish_startup_report_if_complete()
+
+start_tokenizer_initialization(config_data.get("tokenizer_backend", AUTO_TOKENIZER_BACKEND))
+root.after(TOKENIZER_STATUS_POLL_MS, _poll_tokenizer_status)
+root.after_idle(_on_first_idle)
 
 if __name__ == "__main__":
     root.mainloop()
\ No newline at end of file
@@ -8,9 +8,6 @@ import shutil
 import tkinter as tk 
 from pathlib import Path
 
-# This will crash if the module is not installed.
-import diff_match_patch as dmp_module
-
 def _run_git_command(command, cwd, log_widget, step_name=""):
     """Helper function to run git and log the output."""
     if log_widget.winfo_exists():
@@ -85,6 +82,10 @@ def apply_diff_with_dmp(project_dir, diff_content, log_widget):
 
 def apply_git_diff_manually_with_dmp(project_dir, diff_content, log_widget):
     """Manually parses and applies a git diff using diff-match-patch."""
+    # Импорт отложен до первого применения DMP, чтобы не замедлять запуск.
+    # This will crash if the module is not installed.
+    import diff_match_patch as dmp_module
+
     project_root = Path(project_dir).resolve()
     dmp = dmp_module.diff_match_patch()
     all_patches = {}; current_file = None; diff_lines = []
@@ -0,0 +1,151 @@
+# core/path_index.py
+# Поиск по относительным путям дерева: подстрока, glob и нечеткий поиск.
+# Все пути склеены в одну строку (по пути на строку), поэтому запрос - это один
+# проход регулярного выражения на C, а не цикл Python по сотням тысяч путей.
+import os
+import re
+import bisect
+import itertools
+
+MATCH_SUBSTRING = "substring"
+MATCH_GLOB = "glob"
+MATCH_FUZZY = "fuzzy"
+# Запрос с этим префиксом ищется нечетко: символы по порядку, с любыми промежутками.
+FUZZY_QUERY_PREFIX = "~"
+GLOB_CHARS = frozenset("*?[")
+
+def _glob_to_regex(pattern):
+    """
+    Translates a glob into a regex for fullmatch. Like .gitignore: '*' and '?'
+    stop at '/', '**' crosses it; a pattern without '/' is matched against the
+    item name only, so it finds items at any depth.
+    """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            # "a/**/b" покрывает и "a/b": промежуточных папок может не быть.
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[" and pattern.find("]", i + 2) >= 0:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end]
+            negate = body[:1] in ("!", "^")
+            body = body[1:] if negate else body
+            parts.append("[" + ("^/" if negate else "") + body.replace("\\", "\\\\") + "]")
+            i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return re.compile("".join(parts))
+
+def _glob_literal(pattern):
+    """Longest run of plain characters in a glob: every path it matches contains it."""
+    # "**/" целиком - подстановка: "/" после "**" в пути может отсутствовать.
+    runs = re.split(r"\*\*/|\[[^\]]*\]|[*?\[\]]", pattern)
+    return max(runs, key=len)
+
+def _fuzzy_to_regex(query):
+    """
+    Characters in order with anything but a newline between. Every '[^\\nc]*c' step
+    stops at the first c, so a failing path is given up without backtracking.
+    """
+    chars = [char for char in query if not char.isspace()]
+    if not chars:
+        return None
+    return re.compile(re.escape(chars[0]) + "".join(f"[^\\n{re.escape(char)}]*{re.escape(char)}" for char in chars[1:]))
+
+class PathIndex:
+    """
+    Case-insensitive index of item paths relative to the project root, with '/'
+    as the separator whatever the platform. Built once from the model and read
+    only afterwards; rebuild it when the tree structure changes.
+    """
+    def __init__(self, entries):
+        """entries: (item_id, rel_path) pairs in display order."""
+        self.item_ids = []
+        paths = []
+        for item_id, rel_path in entries:
+            self.item_ids.append(item_id)
+            paths.append(rel_path.replace(os.sep, "/").lower())
+        self._text = "".join(path + "\n" for path in paths)
+        # Смещения начал строк (и конца текста): по позиции совпадения bisect находит номер пути.
+        self._line_starts = list(itertools.accumulate((len(path) + 1 for path in paths), initial=0))
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def _matching_lines(self, regex):
+        """
+        Numbers of the lines regex finds something in, each once, in order. After a
+        hit the search resumes at the next line, so a short query that occurs many
+        times per path costs one search per matching path, not per occurrence.
+        """
+        text, line_starts = self._text, self._line_starts
+        pos = 0
+        while True:
+            match = regex.search(text, pos)
+            if match is None:
+                return
+            line = bisect.bisect_right(line_starts, match.start()) - 1
+            yield line
+            pos = line_starts[line + 1]
+
+    def _line(self, line):
+        return self._text[self._line_starts[line]:self._line_starts[line + 1] - 1]
+
+    def search(self, query):
+        """
+        Returns (mode, item_ids) for a query: glob if it has *, ? or [, fuzzy if it
+        starts with '~', otherwise substring, falling back to fuzzy if nothing contains it.
+        Ids are in display order. An empty query matches nothing.
+        """
+        query = query.strip().lower().replace("\\", "/")
+        if query.startswith(FUZZY_QUERY_PREFIX):
+            return MATCH_FUZZY, self._fuzzy_ids(query[len(FUZZY_QUERY_PREFIX):])
+        if not query:
+            return MATCH_SUBSTRING, []
+        if GLOB_CHARS.intersection(query):
+            return MATCH_GLOB, self._glob_ids(query.lstrip("/"))
+
+        # Поиск подстроки в общем тексте идет быстрым поиском литерала на C.
+        match_ids = [self.item_ids[line] for line in self._matching_lines(re.compile(re.escape(query)))]
+        if match_ids:
+            return MATCH_SUBSTRING, match_ids
+        return MATCH_FUZZY, self._fuzzy_ids(query)
+
+    def _fuzzy_ids(self, query):
+        regex = _fuzzy_to_regex(query)
+        if regex is None:
+            return []
+        return [self.item_ids[line] for line in self._matching_lines(regex)]
+
+    def _glob_ids(self, pattern):
+        match_basename = "/" not in pattern
+        regex = _glob_to_regex(pattern)
+        literal = _glob_literal(pattern)
+        # Кандидаты - пути с самым длинным литералом шаблона (в конце строки, если шаблон
+        # им заканчивается); без литерала проверяются все пути.
+        if literal:
+            literal_regex = re.escape(literal) + ("$" if pattern.endswith(literal) else "")
+            candidate_lines = self._matching_lines(re.compile(literal_regex, re.MULTILINE))
+        else:
+            candidate_lines = range(len(self.item_ids))
+        match_ids = []
+        for line in candidate_lines:
+            path = self._line(line)
+            if match_basename:
+                path = path[path.rfind("/") + 1:]
+            if regex.fullmatch(path):
+                match_ids.append(self.item_ids[line])
+        return match_ids
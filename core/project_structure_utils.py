@@ -3,58 +3,56 @@ import os
 from pathlib import Path
 import tkinter as tk
 
-from core.fs_scanner_utils import should_exclude_item
+from core.fs_scanner_utils import (
+    should_exclude_item, scan_directory_entries, should_descend_directory, directory_key
+)
 
 LINE_VERTICAL = "│   "
 LINE_INTERSECTION = "├── "
 LINE_CORNER = "└── "
 LINE_EMPTY = "    "
 
-def _generate_structure_recursive_for_full(
-    current_dir_to_scan: Path,
-    project_root_obj: Path,
-    prefix_str: str,
-    gitignore_matcher_func,
-    log_widget_ref
-):
-    """Recursively generates tree structure strings."""
-    lines = []
-    
-    if not (os.access(str(current_dir_to_scan), os.R_OK) and os.access(str(current_dir_to_scan), os.X_OK)):
-        return lines 
-
-    # This will crash on permission errors for iterdir().
-    all_items = list(current_dir_to_scan.iterdir())
-    items_in_current_dir = []
-    for item_obj in all_items:
-        if not should_exclude_item(item_obj.resolve(), item_obj.name, item_obj.is_dir(), gitignore_matcher_func):
-            items_in_current_dir.append(item_obj)
-    
-    items_in_current_dir.sort(key=lambda x: (not x.is_dir(), x.name.lower()))
+def _list_structure_children(dir_path_str, gitignore_matcher_func):
+    """Visible entries of one directory; an unreadable directory is shown as empty."""
+    try:
+        entries = scan_directory_entries(dir_path_str)
+    except OSError:
+        return []
+    return [
+        entry for entry in entries
+        if not should_exclude_item(entry.path, entry.name, entry.is_dir, gitignore_matcher_func)
+    ]
 
-    num_items = len(items_in_current_dir)
-    for i, item_obj in enumerate(items_in_current_dir):
-        is_last_item = (i == num_items - 1)
-        entry_line = prefix_str
-        if is_last_item:
-            entry_line += LINE_CORNER
+def _generate_structure_lines_for_full(project_root_obj: Path, gitignore_matcher_func):
+    """
+    Generates tree structure strings with an explicit stack, entering every
+    directory at most once (see should_descend_directory).
+    """
+    lines = []
+    root_path_str = str(project_root_obj)
+    visited_dir_keys = {directory_key(root_path_str)}
+    # Каждый уровень стека: (оставшиеся записи папки в обратном порядке, префикс ее строк).
+    stack = [(_list_structure_children(root_path_str, gitignore_matcher_func)[::-1], "")]
+    while stack:
+        remaining_entries, prefix_str = stack[-1]
+        if not remaining_entries:
+            stack.pop()
+            continue
+        entry = remaining_entries.pop()
+        if not remaining_entries:
+            entry_line = prefix_str + LINE_CORNER
             new_prefix_for_children = prefix_str + LINE_EMPTY
         else:
-            entry_line += LINE_INTERSECTION
+            entry_line = prefix_str + LINE_INTERSECTION
             new_prefix_for_children = prefix_str + LINE_VERTICAL
-        
-        entry_line += item_obj.name
 
-        if item_obj.is_dir():
-            entry_line += "/"
-            lines.append(entry_line)
-            lines.extend(_generate_structure_recursive_for_full(
-                item_obj, project_root_obj, new_prefix_for_children,
-                gitignore_matcher_func, log_widget_ref
-            ))
-        else: 
-            lines.append(entry_line)
-            
+        if not entry.is_dir:
+            lines.append(entry_line + entry.name)
+            continue
+        lines.append(entry_line + entry.name + "/")
+        if should_descend_directory(entry.is_symlink, entry.dir_key, visited_dir_keys):
+            children = _list_structure_children(entry.path, gitignore_matcher_func)
+            stack.append((children[::-1], new_prefix_for_children))
     return lines
 
 def generate_full_project_structure(project_dir_path_str: str, log_widget_ref, gitignore_matcher_func):
@@ -74,9 +72,7 @@ def generate_full_project_structure(project_dir_path_str: str, log_widget_ref, g
     structure_lines = [project_root_obj.name] 
 
     if os.access(str(project_root_obj), os.R_OK) and os.access(str(project_root_obj), os.X_OK):
-        structure_lines.extend(_generate_structure_recursive_for_full(
-            project_root_obj, project_root_obj, "", gitignore_matcher_func, log_widget_ref
-        ))
+        structure_lines.extend(_generate_structure_lines_for_full(project_root_obj, gitignore_matcher_func))
     elif log_widget_ref and log_widget_ref.winfo_exists():
         log_widget_ref.insert(tk.END, f"Структура (полная): Нет доступа к корневой директории '{project_root_obj}'.\n", ('warning',))
 
@@ -0,0 +1,123 @@
+# core/scan_index.py
+# Персистентный индекс результатов сканирования: позволяет показать дерево
+# ранее открытого проекта сразу, без полного обхода диска.
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+
+from core.file_processing import get_app_cache_dir
+from core.content_sniffer import remember_verdicts, verdicts_under, verdict_generation
+
+SCAN_INDEX_VERSION = 3
+SCAN_INDEX_SUBDIR = "scan_index"
+SNIFF_VERDICTS_VERSION = 1
+
+_saved_verdict_generations = {}  # корень проекта -> verdict_generation() на момент записи
+
+def _index_file_path(root_path_str, suffix=".json.gz"):
+    key = hashlib.sha1(os.path.normcase(root_path_str).encode('utf-8')).hexdigest()
+    return os.path.join(get_app_cache_dir(SCAN_INDEX_SUBDIR), f"{key}{suffix}")
+
+def _write_gzip_json(file_path, payload):
+    """
+    Writes through a temporary file of its own in the same directory, so overlapping
+    writes (another save, another app instance) never share it. Raises OSError.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(file_path))
+    try:
+        with os.fdopen(fd, 'wb') as raw_file, gzip.open(raw_file, 'wt', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def save_scan_index(root_path_str, nodes, profile_key=""):
+    """
+    Writes the index for a project root.
+    nodes: (parent_id, item_id, status_tags, data_dict) tuples in parent-before-child
+    order, the first one being the root itself.
+    profile_key: key of the settings the scan used (exclusion profile, symlink policy).
+    """
+    positions = {}
+    records = []
+    for parent_id, item_id, status_tags, data in nodes:
+        positions[item_id] = len(records)
+        records.append([
+            positions.get(parent_id, -1), data['name_only'], data['is_dir'], list(status_tags),
+            data.get('status_msg', ''), data.get('size', 0), data.get('mtime', 0.0), data.get('tokens'),
+            data.get('tokens_estimated', False)
+        ])
+
+    payload = {"version": SCAN_INDEX_VERSION, "root": root_path_str, "profile": profile_key, "nodes": records}
+    _write_gzip_json(_index_file_path(root_path_str), payload)
+
+def load_scan_index(root_path_str, profile_key=""):
+    """
+    Reads the index for a project root.
+    Returns (parent_id, item_id, status_tags, data_dict) tuples in the order they were
+    saved, or None if there is no usable index (including one built with another exclusion profile).
+    """
+    index_path = _index_file_path(root_path_str)
+    if not os.path.isfile(index_path):
+        return None
+    try:
+        with gzip.open(index_path, 'rt', encoding='utf-8') as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get("version") != SCAN_INDEX_VERSION or payload.get("root") != root_path_str:
+        return None
+    if payload.get("profile", "") != profile_key:
+        return None
+
+    nodes, ids, rel_paths = [], [], []
+    for parent_idx, name, is_dir, status_tags, status_msg, size, mtime, tokens, tokens_estimated in payload["nodes"]:
+        if parent_idx < 0:
+            parent_id, item_id, rel_path = "", root_path_str, ""
+        else:
+            parent_id = ids[parent_idx]
+            parent_rel = rel_paths[parent_idx]
+            item_id = os.path.join(parent_id, name)
+            rel_path = parent_rel + os.sep + name if parent_rel else name
+        ids.append(item_id)
+        rel_paths.append(rel_path)
+        data = {
+            'name_only': name, 'is_dir': is_dir, 'is_file': not is_dir,
+            'rel_path': rel_path, 'tokens': tokens, 'tokens_estimated': tokens_estimated,
+            'status_msg': status_msg, 'size': size, 'mtime': mtime
+        }
+        nodes.append((parent_id, item_id, tuple(status_tags), data))
+    return nodes
+
+def save_sniff_verdicts(root_path_str):
+    """
+    Writes the content-sniff verdicts for the files of a project, so the next launch
+    does not open every unknown file again. Skipped if nothing was sniffed since the last write.
+    """
+    generation = verdict_generation()
+    if _saved_verdict_generations.get(root_path_str) == generation:
+        return
+    prefix_len = len(os.path.join(root_path_str, ""))
+    verdicts = {path[prefix_len:]: list(verdict) for path, verdict in verdicts_under(root_path_str).items()}
+    payload = {"version": SNIFF_VERDICTS_VERSION, "root": root_path_str, "verdicts": verdicts}
+    _write_gzip_json(_index_file_path(root_path_str, ".sniff.json.gz"), payload)
+    _saved_verdict_generations[root_path_str] = generation
+
+def load_sniff_verdicts(root_path_str):
+    """Puts the saved verdicts of a project into the sniffer cache; a verdict is reused only while size and mtime_ns match."""
+    try:
+        with gzip.open(_index_file_path(root_path_str, ".sniff.json.gz"), 'rt', encoding='utf-8') as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return
+    if payload.get("version") != SNIFF_VERDICTS_VERSION or payload.get("root") != root_path_str:
+        return
+    remember_verdicts({
+        os.path.join(root_path_str, rel_path): verdict for rel_path, verdict in payload.get("verdicts", {}).items()
+    })
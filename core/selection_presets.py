@@ -0,0 +1,63 @@
+# core/selection_presets.py
+# Именованные наборы выделения: выделение дерева сохраняется как список
+# относительных путей ('/' как разделитель) и применяется к модели одной пачкой.
+# Полностью выделенная папка хранится одной записью "папка/", поэтому набор
+# компактен и новые файлы в такой папке при повторном применении тоже выделяются.
+import os
+
+from core.tree_model import CHECKED
+
+DIR_ENTRY_SUFFIX = "/"
+
+_path_map_cache = (None, None, None)  # (model, structure_version, {rel_path: node})
+
+def _rel_path_map(model):
+    """{'a/b.py': node} for the whole model; cached until the tree structure changes."""
+    global _path_map_cache
+    cached_model, cached_version, path_map = _path_map_cache
+    if cached_model is not model or cached_version != model.structure_version:
+        path_map = {rel_path.replace(os.sep, "/"): node for node, rel_path in model.iter_rel_paths()}
+        _path_map_cache = (model, model.structure_version, path_map)
+    return path_map
+
+def capture_selection(model):
+    """The checked items of the model as preset entries, in tree order."""
+    entries = []
+    stack = [(child, "") for root_node in reversed(model.roots) for child in reversed(root_node.children or ())]
+    while stack:
+        node, prefix = stack.pop()
+        rel_path = prefix + node.name
+        if node.is_dir:
+            if node.check_state == CHECKED:
+                entries.append(rel_path + DIR_ENTRY_SUFFIX)
+            elif node.children:
+                stack.extend((child, rel_path + "/") for child in reversed(node.children))
+        elif model.is_checked_active_file(node):
+            entries.append(rel_path)
+    return entries
+
+def apply_selection(model, entries):
+    """
+    Checks exactly the files the entries name (files of "dir/" entries included)
+    and unchecks all others, in one batch that touches only the files whose state
+    differs. Returns the entries not found in the tree.
+    """
+    path_map = _rel_path_map(model)
+    selected_ids = set()
+    missing_entries = []
+    for entry in entries:
+        is_dir_entry = entry.endswith(DIR_ENTRY_SUFFIX)
+        node = path_map.get(entry[:-len(DIR_ENTRY_SUFFIX)] if is_dir_entry else entry)
+        if node is None or node.is_dir != is_dir_entry:
+            missing_entries.append(entry)
+        elif is_dir_entry:
+            selected_ids.update(
+                child.item_id for child in model.iter_preorder(node.item_id) if child.is_file and not child.disabled
+            )
+        elif not node.disabled:
+            selected_ids.add(node.item_id)
+    checked_ids = set(model.checked_file_ids())
+    changes = dict.fromkeys(checked_ids - selected_ids, False)
+    changes.update(dict.fromkeys(selected_ids - checked_ids, True))
+    model.set_file_check_states(changes)
+    return missing_entries
@@ -0,0 +1,84 @@
+# core/startup_report.py
+# Отчет о холодном запуске: время импортов (по данным python -X importtime) и фазы запуска
+# приложения. Результат можно сохранить в JSON и сравнивать между релизами.
+# Запуск из корня проекта: python core/startup_report.py [--top 15] [--json startup.json]
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+_PHASE_LINE = re.compile(r"^\s+(\S+)\s+([\d.]+)\s+\(с начала: ([\d.]+)\)")
+
+def parse_importtime(stderr_text):
+    """
+    Parses `-X importtime` output.
+    Returns [(module, self_us, cumulative_us, depth)] in the order Python reported them.
+    """
+    modules = []
+    for line in stderr_text.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return modules
+
+def parse_startup_phases(stdout_text):
+    """Reads the phase lines printed by main.py --startup-report: {phase: (duration_ms, elapsed_ms)}."""
+    phases = {}
+    for line in stdout_text.splitlines():
+        match = _PHASE_LINE.match(line)
+        if match:
+            phases[match.group(1)] = (float(match.group(2)), float(match.group(3)))
+    return phases
+
+def summarize_by_package(modules):
+    """Self time summed per top-level package, in milliseconds, slowest first."""
+    totals = {}
+    for module, self_us, _, _ in modules:
+        package = module.split('.')[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(((package, us / 1000) for package, us in totals.items()), key=lambda item: -item[1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время холодного запуска Project Agent.")
+    parser.add_argument("--top", type=int, default=15, help="сколько самых тяжелых пакетов показать")
+    parser.add_argument("--json", dest="json_path", help="сохранить отчет в JSON-файл")
+    args = parser.parse_args(argv)
+
+    project_root = Path(__file__).resolve().parent.parent
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(project_root / "core" / "main.py"), "--startup-report"],
+        cwd=str(project_root), capture_output=True, text=True, encoding='utf-8', errors='replace'
+    )
+    modules = parse_importtime(result.stderr)
+    phases = parse_startup_phases(result.stdout)
+    if result.returncode != 0 or not phases:
+        print(f"Приложение завершилось с кодом {result.returncode} без отчета о фазах.")
+        print("\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))[-2000:])
+        sys.exit(1)
+
+    total_import_ms = sum(self_us for _, self_us, _, _ in modules) / 1000
+    packages = summarize_by_package(modules)
+    print(f"Импорты: {len(modules)} модулей, {total_import_ms:.1f} мс (собственное время)")
+    for package, ms in packages[:args.top]:
+        print(f"  {package:<28} {ms:>9.1f}")
+    print("Фазы запуска (мс):")
+    for phase_name, (duration_ms, elapsed_ms) in phases.items():
+        print(f"  {phase_name:<28} {duration_ms:>9.1f}  (с начала: {elapsed_ms:.1f})")
+
+    if args.json_path:
+        report = {
+            "python": sys.version.split()[0],
+            "import_total_ms": round(total_import_ms, 1),
+            "packages_ms": {package: round(ms, 1) for package, ms in packages},
+            "phases_ms": {name: {"duration": d, "elapsed": e} for name, (d, e) in phases.items()},
+        }
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Отчет сохранен: {args.json_path}")
+
+if __name__ == "__main__":
+    main()
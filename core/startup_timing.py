@@ -0,0 +1,26 @@
+# core/startup_timing.py
+# Отметки фаз запуска приложения. Модуль импортируется первым в main.py,
+# поэтому его импорт считается нулевой точкой отсчета.
+import time
+
+_startup_origin = time.perf_counter()
+_startup_phases = []  # (имя фазы, секунды от _startup_origin)
+
+def mark_startup_phase(phase_name):
+    """Records that phase_name has just finished. Only call from the Tk thread."""
+    _startup_phases.append((phase_name, time.perf_counter() - _startup_origin))
+
+def get_startup_phases():
+    """[(phase_name, elapsed_ms_since_start, phase_duration_ms)] in the order they were marked."""
+    result = []
+    previous = 0.0
+    for phase_name, elapsed in _startup_phases:
+        result.append((phase_name, elapsed * 1000, (elapsed - previous) * 1000))
+        previous = elapsed
+    return result
+
+def format_startup_report():
+    lines = ["Фазы запуска (мс):"]
+    for phase_name, elapsed_ms, duration_ms in get_startup_phases():
+        lines.append(f"  {phase_name:<24} {duration_ms:>9.1f}  (с начала: {elapsed_ms:.1f})")
+    return "\n".join(lines)
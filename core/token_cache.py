@@ -0,0 +1,134 @@
+# core/token_cache.py
+# Персистентный кэш числа токенов, общий для всех проектов.
+# Число токенов хранится по (токенизатор, sha256 содержимого), поэтому одинаковые файлы
+# (например, vendored-копии) считаются один раз. Отдельная таблица путей с (size, mtime_ns)
+# позволяет не читать и не хэшировать файлы, которые не менялись.
+import os
+import time
+import sqlite3
+import threading
+
+from core.file_processing import get_app_cache_dir
+
+TOKEN_CACHE_SUBDIR = "token_cache"
+TOKEN_CACHE_FILE_NAME = "token_counts.sqlite3"
+MAX_TOKEN_CACHE_ENTRIES = 200000
+# При переполнении удаляется чуть больше лишнего, чтобы не чистить кэш после каждой записи.
+TOKEN_CACHE_EVICTION_SLACK = 0.1
+_COMMIT_EVERY_WRITES = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contents (
+    tokenizer_id TEXT NOT NULL, content_hash TEXT NOT NULL, tokens INTEGER NOT NULL, last_used REAL NOT NULL,
+    PRIMARY KEY (tokenizer_id, content_hash)
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL, last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contents_lru ON contents (last_used);
+CREATE INDEX IF NOT EXISTS files_lru ON files (last_used);
+"""
+
+class TokenCountCache:
+    """
+    Thread-safe; every method may raise sqlite3.Error. Writes are committed in
+    batches, call flush() when a batch of counts is done.
+    """
+    def __init__(self, db_path, max_entries=MAX_TOKEN_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def lookup_by_stat(self, path_str, size, mtime_ns, tokenizer_id):
+        """Token count for a file whose size and mtime are unchanged since it was last hashed, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT c.tokens, c.content_hash FROM files f JOIN contents c"
+                " ON c.content_hash = f.content_hash AND c.tokenizer_id = ?"
+                " WHERE f.path = ? AND f.size = ? AND f.mtime_ns = ?",
+                (tokenizer_id, os.path.normcase(path_str), size, mtime_ns)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(row[1], tokenizer_id, path_str)
+            return row[0]
+
+    def lookup_by_hash(self, content_hash, tokenizer_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tokens FROM contents WHERE tokenizer_id = ? AND content_hash = ?",
+                (tokenizer_id, content_hash)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(content_hash, tokenizer_id, None)
+            return row[0]
+
+    def remember_file(self, path_str, size, mtime_ns, content_hash):
+        """Records which content a path had at this (size, mtime_ns)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash, last_used) VALUES (?, ?, ?, ?, ?)",
+                (os.path.normcase(path_str), size, mtime_ns, content_hash, time.time())
+            )
+            self._after_write()
+
+    def store_tokens(self, content_hash, tokenizer_id, tokens):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO contents (tokenizer_id, content_hash, tokens, last_used) VALUES (?, ?, ?, ?)",
+                (tokenizer_id, content_hash, tokens, time.time())
+            )
+            self._after_write()
+
+    def flush(self):
+        """Commits pending writes and evicts least recently used entries beyond max_entries."""
+        with self._lock:
+            for table in ("contents", "files"):
+                count = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                if count > self.max_entries:
+                    excess = count - self.max_entries + int(self.max_entries * TOKEN_CACHE_EVICTION_SLACK)
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY last_used LIMIT ?)",
+                        (excess,)
+                    )
+            self._conn.commit()
+            self._pending_writes = 0
+
+    def _touch(self, content_hash, tokenizer_id, path_str):
+        now = time.time()
+        self._conn.execute(
+            "UPDATE contents SET last_used = ? WHERE tokenizer_id = ? AND content_hash = ?",
+            (now, tokenizer_id, content_hash)
+        )
+        if path_str is not None:
+            self._conn.execute("UPDATE files SET last_used = ? WHERE path = ?", (now, os.path.normcase(path_str)))
+        self._after_write()
+
+    def _after_write(self):
+        self._pending_writes += 1
+        if self._pending_writes >= _COMMIT_EVERY_WRITES:
+            self._conn.commit()
+            self._pending_writes = 0
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+_token_cache_disabled = False
+
+def get_token_cache():
+    """The shared cache in the app cache dir, or None if it can't be opened (counting then works uncached)."""
+    global _token_cache, _token_cache_disabled
+    with _token_cache_lock:
+        if _token_cache is None and not _token_cache_disabled:
+            try:
+                db_path = os.path.join(get_app_cache_dir(TOKEN_CACHE_SUBDIR), TOKEN_CACHE_FILE_NAME)
+                _token_cache = TokenCountCache(db_path)
+            except (OSError, sqlite3.Error):
+                _token_cache_disabled = True
+        return _token_cache
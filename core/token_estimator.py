@@ -0,0 +1,107 @@
+# core/token_estimator.py
+# Мгновенная оценка числа токенов по размеру файла, без чтения содержимого.
+# Для каждого расширения хранится, сколько байт приходится на токен; соотношение
+# уточняется по точным подсчетам и сохраняется между запусками.
+import os
+import json
+import threading
+
+from core.file_processing import get_app_cache_dir
+
+TOKEN_ESTIMATOR_SUBDIR = "token_estimator"
+TOKEN_ESTIMATOR_FILE_NAME = "bytes_per_token.json"
+TOKEN_ESTIMATOR_VERSION = 1
+
+DEFAULT_BYTES_PER_TOKEN = 4.0
+# Начальные соотношения для токенизатора GPT-2, пока нет собственных подсчетов.
+_DEFAULT_EXTENSION_RATIOS = {
+    '.py': 3.6, '.js': 3.4, '.ts': 3.4, '.jsx': 3.3, '.tsx': 3.3, '.java': 3.8, '.cs': 3.8,
+    '.c': 3.4, '.h': 3.6, '.cpp': 3.4, '.hpp': 3.6, '.go': 3.4, '.rs': 3.4, '.php': 3.4,
+    '.html': 3.2, '.xml': 3.0, '.css': 3.0, '.scss': 3.0, '.json': 3.0, '.yaml': 3.4, '.yml': 3.4,
+    '.sql': 3.6, '.csv': 2.6, '.md': 4.2, '.txt': 4.2, '.rst': 4.2, '.ini': 3.6, '.toml': 3.6,
+}
+# Вес начального соотношения в байтах: собственные подсчеты перевешивают его примерно с 16 КБ.
+PRIOR_WEIGHT_BYTES = 16 * 1024
+# При превышении объем наблюдений делится пополам, чтобы соотношение следовало за проектами.
+MAX_OBSERVED_BYTES = 64 * 1024 * 1024
+
+class TokenEstimator:
+    """
+    Predicts token counts from file size and extension. The bytes-per-token ratio of
+    an extension is the default ratio blended with all exact counts observed so far.
+    Thread-safe: workers estimate while the GUI thread observes finished counts.
+    """
+    def __init__(self, observed=None):
+        self._observed = {ext: [int(b), int(t)] for ext, (b, t) in (observed or {}).items()}
+        self.dirty = False
+
+    @staticmethod
+    def _extension(file_name):
+        return os.path.splitext(file_name)[1].lower()
+
+    def bytes_per_token(self, extension):
+        prior_ratio = _DEFAULT_EXTENSION_RATIOS.get(extension, DEFAULT_BYTES_PER_TOKEN)
+        observed_bytes, observed_tokens = self._observed.get(extension, (0, 0))
+        return (PRIOR_WEIGHT_BYTES + observed_bytes) / (PRIOR_WEIGHT_BYTES / prior_ratio + observed_tokens)
+
+    def estimate(self, file_name, size):
+        if not size or size <= 0:
+            return 0
+        return max(1, round(size / self.bytes_per_token(self._extension(file_name))))
+
+    def observe(self, file_name, size, tokens):
+        """Feeds an exact count back into the ratio of the file's extension."""
+        if not size or size <= 0 or not tokens or tokens <= 0:
+            return
+        with _token_estimator_lock:
+            sums = self._observed.setdefault(self._extension(file_name), [0, 0])
+            sums[0] += size
+            sums[1] += tokens
+            if sums[0] > MAX_OBSERVED_BYTES:
+                sums[0] //= 2
+                sums[1] = max(1, sums[1] // 2)
+            self.dirty = True
+
+    def to_dict(self):
+        return {"version": TOKEN_ESTIMATOR_VERSION, "observed": {ext: list(sums) for ext, sums in self._observed.items()}}
+
+    @classmethod
+    def from_dict(cls, payload):
+        if not isinstance(payload, dict) or payload.get("version") != TOKEN_ESTIMATOR_VERSION:
+            return cls()
+        return cls(payload.get("observed"))
+
+_token_estimator = None
+_token_estimator_lock = threading.Lock()
+
+def _estimator_file_path():
+    return os.path.join(get_app_cache_dir(TOKEN_ESTIMATOR_SUBDIR), TOKEN_ESTIMATOR_FILE_NAME)
+
+def get_token_estimator():
+    """Shared estimator, calibrated by the counts saved in earlier sessions if there are any."""
+    global _token_estimator
+    with _token_estimator_lock:
+        if _token_estimator is None:
+            try:
+                with open(_estimator_file_path(), 'r', encoding='utf-8') as f:
+                    _token_estimator = TokenEstimator.from_dict(json.load(f))
+            except (OSError, ValueError, TypeError):
+                _token_estimator = TokenEstimator()
+        return _token_estimator
+
+def save_token_estimator():
+    """Writes the calibration if it changed since the last save. Safe to call from any thread."""
+    with _token_estimator_lock:
+        estimator = _token_estimator
+        if estimator is None or not estimator.dirty:
+            return
+        payload = estimator.to_dict()
+        estimator.dirty = False
+    try:
+        file_path = _estimator_file_path()
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, file_path)
+    except OSError:
+        pass
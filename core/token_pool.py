@@ -0,0 +1,107 @@
+# core/token_pool.py
+# Пул процессов для подсчета токенов: каждый процесс держит свой загруженный токенизатор
+# и считает файлы пачками через batch-API бэкенда, поэтому подсчет не упирается в GIL
+# и не подтормаживает интерфейс.
+import os
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from core import file_processing
+from core.file_processing import (
+    initialize_tokenizer, check_file_for_token_count, calculate_content_hash, decode_text_bytes,
+    count_tokens_streaming, STREAMING_TOKENIZE_THRESHOLD_BYTES
+)
+
+TOKEN_POOL_CHUNK_FILES = 64
+TOKEN_POOL_CHUNK_BYTES = 8 * 1024 * 1024
+# Меньшие выборки быстрее посчитать в одном потоке, чем раздать по процессам.
+TOKEN_POOL_MIN_FILES = 32
+
+def default_token_worker_count():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+def _init_pool_worker(backend_name):
+    initialize_tokenizer(None, backend_name)
+
+def count_tokens_in_chunk(file_paths):
+    """
+    Runs inside a pool process. Returns one (path, tokens, error_message, size,
+    mtime_ns, content_hash) tuple per path, in order; the last three are None on error.
+    Small files go through the backend's batch API, large ones are streamed.
+    """
+    if file_processing.tokenizer is None:
+        error_msg = file_processing.tokenizer_initialization_error or "Токенизатор не инициализирован."
+        return [(path, None, error_msg, None, None, None) for path in file_paths]
+
+    results, texts, text_slots = [], [], []
+    for path in file_paths:
+        try:
+            st, encoding, error_msg = check_file_for_token_count(path)
+            if error_msg is None and st.st_size >= STREAMING_TOKENIZE_THRESHOLD_BYTES:
+                hasher = hashlib.sha256()
+                token_count = count_tokens_streaming(path, encoding, hasher)
+                results.append([path, token_count, None, st.st_size, st.st_mtime_ns, hasher.hexdigest()])
+                continue
+            if error_msg is None:
+                with open(path, 'rb') as f:
+                    raw_content = f.read()
+        except OSError:
+            st, error_msg = None, "ошибка чтения"
+        if error_msg is not None:
+            results.append([path, None, error_msg, None, None, None])
+            continue
+        results.append([path, 0, None, st.st_size, st.st_mtime_ns, calculate_content_hash(raw_content)])
+        content = decode_text_bytes(raw_content, encoding)
+        if content.strip():
+            texts.append(content)
+            text_slots.append(len(results) - 1)
+
+    for slot, token_count in zip(text_slots, file_processing.tokenizer.count_tokens_batch(texts)):
+        results[slot][1] = token_count
+    return [tuple(result) for result in results]
+
+def split_into_chunks(paths_with_sizes):
+    """Groups (path, size) pairs into chunks bounded by TOKEN_POOL_CHUNK_FILES and TOKEN_POOL_CHUNK_BYTES."""
+    chunks, current, current_bytes = [], [], 0
+    for path, size in paths_with_sizes:
+        if current and (len(current) >= TOKEN_POOL_CHUNK_FILES or current_bytes + size > TOKEN_POOL_CHUNK_BYTES):
+            chunks.append(current)
+            current, current_bytes = [], 0
+        current.append(path)
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+def get_token_pool(worker_count, backend_name):
+    """
+    Shared pool that stays warm between jobs; recreated when the worker count or
+    backend changes. Processes are spawned (not forked) so they never inherit Tk state.
+    """
+    global _pool, _pool_key
+    with _pool_lock:
+        key = (worker_count, backend_name)
+        if _pool is not None and _pool_key != key:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=worker_count, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pool_worker, initargs=(backend_name,)
+            )
+            _pool_key = key
+        return _pool
+
+def shutdown_token_pool():
+    """Stops the worker processes: when the app closes, or after a worker died so the next job starts afresh."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,417 @@
+# core/tree_model.py
+# Модель дерева файлов без Tk: узлы со __slots__, состояние чекбоксов, суммы токенов
+# папок и выделения. Treeview только отображает модель (см. treeview_logic.py),
+# поэтому модель можно проверять без дисплея.
+import os
+
+from core.treeview_constants import (
+    CHECKED_TAG, UNCHECKED_TAG, TRISTATE_TAG, DISABLED_LOOK_TAGS_UI,
+    TOO_MANY_TOKENS_TAG_UI, ERROR_TAG_UI, BINARY_TAG_UI
+)
+
+# Состояние чекбокса хранится числом; у папки счетчики детей лежат в списке по этим индексам.
+UNCHECKED = 0
+CHECKED = 1
+TRISTATE = 2
+CHECK_STATE_TAGS = (UNCHECKED_TAG, CHECKED_TAG, TRISTATE_TAG)
+_CHECK_STATE_BY_TAG = {tag: state for state, tag in enumerate(CHECK_STATE_TAGS)}
+_TOKEN_STATUS_TAGS = (TOO_MANY_TOKENS_TAG_UI, ERROR_TAG_UI, BINARY_TAG_UI)
+_NO_FILE_TOTALS = (0, 0, 0, 0)
+
+class TreeNode:
+    """
+    One file or folder. For a folder, tokens is the sum over its subtree and
+    estimated_files counts the files in it whose tokens are only estimated.
+    """
+    __slots__ = (
+        'item_id', 'parent', 'name', 'is_dir', 'is_file', 'size', 'mtime',
+        'tokens', 'tokens_estimated', 'status_msg', 'status_tags', 'check_state',
+        'children', 'estimated_files', 'child_check_counts'
+    )
+
+    def __init__(self, item_id, parent, status_tags, check_state, data):
+        self.item_id = item_id
+        self.parent = parent
+        self.name = data['name_only']
+        self.is_dir = bool(data.get('is_dir'))
+        self.is_file = bool(data.get('is_file'))
+        self.size = data.get('size', 0)
+        self.mtime = data.get('mtime', 0.0)
+        self.status_msg = data.get('status_msg', '')
+        self.status_tags = status_tags
+        self.check_state = check_state
+        if self.is_dir:
+            # Суммы папки складываются из детей по мере их добавления (в индексе они могут быть устаревшими).
+            self.tokens = 0
+            self.tokens_estimated = False
+            self.children = []
+            self.estimated_files = 0
+            self.child_check_counts = [0, 0, 0]
+        else:
+            self.tokens = data.get('tokens')
+            self.tokens_estimated = bool(data.get('tokens_estimated'))
+            self.children = None
+            self.estimated_files = 0
+            self.child_check_counts = None
+
+    @property
+    def parent_id(self):
+        return self.parent.item_id if self.parent is not None else ""
+
+    @property
+    def disabled(self):
+        """Binary or unreadable: such items are never selected."""
+        return not DISABLED_LOOK_TAGS_UI.isdisjoint(self.status_tags)
+
+    @property
+    def rel_path(self):
+        """Path relative to the project root, built from the names up the tree."""
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return os.sep.join(reversed(names))
+
+    def to_data(self, rel_path=None):
+        """
+        The node as a scan data dict (the format of scan_index and the watcher snapshot).
+        Pass rel_path when it is already known: computing it walks up to the root.
+        """
+        return {
+            'name_only': self.name, 'is_dir': self.is_dir, 'is_file': self.is_file,
+            'rel_path': self.rel_path if rel_path is None else rel_path, 'tokens': self.tokens, 'tokens_estimated': self.tokens_estimated,
+            'status_msg': self.status_msg, 'size': self.size, 'mtime': self.mtime
+        }
+
+def _sort_key(node):
+    return (not node.is_dir, node.name.lower())
+
+class TreeModel:
+    """
+    Nodes are indexed by item id (the absolute path). Every change keeps the
+    folder sums, the parents' check counters and the selected totals up to date
+    in O(depth) and records the ids whose rendering is stale in changed_ids.
+    structure_version grows whenever nodes are added or removed.
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.roots = []
+        self.selected_tokens_total = 0
+        self.selected_estimated_files = 0
+        self.changed_ids = set()
+        self.structure_version = 0
+
+    def clear(self):
+        self.nodes.clear()
+        self.roots = []
+        self.selected_tokens_total = self.selected_estimated_files = 0
+        self.changed_ids.clear()
+        self.structure_version += 1
+
+    def __contains__(self, item_id):
+        return item_id in self.nodes
+
+    def get(self, item_id):
+        return self.nodes.get(item_id)
+
+    def children(self, item_id):
+        """Child nodes in display order; "" stands for the top level."""
+        if item_id == "":
+            return self.roots
+        node = self.nodes.get(item_id)
+        if node is None or node.children is None:
+            return ()
+        return node.children
+
+    def iter_preorder(self, start_id=""):
+        """Yields nodes in display order (the start node itself excluded)."""
+        stack = list(reversed(self.children(start_id)))
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.children:
+                stack.extend(reversed(node.children))
+
+    def iter_rel_paths(self, include_roots=False):
+        """
+        Yields (node, rel_path) below the roots in display order; paths are joined
+        once per node, not per level. With include_roots the roots come too, with "".
+        """
+        stack = [(node, "") for node in reversed(self.roots)]
+        while stack:
+            node, rel_path = stack.pop()
+            if include_roots or node.parent is not None:
+                yield node, rel_path
+            if node.children:
+                prefix = rel_path + os.sep if rel_path else ""
+                stack.extend((child, prefix + child.name) for child in reversed(node.children))
+
+    @staticmethod
+    def is_checked_active_file(node):
+        return node.is_file and node.check_state == CHECKED and not node.disabled
+
+    def checked_file_ids(self):
+        """Ids of checked, non-disabled files in display order."""
+        return [node.item_id for node in self.iter_preorder() if self.is_checked_active_file(node)]
+
+    def export_nodes(self):
+        """(parent_id, item_id, status_tags, data_dict) tuples, parents before children."""
+        return [
+            (node.parent_id, node.item_id, node.status_tags, node.to_data(rel_path))
+            for node, rel_path in self.iter_rel_paths(include_roots=True)
+        ]
+
+    # --- Агрегаты ---
+
+    @staticmethod
+    def _check_key(node):
+        """Check state a node contributes to its parent's counters; None for disabled nodes."""
+        return None if node.disabled else node.check_state
+
+    def _file_totals(self, node):
+        """(tokens, estimated_files, selected_tokens, selected_estimated_files) a file adds to the aggregates."""
+        if not node.is_file:
+            return _NO_FILE_TOTALS
+        tokens = node.tokens if isinstance(node.tokens, (int, float)) and node.tokens > 0 else 0
+        estimated = 1 if tokens and node.tokens_estimated else 0
+        if self.is_checked_active_file(node):
+            return (tokens, estimated, tokens, estimated)
+        return (tokens, estimated, 0, 0)
+
+    def _snapshot(self, node):
+        return self._check_key(node), self._file_totals(node)
+
+    def _commit(self, node, snapshot):
+        """
+        Applies the difference between snapshot and the node's current state to its
+        parent's check counters, its ancestors' sums and the selected totals.
+        """
+        old_key, old_totals = snapshot
+        new_key = self._check_key(node)
+        parent = node.parent
+        if parent is not None and old_key != new_key:
+            if old_key is not None: parent.child_check_counts[old_key] -= 1
+            if new_key is not None: parent.child_check_counts[new_key] += 1
+        self._apply_totals_delta(parent, old_totals, self._file_totals(node))
+        self.changed_ids.add(node.item_id)
+
+    def _apply_totals_delta(self, parent, old_totals, new_totals):
+        delta_tokens, delta_estimated, delta_selected, delta_selected_estimated = (
+            new - old for new, old in zip(new_totals, old_totals)
+        )
+        if delta_tokens or delta_estimated:
+            while parent is not None:
+                parent.tokens += delta_tokens
+                parent.estimated_files += delta_estimated
+                parent.tokens_estimated = parent.estimated_files > 0
+                self.changed_ids.add(parent.item_id)
+                parent = parent.parent
+        self.selected_tokens_total += delta_selected
+        self.selected_estimated_files += delta_selected_estimated
+
+    # --- Структура ---
+
+    def _make_node(self, parent_id, item_id, tags, data):
+        if item_id in self.nodes or (parent_id and parent_id not in self.nodes):
+            return None
+        parent = self.nodes.get(parent_id) if parent_id else None
+        status_tags = tuple(tag for tag in tags if tag not in _CHECK_STATE_BY_TAG)
+        check_state = next((_CHECK_STATE_BY_TAG[tag] for tag in tags if tag in _CHECK_STATE_BY_TAG), UNCHECKED)
+        # Новый элемент наследует снятое выделение родителя, остальное выделение не трогаем.
+        if check_state == CHECKED and parent is not None and parent.check_state == UNCHECKED:
+            check_state = UNCHECKED
+        node = TreeNode(item_id, parent, status_tags, check_state, data)
+        self.nodes[item_id] = node
+        self.structure_version += 1
+        return node
+
+    def add(self, parent_id, item_id, tags, data):
+        """
+        Appends a node from scan data; returns it, or None if it exists or has no parent.
+        Like insert_sorted, a node added under an unchecked folder comes in unchecked.
+        """
+        node = self._make_node(parent_id, item_id, tags, data)
+        if node is None:
+            return None
+        self.children(parent_id).append(node)
+        self._commit(node, (None, _NO_FILE_TOTALS))
+        return node
+
+    def insert_sorted(self, parent_id, item_id, tags, data):
+        """
+        Inserts a node keeping the dirs-first, by-name order and re-derives the
+        ancestors' check states. Returns the position among the siblings or None.
+        """
+        parent = self.nodes.get(parent_id)
+        if parent is None or item_id in self.nodes:
+            return None
+        node = self._make_node(parent_id, item_id, tags, data)
+        siblings = parent.children
+        sort_key = _sort_key(node)
+        lo, hi = 0, len(siblings)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _sort_key(siblings[mid]) < sort_key:
+                lo = mid + 1
+            else:
+                hi = mid
+        siblings.insert(lo, node)
+        self._commit(node, (None, _NO_FILE_TOTALS))
+        self.update_ancestor_check_states(item_id)
+        return lo
+
+    def remove(self, item_id):
+        """Removes a node with its subtree; returns the removed ids or None if it is unknown."""
+        node = self.nodes.get(item_id)
+        if node is None:
+            return None
+        parent = node.parent
+        removed_key = self._check_key(node)
+        if parent is not None and removed_key is not None:
+            parent.child_check_counts[removed_key] -= 1
+        if node.is_dir:
+            removed_totals = (node.tokens, node.estimated_files, 0, 0)
+        else:
+            removed_totals = self._file_totals(node)[:2] + (0, 0)
+        self._apply_totals_delta(parent, removed_totals, _NO_FILE_TOTALS)
+
+        removed_ids = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            _, _, selected_tokens, selected_estimated = self._file_totals(current)
+            self.selected_tokens_total -= selected_tokens
+            self.selected_estimated_files -= selected_estimated
+            del self.nodes[current.item_id]
+            self.changed_ids.discard(current.item_id)
+            removed_ids.append(current.item_id)
+            if current.children:
+                stack.extend(current.children)
+
+        siblings = self.children(node.parent_id)
+        siblings.remove(node)
+        self.structure_version += 1
+        if parent is not None and siblings:
+            self.update_ancestor_check_states(siblings[0].item_id)
+        return removed_ids
+
+    # --- Изменение узлов ---
+
+    def refresh(self, item_id, status_tags, changed_fields):
+        """Applies a rescan of one item: status tags plus changed data fields (size, mtime, tokens...)."""
+        node = self.nodes.get(item_id)
+        if node is None:
+            return None
+        snapshot = self._snapshot(node)
+        for field_name, value in changed_fields.items():
+            if field_name == 'tokens' and node.is_dir:
+                continue  # Сумма папки ведется моделью.
+            setattr(node, field_name, value)
+        node.status_tags = tuple(status_tags)
+        self._commit(node, snapshot)
+        return node
+
+    def apply_token_count(self, item_id, tokens, status_msg, new_tags):
+        """Stores an exact count (tokens None on error) and its status tags; returns the node or None."""
+        node = self.nodes.get(item_id)
+        if node is None:
+            return None
+        snapshot = self._snapshot(node)
+        node.tokens = tokens
+        node.tokens_estimated = False
+        node.status_msg = status_msg
+        status_tags = set(node.status_tags)
+        status_tags.difference_update(_TOKEN_STATUS_TAGS)
+        status_tags.update(new_tags)
+        node.status_tags = tuple(status_tags)
+        self._commit(node, snapshot)
+        return node
+
+    def _set_check_state(self, node, state):
+        if node.check_state != state:
+            snapshot = self._snapshot(node)
+            node.check_state = state
+            self._commit(node, snapshot)
+
+    def set_subtree_check(self, item_id, is_checked):
+        """Checks or unchecks a node with everything below it; disabled items stay unchecked."""
+        node = self.nodes.get(item_id)
+        if node is None:
+            return
+        new_state = CHECKED if is_checked else UNCHECKED
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self._set_check_state(current, UNCHECKED if current.disabled else new_state)
+            if current.children:
+                stack.extend(current.children)
+
+    def set_all_checked(self, is_checked):
+        for root_node in list(self.roots):
+            self.set_subtree_check(root_node.item_id, is_checked)
+
+    def set_file_check_states(self, checked_by_id):
+        """Batch check/uncheck of files {item_id: bool}; folders are re-derived once at the end."""
+        changed_parents = set()
+        for item_id, is_checked in checked_by_id.items():
+            node = self.nodes.get(item_id)
+            if node is None:
+                continue
+            state = CHECKED if is_checked and not node.disabled else UNCHECKED
+            if node.check_state != state:
+                self._set_check_state(node, state)
+                if node.parent is not None:
+                    changed_parents.add(node.parent.item_id)
+        self.update_folder_check_states(changed_parents)
+
+    def _derive_folder_check_state(self, node):
+        """Sets a folder's check state from its child counters; returns True if it changed."""
+        unchecked_count, checked_count, tristate_count = node.child_check_counts
+        active_count = checked_count + unchecked_count + tristate_count
+        if active_count > 0 and checked_count == active_count:
+            new_state = CHECKED
+        elif active_count > 0 and unchecked_count != active_count:
+            new_state = TRISTATE
+        else:
+            new_state = UNCHECKED
+        if new_state == node.check_state:
+            return False
+        self._set_check_state(node, new_state)
+        return True
+
+    def update_ancestor_check_states(self, item_id):
+        """Re-derives the ancestors' check states from their child counters, O(depth)."""
+        node = self.nodes.get(item_id)
+        parent = node.parent if node is not None else None
+        while parent is not None:
+            self._derive_folder_check_state(parent)
+            parent = parent.parent
+
+    def update_folder_check_states(self, dir_ids):
+        """
+        Batch form of update_ancestor_check_states for many changed folders:
+        deepest folders go first and every folder is re-derived at most once.
+        """
+        by_depth = {}
+        for dir_id in dir_ids:
+            node = self.nodes.get(dir_id)
+            if node is not None:
+                by_depth.setdefault(self._depth(node), set()).add(node)
+        while by_depth:
+            depth = max(by_depth)
+            for node in by_depth.pop(depth):
+                if self._derive_folder_check_state(node) and node.parent is not None:
+                    by_depth.setdefault(depth - 1, set()).add(node.parent)
+
+    @staticmethod
+    def _depth(node):
+        depth = 0
+        while node.parent is not None:
+            node = node.parent
+            depth += 1
+        return depth
+
+    def drain_changed_ids(self):
+        changed_ids, self.changed_ids = self.changed_ids, set()
+        return changed_ids
@@ -18,4 +18,8 @@ BINARY_TAG_UI = "status_binary"
 LARGE_FILE_TAG_UI = "status_large_file"
 ERROR_TAG_UI = "status_error"
 EXCLUDED_BY_DEFAULT_TAG_UI = "status_excluded_default"
-TOO_MANY_TOKENS_TAG_UI = "status_too_many_tokens"
\ No newline at end of file
+TOO_MANY_TOKENS_TAG_UI = "status_too_many_tokens"
+
+# Элементы с этими тегами неактивны: их нельзя выделить.
+# Большие файлы (LARGE_FILE_TAG_UI) выделять можно: они токенизируются потоково.
+DISABLED_LOOK_TAGS_UI = frozenset({BINARY_TAG_UI, ERROR_TAG_UI})
@@ -5,54 +5,373 @@ from tkinter import ttk
 from pathlib import Path
 import threading
 import queue
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 
-from core.fs_scanner_utils import DISABLED_LOOK_TAGS_UI
-from core.treeview_scanner import scan_directory_and_populate_queue, token_calculation_worker
-from core.treeview_constants import (
-    CHECKED_TAG, UNCHECKED_TAG, TRISTATE_TAG,
-    CHECK_CHAR, UNCHECK_CHAR, TRISTATE_CHAR,
-    TOO_MANY_TOKENS_TAG_UI, ERROR_TAG_UI, BINARY_TAG_UI
+from core.fs_scanner_utils import (
+    DEFAULT_EXCLUSION_PROFILE,
+    get_active_exclusion_profile, set_active_exclusion_profile, get_scan_settings_key
 )
-
-tree_item_paths = {}
-tree_item_data = {}
+from core.treeview_scanner import (
+    restore_or_scan_directory, token_calculation_worker, WorkerJob, DEFAULT_SCAN_WORKERS
+)
+from core.scan_index import save_scan_index, save_sniff_verdicts
+from core.token_pool import default_token_worker_count
+from core.token_estimator import get_token_estimator, save_token_estimator
+from core.context_packer import pack_to_budget, PackCandidate, DEFAULT_PACK_PRIORITIES, FILE_BLOCK_OVERHEAD_TOKENS
+from core.fs_watcher import create_tree_watcher, build_watch_snapshot, DEFAULT_POLL_INTERVAL_SEC
+from core.treeview_constants import UNCHECKED_TAG, CHECK_CHAR, UNCHECK_CHAR, TRISTATE_CHAR, TOO_MANY_TOKENS_TAG_UI
+from core.tree_model import TreeModel, CHECKED, TRISTATE, UNCHECKED, CHECK_STATE_TAGS
+from core.path_index import PathIndex
+from core.selection_presets import capture_selection, apply_selection
+
+_CHECK_CHARS = {UNCHECKED: UNCHECK_CHAR, CHECKED: CHECK_CHAR, TRISTATE: TRISTATE_CHAR}
+# Сколько времени за один тик Tk тратится на разбор очереди, и пауза между тиками.
+QUEUE_DRAIN_BUDGET_SEC = 0.010
+QUEUE_BUSY_DELAY_MS = 1
+QUEUE_IDLE_DELAY_MS = 30
+
+# Модель дерева живет в Python (core/tree_model.py): Treeview содержит только строки раскрытых папок.
+PLACEHOLDER_IID_PREFIX = "__placeholder__"
+
+tree_model = TreeModel()
+# Индекс и вердикты пишет один поток: сохранения идут по очереди, а не наперегонки.
+_cache_save_executor = ThreadPoolExecutor(max_workers=1)
+CACHE_SAVE_POLL_MS = 200
+_materialized_items = set()
+_children_materialized = {""}
+_placeholder_ids = {}
+# Строки внутри свернутых папок при массовых изменениях не перерисовываются сразу, а при раскрытии.
+_stale_rows = set()
+_placeholder_counter = 0
+virtual_tree_enabled = True
 populate_thread = None
 token_thread = None
+scan_job = None
+token_job = None
 update_queue = queue.Queue()
+# Сообщения в очереди помечены номером задачи; сообщения завершенных/отмененных задач отбрасываются.
+_job_generations = itertools.count(1)
+_live_generations = set()
 gui_queue_processor_running = False
 last_processed_dir_path_str = None
+scan_worker_count = DEFAULT_SCAN_WORKERS
+token_worker_count = 1
+tree_watcher = None
+watch_mode_enabled = False
+watch_poll_interval = DEFAULT_POLL_INTERVAL_SEC
+# Закрепленные файлы (по абсолютному пути) первыми попадают в подбор под бюджет.
+pinned_paths = set()
+pack_priorities = DEFAULT_PACK_PRIORITIES
+# Сколько путей перечислять в логе (не вошедшие в бюджет, не найденные из набора выделения).
+LOG_REPORT_MAX_NAMES = 15
+PIN_MARK = "★ "
+# Индекс путей для фильтра строится по окончании сканирования и перестраивается при изменении дерева.
+path_index = None
+_path_index_version = None
+# Пока фильтр активен, в Treeview только найденные элементы и их папки.
+FILTER_MAX_SHOWN_MATCHES = 2000
+# Запрос короче этого не фильтрует: один символ есть почти в каждом пути.
+FILTER_MIN_QUERY_LENGTH = 2
+filter_query = ""
+filter_match_ids = None
+_unfiltered_open_ids = set()
+# normcase(корень проекта) -> {"active": имя, "presets": {имя: [относительные пути]}}
+selection_presets = {}
+# Выделение, снятое перед пересканированием того же проекта; восстанавливается по его окончании.
+_selection_to_restore = None
+exclusion_profiles = {DEFAULT_EXCLUSION_PROFILE.name: DEFAULT_EXCLUSION_PROFILE}
+project_exclusion_profiles = {}  # normcase(корень проекта) -> имя профиля
+
+def set_scan_worker_count(count):
+    """Sets how many threads list directories in parallel during a scan (1 = sequential)."""
+    global scan_worker_count
+    scan_worker_count = max(1, int(count))
+
+def set_token_worker_count(count):
+    """Processes used to count tokens of large selections; 0 = one per core but one, 1 = count in a thread."""
+    global token_worker_count
+    count = int(count)
+    token_worker_count = default_token_worker_count() if count <= 0 else count
+
+def set_pack_priorities(priorities):
+    """Order of the rules used by fit_selection_to_budget, e.g. ("pinned", "recent", "small")."""
+    global pack_priorities
+    pack_priorities = tuple(priorities)
+
+def _new_job():
+    job = WorkerJob(next(_job_generations), update_queue)
+    _live_generations.add(job.generation)
+    return job
+
+def _retire_job(job):
+    if job is not None:
+        job.cancel()
+        _live_generations.discard(job.generation)
+
+def set_exclusion_profiles(profiles, per_project_map):
+    """profiles: {name: ExclusionProfile}; per_project_map is kept by reference and updated on selection."""
+    global exclusion_profiles, project_exclusion_profiles
+    exclusion_profiles = dict(profiles)
+    project_exclusion_profiles = per_project_map
+
+def _apply_project_exclusion_profile(tree, root_path_str):
+    name = project_exclusion_profiles.get(os.path.normcase(root_path_str), DEFAULT_EXCLUSION_PROFILE.name) if root_path_str else DEFAULT_EXCLUSION_PROFILE.name
+    profile = exclusion_profiles.get(name, DEFAULT_EXCLUSION_PROFILE)
+    set_active_exclusion_profile(profile)
+    profile_var = getattr(tree, 'exclusion_profile_var_ref', None)
+    if profile_var is not None:
+        profile_var.set(profile.name)
+
+def set_project_exclusion_profile(profile_name, tree, log_widget, p_bar, p_label):
+    """Selects an exclusion profile for the currently shown project and rescans it."""
+    root_path_str = last_processed_dir_path_str
+    if profile_name not in exclusion_profiles:
+        return
+    if not root_path_str:
+        set_active_exclusion_profile(exclusion_profiles[profile_name])
+        return
+    if profile_name == DEFAULT_EXCLUSION_PROFILE.name:
+        project_exclusion_profiles.pop(os.path.normcase(root_path_str), None)
+    else:
+        project_exclusion_profiles[os.path.normcase(root_path_str)] = profile_name
+    if exclusion_profiles[profile_name] is get_active_exclusion_profile():
+        return
+    if log_widget and log_widget.winfo_exists():
+        log_widget.insert(tk.END, f"Профиль исключений: '{profile_name}'. Пересканирование...\n", ('info',))
+    populate_file_tree_threaded(root_path_str, tree, log_widget, p_bar, p_label, force_rescan=True)
+
+def set_virtual_tree_mode(enabled):
+    """In virtual mode rows are created only for children of folders the user expands."""
+    global virtual_tree_enabled
+    virtual_tree_enabled = bool(enabled)
+
+def _start_tree_watcher(log_widget_ref):
+    global tree_watcher
+    root_path_str = last_processed_dir_path_str
+    if tree_watcher is not None or not root_path_str or root_path_str not in tree_model:
+        return
+    snapshot = build_watch_snapshot(
+        root_path_str, ((parent_id, item_id, data) for parent_id, item_id, _, data in tree_model.export_nodes())
+    )
+    tree_watcher = create_tree_watcher(
+        root_path_str, snapshot, tree_model.get(root_path_str).mtime,
+        _new_job(), log_widget_ref, watch_poll_interval
+    )
+    tree_watcher.start()
+    if log_widget_ref and log_widget_ref.winfo_exists():
+        log_widget_ref.insert(tk.END, f"Наблюдение за изменениями включено ({type(tree_watcher).__name__}).\n", ('info',))
+
+def _stop_tree_watcher():
+    global tree_watcher
+    if tree_watcher is not None:
+        tree_watcher.stop()
+        _live_generations.discard(tree_watcher.update_queue.generation)
+        tree_watcher = None
+
+def set_watch_mode(enabled, tree, log_widget, p_bar, p_label, poll_interval=None):
+    """Turns live tree updates from the filesystem watcher on or off."""
+    global watch_mode_enabled, watch_poll_interval, gui_queue_processor_running
+    watch_mode_enabled = bool(enabled)
+    if poll_interval:
+        watch_poll_interval = float(poll_interval)
+
+    if not watch_mode_enabled:
+        _stop_tree_watcher()
+        return
+    if scan_job is not None and scan_job.generation in _live_generations:
+        return  # Наблюдатель запустится по завершении сканирования.
+    _start_tree_watcher(log_widget)
+    if tree_watcher is not None and not gui_queue_processor_running:
+        gui_queue_processor_running = True
+        tree.after_idle(lambda: _process_tree_updates(tree, p_bar, p_label, log_widget))
+
+def _children_shown(tree, folder_id, shown_cache):
+    """True if the rows of folder_id's children are on screen: the folder and all its ancestors are open."""
+    if folder_id == "":
+        return True
+    shown = shown_cache.get(folder_id)
+    if shown is None:
+        shown = (
+            tree.tk.getboolean(tree.item(folder_id, 'open'))
+            and _children_shown(tree, tree_model.get(folder_id).parent_id, shown_cache)
+        )
+        shown_cache[folder_id] = shown
+    return shown
+
+def _render_changed(tree):
+    """
+    Redraws the rows whose model nodes changed. Only rows on screen are painted;
+    rows hidden in collapsed folders are marked stale and painted when shown.
+    """
+    shown_cache = {}
+    for item_id in tree_model.drain_changed_ids():
+        if item_id not in _materialized_items:
+            continue
+        if _children_shown(tree, tree_model.get(item_id).parent_id, shown_cache):
+            _update_item_display(tree, item_id)
+        else:
+            _stale_rows.add(item_id)
+
+def _render_stale_rows_under(tree, folder_id):
+    """Paints stale rows that become visible when folder_id is expanded."""
+    if not _stale_rows:
+        return
+    stack = [folder_id]
+    while stack:
+        for child_node in tree_model.children(stack.pop()):
+            child_id = child_node.item_id
+            if child_id in _stale_rows:
+                _update_item_display(tree, child_id)
+            if child_node.children and child_id in _children_materialized and tree.tk.getboolean(tree.item(child_id, 'open')):
+                stack.append(child_id)
+
+def get_checked_file_ids():
+    """Ids of checked, non-disabled files in display order, taken from the model."""
+    return tree_model.checked_file_ids()
 
 def _update_item_display(tree, item_id):
     """Обновляет отображение элемента: текст в основной колонке и чекбокс во второй."""
-    if not tree.exists(item_id) or item_id not in tree_item_data:
+    if item_id not in _materialized_items:
         return
+    _stale_rows.discard(item_id)
 
-    data = tree_item_data[item_id]
-    tags = set(tree.item(item_id, 'tags'))
-    
-    if CHECKED_TAG in tags:
-        check_char = CHECK_CHAR
-    elif TRISTATE_TAG in tags:
-        check_char = TRISTATE_CHAR
-    else:
-        check_char = UNCHECK_CHAR
-
-    base_name = data.get('name_only', '')
-    token_count = data.get('tokens')
-    status_msg = data.get('status_msg', '')
-    is_dir = data.get('is_dir', False)
+    node = tree_model.get(item_id)
+    tags = node.status_tags + (CHECK_STATE_TAGS[node.check_state],)
 
     token_str = ""
-    if token_count is not None and token_count > 0:
-        if is_dir or (not is_dir and TOO_MANY_TOKENS_TAG_UI not in tags):
-             token_str = f" ({token_count:,} токенов)".replace(",", " ")
-
-    status_str = f" [{status_msg}]" if status_msg else ""
-    display_text = f"{base_name}{token_str}{status_str}"
-
-    tree.item(item_id, text=display_text)
-    tree.set(item_id, 'checkbox', check_char)
+    if node.tokens is not None and node.tokens > 0:
+        if node.is_dir or TOO_MANY_TOKENS_TAG_UI not in tags:
+             approx_mark = "~" if node.tokens_estimated else ""
+             token_str = f" ({approx_mark}{node.tokens:,} токенов)".replace(",", " ")
+
+    status_str = f" [{node.status_msg}]" if node.status_msg else ""
+    pin_str = PIN_MARK if item_id in pinned_paths else ""
+    display_text = f"{pin_str}{node.name}{token_str}{status_str}"
+
+    # Единственная колонка - чекбокс, поэтому строка обновляется одним вызовом Tk.
+    tree.item(item_id, text=display_text, tags=tags, values=(_CHECK_CHARS[node.check_state],))
+
+def _reset_model():
+    global filter_match_ids
+    tree_model.clear()
+    filter_match_ids = None
+    _unfiltered_open_ids.clear()
+    _materialized_items.clear(); _placeholder_ids.clear(); _stale_rows.clear()
+    _children_materialized.clear(); _children_materialized.add("")
+
+def _ensure_placeholder(tree, parent_id):
+    """Gives a materialised but collapsed folder a dummy child so the expand arrow shows."""
+    global _placeholder_counter
+    if parent_id in _materialized_items and parent_id not in _children_materialized and parent_id not in _placeholder_ids:
+        _placeholder_counter += 1
+        placeholder_id = f"{PLACEHOLDER_IID_PREFIX}{_placeholder_counter}"
+        tree.insert(parent_id, tk.END, iid=placeholder_id, text="...")
+        _placeholder_ids[parent_id] = placeholder_id
+
+def _materialize_node(tree, item_id, index=tk.END):
+    node = tree_model.get(item_id)
+    tree.insert(node.parent_id, index, iid=item_id, open=False)
+    _materialized_items.add(item_id)
+    _update_item_display(tree, item_id)
+    if not virtual_tree_enabled:
+        # Без виртуального режима строки детей, уже известных модели, создаются сразу.
+        _materialize_children(tree, item_id)
+    elif node.children:
+        _ensure_placeholder(tree, item_id)
+
+def _materialize_children(tree, parent_id):
+    if parent_id in _children_materialized or parent_id not in _materialized_items:
+        return
+    placeholder_id = _placeholder_ids.pop(parent_id, None)
+    if placeholder_id is not None:
+        tree.delete(placeholder_id)
+    _children_materialized.add(parent_id)
+    for child_node in tree_model.children(parent_id):
+        _materialize_node(tree, child_node.item_id)
+
+def on_tree_open(event, tree):
+    """<<TreeviewOpen>>: creates rows for the children of the folder being expanded."""
+    item_id = tree.focus()
+    if item_id in tree_model:
+        _materialize_children(tree, item_id)
+        _render_stale_rows_under(tree, item_id)
+
+def _show_new_child(tree, parent_id, item_id, index=tk.END):
+    if filter_match_ids is not None:
+        return  # Отфильтрованное дерево не пополняется; элемент появится после сброса фильтра.
+    if parent_id in _children_materialized:
+        _materialize_node(tree, item_id, index)
+    else:
+        _ensure_placeholder(tree, parent_id)
+
+def _add_node(tree, parent_id, item_id, tags, abs_path, node_data):
+    if tree_model.add(parent_id, item_id, tags, node_data) is not None:
+        _show_new_child(tree, parent_id, item_id)
+
+def _insert_node(tree, parent_id, item_id, tags, abs_path, node_data):
+    position = tree_model.insert_sorted(parent_id, item_id, tags, node_data)
+    if position is None:
+        return False
+    _show_new_child(tree, parent_id, item_id, position)
+    return True
+
+def _remove_node(tree, item_id):
+    if item_id not in tree_model:
+        return False
+    parent_id = tree_model.get(item_id).parent_id
+    if item_id in _materialized_items:
+        tree.delete(item_id)
+    for removed_id in tree_model.remove(item_id):
+        _materialized_items.discard(removed_id)
+        _stale_rows.discard(removed_id)
+        _children_materialized.discard(removed_id)
+        _placeholder_ids.pop(removed_id, None)
+    if not tree_model.children(parent_id) and parent_id in _placeholder_ids:
+        tree.delete(_placeholder_ids.pop(parent_id))
+    return True
+
+def _save_scan_index_async(tree, log_widget_ref):
+    """Saves the scan index and sniff verdicts off the Tk thread; a failed save is reported in the log."""
+    root_path_str = last_processed_dir_path_str
+    if not root_path_str or root_path_str not in tree_model:
+        return
+    nodes = tree_model.export_nodes()
+    profile_key = get_scan_settings_key()
+    future = _cache_save_executor.submit(_save_scan_caches, root_path_str, nodes, profile_key)
+
+    def report_save_result():
+        if not future.done():
+            if tree.winfo_exists():
+                tree.after(CACHE_SAVE_POLL_MS, report_save_result)
+            return
+        error = future.exception()
+        if error is not None and log_widget_ref and log_widget_ref.winfo_exists():
+            log_widget_ref.insert(tk.END, f"Не удалось сохранить индекс сканирования: {error}\n", ('warning',))
+    tree.after(CACHE_SAVE_POLL_MS, report_save_result)
+
+def _save_scan_caches(root_path_str, nodes, profile_key):
+    save_scan_index(root_path_str, nodes, profile_key)
+    save_sniff_verdicts(root_path_str)
+
+
+def _set_progress_visible(progress_bar, progress_label, visible):
+    cancel_button = getattr(progress_bar, 'cancel_button_ref', None)
+    if visible:
+        if progress_bar.winfo_exists(): progress_bar.grid(); progress_bar.start(10)
+        if progress_label.winfo_exists(): progress_label.grid(); progress_label.config(text="Сканирование...")
+        if cancel_button and cancel_button.winfo_exists(): cancel_button.grid()
+    else:
+        if progress_bar.winfo_exists(): progress_bar.stop(); progress_bar.grid_remove()
+        if progress_label.winfo_exists(): progress_label.grid_remove()
+        if cancel_button and cancel_button.winfo_exists(): cancel_button.grid_remove()
 
+def _apply_token_count(tree, item_id, tokens, status_msg, new_tags, fresh):
+    node = tree_model.apply_token_count(item_id, tokens, status_msg, new_tags)
+    # Ответы кэша уже учтены оценщиком, когда файл считался впервые.
+    if node is not None and fresh and tokens is not None and not new_tags:
+        get_token_estimator().observe(node.name, node.size, tokens)
 
 def _process_tree_updates(tree, progress_bar, progress_label, log_widget_ref):
     global gui_queue_processor_running
@@ -60,13 +379,14 @@ def _process_tree_updates(tree, progress_bar, progress_label, log_widget_ref):
         gui_queue_processor_running = False
         return
 
-    items_processed = 0
-    while items_processed < 200:
-        if update_queue.empty():
+    deadline = time.perf_counter() + QUEUE_DRAIN_BUDGET_SEC
+    while time.perf_counter() < deadline:
+        try:
+            generation, action, data = update_queue.get_nowait()
+        except queue.Empty:
             break
-        
-        action, data = update_queue.get()
-        items_processed += 1
+        if generation not in _live_generations:
+            continue
         
         if not tree.winfo_exists():
             gui_queue_processor_running = False
@@ -74,67 +394,77 @@ def _process_tree_updates(tree, progress_bar, progress_label, log_widget_ref):
 
         if action == "clear_tree":
             for item in tree.get_children(""): tree.delete(item)
-            tree_item_paths.clear(); tree_item_data.clear()
+            _reset_model()
         elif action == "progress_start":
-            if progress_bar.winfo_exists(): progress_bar.grid(); progress_bar.start(10)
-            if progress_label.winfo_exists(): progress_label.grid(); progress_label.config(text="Сканирование...")
+            _set_progress_visible(progress_bar, progress_label, True)
         elif action == "progress_step":
             if progress_label.winfo_exists(): progress_label.config(text=f"Обработка: {data[:45]}...")
         elif action == "add_node":
-            parent_id, item_id, tags, abs_path, node_data = data
-            if (parent_id == "" or tree.exists(parent_id)) and not tree.exists(item_id):
-                tree_item_paths[item_id] = abs_path
-                tree_item_data[item_id] = node_data
-                tree.insert(parent_id, tk.END, iid=item_id, open=False, tags=tags)
-                _update_item_display(tree, item_id)
+            _add_node(tree, *data)
+        elif action == "add_nodes":
+            for node_args in data:
+                _add_node(tree, *node_args)
+        elif action == "insert_node":
+            _insert_node(tree, *data)
+        elif action == "remove_node":
+            _remove_node(tree, data)
+        elif action == "refresh_node":
+            item_id, status_tags, changed_fields = data
+            tree_model.refresh(item_id, status_tags, changed_fields)
         elif action == "update_node_after_token_count":
-            item_id, tokens, status_msg, new_tags = data
-            if tree.exists(item_id) and item_id in tree_item_data:
-                tree_item_data[item_id]['tokens'] = tokens
-                tree_item_data[item_id]['status_msg'] = status_msg
-                
-                current_tags = set(tree.item(item_id, 'tags'))
-                current_tags.discard(TOO_MANY_TOKENS_TAG_UI)
-                current_tags.discard(ERROR_TAG_UI)
-                current_tags.discard(BINARY_TAG_UI)
-                current_tags.update(new_tags)
-                tree.item(item_id, tags=tuple(current_tags))
-
-                _update_item_display(tree, item_id)
+            _apply_token_count(tree, *data)
+        elif action == "update_nodes_after_token_count":
+            for token_result in data:
+                _apply_token_count(tree, *token_result)
         elif action == "recalculate_folder_tokens":
-            update_all_folder_tokens(tree)
+            # Суммы уже актуальны: осталось перерисовать папки и метку.
+            _render_changed(tree)
             update_selected_tokens_display(tree, getattr(tree, 'selected_tokens_label_ref', None))
         elif action == "log_message":
             if log_widget_ref and log_widget_ref.winfo_exists():
                 msg, tags = (data, ()) if isinstance(data, str) else data
                 log_widget_ref.insert(tk.END, f"{msg}\n", tags)
         elif action == "finished":
-            if progress_bar.winfo_exists(): progress_bar.stop(); progress_bar.grid_remove()
-            if progress_label.winfo_exists(): progress_label.grid_remove()
+            _live_generations.discard(generation)
+            _set_progress_visible(progress_bar, progress_label, False)
             
             finish_type = data
             tokens_label = getattr(tree, 'selected_tokens_label_ref', None)
 
             if finish_type == "initial_scan":
-                if tree.get_children(""): set_all_tree_check_state(tree, True, tokens_label)
+                if tree.get_children(""): _restore_selection_after_scan(tree, tokens_label, log_widget_ref)
+                _save_scan_index_async(tree, log_widget_ref)
+                _get_path_index()
+                if filter_query:
+                    apply_tree_filter(tree, filter_query)
                 if log_widget_ref and log_widget_ref.winfo_exists():
                     log_widget_ref.insert(tk.END, "Заполнение дерева завершено.\n", ('info',)); log_widget_ref.see(tk.END)
+                if watch_mode_enabled:
+                    _start_tree_watcher(log_widget_ref)
             elif finish_type == "token_count":
+                _save_scan_index_async(tree, log_widget_ref)
+                threading.Thread(target=save_token_estimator, daemon=True).start()
                 if log_widget_ref and log_widget_ref.winfo_exists():
                     log_widget_ref.insert(tk.END, "Обновление токенов завершено.\n", ('success',)); log_widget_ref.see(tk.END)
             
-            gui_queue_processor_running = False
-            return
+            if not _live_generations:
+                gui_queue_processor_running = False
+                return
+
+    # Строки и метка перерисовываются один раз за тик, а не на каждое изменение.
+    if tree_model.changed_ids:
+        _render_changed(tree)
+        update_selected_tokens_display(tree, getattr(tree, 'selected_tokens_label_ref', None))
 
+    if not _live_generations and update_queue.empty():
+        gui_queue_processor_running = False  # Все задачи отменены.
+        return
     if gui_queue_processor_running:
-        tree.after(30, lambda: _process_tree_updates(tree, progress_bar, progress_label, log_widget_ref))
+        delay_ms = QUEUE_IDLE_DELAY_MS if update_queue.empty() else QUEUE_BUSY_DELAY_MS
+        tree.after(delay_ms, lambda: _process_tree_updates(tree, progress_bar, progress_label, log_widget_ref))
 
 def populate_file_tree_threaded(dir_path, tree, log_widget, p_bar, p_label, force_rescan=False):
-    global populate_thread, gui_queue_processor_running, last_processed_dir_path_str
-    
-    if populate_thread and populate_thread.is_alive():
-        if log_widget.winfo_exists(): log_widget.insert(tk.END, "Процесс заполнения уже запущен...\n", ('info',))
-        return
+    global populate_thread, scan_job, token_job, gui_queue_processor_running, last_processed_dir_path_str, _selection_to_restore
 
     norm_path = str(Path(dir_path).resolve()) if dir_path and Path(dir_path).is_dir() else None
 
@@ -142,46 +472,61 @@ def populate_file_tree_threaded(dir_path, tree, log_widget, p_bar, p_label, forc
         if log_widget.winfo_exists(): log_widget.insert(tk.END, f"Директория '{Path(dir_path).name}' уже отображена.\n", ('info',))
         return
 
+    # Пересканирование того же проекта сохраняет выделение и закрепленные файлы;
+    # недостроенное дерево прерванного скана не в счет.
+    if norm_path != last_processed_dir_path_str:
+        _selection_to_restore = None
+        pinned_paths.clear()
+    elif tree_model.roots and not (scan_job is not None and scan_job.generation in _live_generations):
+        _selection_to_restore = capture_selection(tree_model)
+
+    if populate_thread and populate_thread.is_alive():
+        if log_widget.winfo_exists(): log_widget.insert(tk.END, "Предыдущее заполнение дерева отменено.\n", ('info',))
+    # Подсчет токенов ссылается на элементы старого дерева, поэтому тоже отменяется.
+    _retire_job(scan_job); _retire_job(token_job)
+    token_job = None
+    _stop_tree_watcher()
     while not update_queue.empty(): update_queue.get()
 
-    update_queue.put(("clear_tree", None))
+    scan_job = _new_job()
+    scan_job.put(("clear_tree", None))
     last_processed_dir_path_str = norm_path
+    _apply_project_exclusion_profile(tree, norm_path)
+    _refresh_selection_preset_choices(tree)
 
     if not norm_path:
         msg = f"Ошибка: '{dir_path}' не директория." if dir_path else "Выберите директорию."
         msg_data = {'name_only': msg, 'is_dir': False, 'is_file': False, 'status_msg': '', 'tokens': 0}
-        update_queue.put(("add_node", ("", "msg_node_invalid", ('message', UNCHECKED_TAG), "", msg_data)))
-        update_queue.put(("finished", "initial_scan"))
+        scan_job.put(("add_node", ("", "msg_node_invalid", ('message', UNCHECKED_TAG), "", msg_data)))
+        scan_job.put(("finished", "initial_scan"))
 
     if not gui_queue_processor_running:
         gui_queue_processor_running = True
         tree.after_idle(lambda: _process_tree_updates(tree, p_bar, p_label, log_widget))
 
     if norm_path:
-        populate_thread = threading.Thread(target=scan_directory_and_populate_queue, args=(norm_path, update_queue, log_widget), daemon=True)
+        populate_thread = threading.Thread(target=restore_or_scan_directory, args=(norm_path, scan_job, log_widget, scan_worker_count), daemon=True)
         populate_thread.start()
 
+def cancel_background_jobs(tree, log_widget, p_bar, p_label):
+    """Cancels the running scan and token count; their queued messages are dropped."""
+    global scan_job, token_job
+    running = [job for job in (scan_job, token_job) if job is not None and job.generation in _live_generations]
+    _retire_job(scan_job); _retire_job(token_job)
+    scan_job = token_job = None
+    _set_progress_visible(p_bar, p_label, False)
+    if log_widget and log_widget.winfo_exists():
+        if running:
+            log_widget.insert(tk.END, "Операция отменена. Дерево может быть заполнено не полностью.\n", ('warning',))
+        else:
+            log_widget.insert(tk.END, "Нет выполняющихся операций для отмены.\n", ('info',))
+        log_widget.see(tk.END)
+
 def update_selected_tokens_display(tree, label_widget):
+    """Shows the incrementally kept selected-tokens total; no tree walk."""
     if not label_widget or not label_widget.winfo_exists(): return
-    total_tokens = 0
-    
-    items_to_check = list(tree.get_children(""))
-    while items_to_check:
-        item_id = items_to_check.pop(0)
-        if not tree.exists(item_id) or item_id not in tree_item_data: continue
-        
-        tags = set(tree.item(item_id, 'tags'))
-        data = tree_item_data[item_id]
-        
-        if data.get('is_file') and CHECKED_TAG in tags and not DISABLED_LOOK_TAGS_UI.intersection(tags):
-            tokens = data.get('tokens')
-            if isinstance(tokens, (int, float)) and tokens > 0:
-                total_tokens += tokens
-        
-        items_to_check.extend(tree.get_children(item_id))
-            
-    if label_widget.winfo_exists():
-        label_widget.config(text=f"Выделено токенов: {int(total_tokens):,}".replace(",", " "))
+    approx_mark = "~" if tree_model.selected_estimated_files > 0 else ""
+    label_widget.config(text=f"Выделено токенов: {approx_mark}{int(tree_model.selected_tokens_total):,}".replace(",", " "))
 
 def on_tree_click(event, tree, tokens_label):
     # --- ФИНАЛЬНОЕ ИСПРАВЛЕНИЕ: Самый простой и надежный метод ---
@@ -195,127 +540,103 @@ def on_tree_click(event, tree, tokens_label):
 
     # 3. Если мы здесь, значит, клик был точно в колонке чекбоксов. Получаем ID строки.
     row_id = tree.identify_row(event.y)
-    if not row_id:
-        return # Клик был в пустом месте колонки
+    if not row_id or row_id not in tree_model:
+        return # Клик был в пустом месте колонки или по строке-заглушке
 
     # 4. Запускаем стандартную логику выделения.
-    tags = set(tree.item(row_id, 'tags'))
-    if DISABLED_LOOK_TAGS_UI.intersection(tags):
+    node = tree_model.get(row_id)
+    if node.disabled:
         return
         
-    is_checked = UNCHECKED_TAG in tags
-    
-    set_check_state_recursive(tree, row_id, is_checked)
-    _update_parent_check_state_recursive(tree, row_id)
+    tree_model.set_subtree_check(row_id, node.check_state == UNCHECKED)
+    tree_model.update_ancestor_check_states(row_id)
+    _render_changed(tree)
     update_selected_tokens_display(tree, tokens_label)
     # --- КОНЕЦ ИСПРАВЛЕНИЯ ---
 
-def set_check_state_recursive(tree, item_id, is_checked):
-    if not tree.exists(item_id): return
-    
-    tags = set(tree.item(item_id, 'tags'))
-    tags.discard(CHECKED_TAG); tags.discard(UNCHECKED_TAG); tags.discard(TRISTATE_TAG)
-    
-    if not DISABLED_LOOK_TAGS_UI.intersection(tags):
-        tags.add(CHECKED_TAG if is_checked else UNCHECKED_TAG)
-    
-    tree.item(item_id, tags=tuple(tags))
-    _update_item_display(tree, item_id)
-    
-    for child_id in tree.get_children(item_id):
-        set_check_state_recursive(tree, child_id, is_checked)
-
-def _update_parent_check_state_recursive(tree, item_id):
-    parent_id = tree.parent(item_id)
-    if not parent_id or not tree.exists(parent_id): return
-
-    children = tree.get_children(parent_id)
-    if not children: return
-
-    checked_count, unchecked_count, active_count = 0, 0, 0
-    for child_id in children:
-        if not tree.exists(child_id): continue
-        tags = set(tree.item(child_id, 'tags'))
-        if not DISABLED_LOOK_TAGS_UI.intersection(tags):
-            active_count += 1
-            if CHECKED_TAG in tags: checked_count += 1
-            elif UNCHECKED_TAG in tags: unchecked_count += 1
-
-    parent_tags = set(tree.item(parent_id, 'tags'))
-    parent_tags.discard(CHECKED_TAG); parent_tags.discard(UNCHECKED_TAG); parent_tags.discard(TRISTATE_TAG)
-
-    if active_count > 0:
-        if checked_count == active_count:
-            parent_tags.add(CHECKED_TAG)
-        elif unchecked_count == active_count:
-            parent_tags.add(UNCHECKED_TAG)
-        else:
-            parent_tags.add(TRISTATE_TAG)
-    
-    tree.item(parent_id, tags=tuple(parent_tags))
-    _update_item_display(tree, parent_id)
-    _update_parent_check_state_recursive(tree, parent_id)
-
 def set_all_tree_check_state(tree, is_checked, tokens_label):
-    for item_id in tree.get_children(""):
-        set_check_state_recursive(tree, item_id, is_checked)
+    tree_model.set_all_checked(is_checked)
+    _render_changed(tree)
     update_selected_tokens_display(tree, tokens_label)
 
-def update_all_folder_tokens(tree):
-    """Recursively calculates and updates token counts for all folders based on their children."""
-    
-    def _recursive_sum(item_id):
-        if not tree.exists(item_id) or item_id not in tree_item_data:
-            return 0
-        
-        data = tree_item_data[item_id]
-        if data.get('is_file'):
-            return data.get('tokens', 0) or 0
-
-        child_tokens = 0
-        for child_id in tree.get_children(item_id):
-            child_tokens += _recursive_sum(child_id)
-        
-        data['tokens'] = child_tokens
-        _update_item_display(tree, item_id)
-        return child_tokens
-
-    for item_id in tree.get_children(""):
-        _recursive_sum(item_id)
-
 def calculate_tokens_for_selected_threaded(tree, log_widget, p_bar, p_label):
-    global token_thread, gui_queue_processor_running
+    global token_thread, token_job, gui_queue_processor_running
 
-    if token_thread and token_thread.is_alive():
-        if log_widget.winfo_exists(): log_widget.insert(tk.END, "Процесс подсчета токенов уже запущен...\n", ('info',))
-        return
-
-    items_to_process = []
-    q = list(tree.get_children(""))
-    while q:
-        item_id = q.pop(0)
-        if not tree.exists(item_id) or item_id not in tree_item_data:
-            continue
-        
-        tags = set(tree.item(item_id, 'tags'))
-        data = tree_item_data[item_id]
-
-        if data.get('is_file') and CHECKED_TAG in tags and not DISABLED_LOOK_TAGS_UI.intersection(tags):
-            items_to_process.append(item_id)
-        
-        q.extend(tree.get_children(item_id))
+    items_to_process = get_checked_file_ids()
 
     if not items_to_process:
         if log_widget.winfo_exists(): log_widget.insert(tk.END, "Не выбрано файлов для подсчета токенов.\n", ('info',))
         return
 
-    token_thread = threading.Thread(target=token_calculation_worker, args=(items_to_process, update_queue, log_widget), daemon=True)
+    if token_thread and token_thread.is_alive():
+        if log_widget.winfo_exists(): log_widget.insert(tk.END, "Предыдущий подсчет токенов отменен, запускается новый...\n", ('info',))
+    _retire_job(token_job)
+    token_job = _new_job()
+    token_thread = threading.Thread(target=token_calculation_worker, args=(items_to_process, token_job, log_widget, token_worker_count), daemon=True)
     token_thread.start()
 
     if not gui_queue_processor_running:
         gui_queue_processor_running = True
         tree.after_idle(lambda: _process_tree_updates(tree, p_bar, p_label, log_widget))
 
+def toggle_pinned_item(event, tree):
+    """Right click on a file row pins it for fit_selection_to_budget or unpins it."""
+    row_id = tree.identify_row(event.y)
+    node = tree_model.get(row_id) if row_id else None
+    if node is None or not node.is_file:
+        return
+    if row_id in pinned_paths:
+        pinned_paths.discard(row_id)
+    else:
+        pinned_paths.add(row_id)
+    _update_item_display(tree, row_id)
+
+def fit_selection_to_budget(tree, budget_tokens, tokens_label, log_widget):
+    """
+    Re-checks the current selection (or every file if nothing is checked) so it fits
+    budget_tokens, using exact counts where known and size estimates elsewhere.
+    Files are picked by pack_priorities; the ones left out are reported in the log.
+    """
+    candidate_ids = get_checked_file_ids()
+    if not candidate_ids:
+        candidate_ids = [node.item_id for node in tree_model.iter_preorder() if node.is_file and not node.disabled]
+    if not candidate_ids:
+        if log_widget and log_widget.winfo_exists(): log_widget.insert(tk.END, "Нет файлов для подбора под бюджет.\n", ('info',))
+        return
+
+    estimator = get_token_estimator()
+    candidates = []
+    for item_id in candidate_ids:
+        node = tree_model.get(item_id)
+        tokens = node.tokens
+        if not isinstance(tokens, (int, float)) or tokens <= 0:
+            tokens = estimator.estimate(node.name, node.size)
+        candidates.append(PackCandidate(item_id, tokens + FILE_BLOCK_OVERHEAD_TOKENS, node.mtime, item_id in pinned_paths))
+    chosen, left_out, used_tokens = pack_to_budget(candidates, budget_tokens, pack_priorities)
+
+    # Состояния файлов меняются пачкой, папки пересчитываются один раз в конце.
+    chosen_ids = {candidate.item_id for candidate in chosen}
+    tree_model.set_file_check_states({candidate.item_id: candidate.item_id in chosen_ids for candidate in candidates})
+    _render_changed(tree)
+    update_selected_tokens_display(tree, tokens_label)
+
+    if log_widget and log_widget.winfo_exists():
+        budget_str = f"{int(budget_tokens):,}".replace(",", " ")
+        used_str = f"{int(used_tokens):,}".replace(",", " ")
+        log_widget.insert(tk.END, (
+            f"Подбор под бюджет {budget_str}: выбрано файлов {len(chosen)}, ~{used_str} токенов с обертками.\n"
+        ), ('success',))
+        if left_out:
+            left_out_names = [tree_model.get(candidate.item_id).rel_path for candidate in left_out]
+            more_str = f" и еще {len(left_out_names) - LOG_REPORT_MAX_NAMES}" if len(left_out_names) > LOG_REPORT_MAX_NAMES else ""
+            log_widget.insert(tk.END, (
+                f"Не вошли ({len(left_out)}): {', '.join(left_out_names[:LOG_REPORT_MAX_NAMES])}{more_str}\n"
+            ), ('warning',))
+            pinned_left_out = sum(1 for candidate in left_out if candidate.pinned)
+            if pinned_left_out:
+                log_widget.insert(tk.END, f"Закрепленных файлов не поместилось: {pinned_left_out}.\n", ('warning',))
+        log_widget.see(tk.END)
+
 def generate_project_structure_text(tree, root_dir_path, log_widget):
     if not root_dir_path or not Path(root_dir_path).is_dir():
         return "Структура не сгенерирована: неверная корневая директория."
@@ -323,37 +644,218 @@ def generate_project_structure_text(tree, root_dir_path, log_widget):
     root_path = Path(root_dir_path).resolve()
     structure_lines = [root_path.name]
     
-    root_id = None
-    for item_id in tree.get_children(""):
-        if tree_item_paths.get(item_id) == str(root_path):
-            root_id = item_id; break
-    
+    root_id = str(root_path) if str(root_path) in tree_model else None
     if not root_id: return "Структура не сгенерирована: не найден корень."
 
     def _generate_recursive(parent_id, prefix):
-        children_ids = []
-        if tree.exists(parent_id):
-            for child_id in tree.get_children(parent_id):
-                if tree.exists(child_id) and child_id in tree_item_data:
-                    tags = set(tree.item(child_id, 'tags'))
-                    data = tree_item_data[child_id]
-                    is_dir_sel = data.get('is_dir') and (CHECKED_TAG in tags or TRISTATE_TAG in tags)
-                    is_file_sel = data.get('is_file') and CHECKED_TAG in tags and not DISABLED_LOOK_TAGS_UI.intersection(tags)
-                    if is_dir_sel or is_file_sel: children_ids.append(child_id)
+        children = []
+        for child_node in tree_model.children(parent_id):
+            is_dir_sel = child_node.is_dir and child_node.check_state in (CHECKED, TRISTATE)
+            if is_dir_sel or tree_model.is_checked_active_file(child_node): children.append(child_node)
             
-            children_ids.sort(key=lambda cid: (not tree_item_data[cid]['is_dir'], tree_item_data[cid]['name_only'].lower()))
+        children.sort(key=lambda node: (not node.is_dir, node.name.lower()))
 
-        for i, child_id in enumerate(children_ids):
-            data = tree_item_data[child_id]
-            line = prefix + ("└── " if i == len(children_ids) - 1 else "├── ") + data['name_only']
-            if data['is_dir']: line += "/"
+        for i, child_node in enumerate(children):
+            line = prefix + ("└── " if i == len(children) - 1 else "├── ") + child_node.name
+            if child_node.is_dir: line += "/"
             structure_lines.append(line)
             
-            if data['is_dir']:
-                new_prefix = prefix + ("    " if i == len(children_ids) - 1 else "│   ")
-                _generate_recursive(child_id, new_prefix)
+            if child_node.is_dir:
+                new_prefix = prefix + ("    " if i == len(children) - 1 else "│   ")
+                _generate_recursive(child_node.item_id, new_prefix)
 
-    if CHECKED_TAG in tree.item(root_id, 'tags') or TRISTATE_TAG in tree.item(root_id, 'tags'):
+    if tree_model.get(root_id).check_state in (CHECKED, TRISTATE):
         _generate_recursive(root_id, "")
     
-    return "<file_map>\n" + "\n".join(structure_lines) + "\n</file_map>" if len(structure_lines) > 1 else "Структура не сгенерирована: нет выбранных элементов."
\ No newline at end of file
+    return "<file_map>\n" + "\n".join(structure_lines) + "\n</file_map>" if len(structure_lines) > 1 else "Структура не сгенерирована: нет выбранных элементов."
+
+def _get_path_index():
+    global path_index, _path_index_version
+    if path_index is None or _path_index_version != tree_model.structure_version:
+        path_index = PathIndex((node.item_id, rel_path) for node, rel_path in tree_model.iter_rel_paths())
+        _path_index_version = tree_model.structure_version
+    return path_index
+
+def _clear_rows(tree):
+    children = tree.get_children("")
+    if children:
+        tree.delete(*children)
+    _materialized_items.clear(); _placeholder_ids.clear(); _stale_rows.clear()
+    _children_materialized.clear(); _children_materialized.add("")
+
+def _show_filtered_rows(tree, match_ids):
+    """
+    Rows for the matches (up to FILTER_MAX_SHOWN_MATCHES) and their folders, in tree
+    order. Folders on the way to a match are expanded and list only what leads to
+    matches; a matched folder is collapsed and loads all its children on expand.
+    """
+    shown_ids, ancestor_ids = set(), set()
+    for item_id in match_ids[:FILTER_MAX_SHOWN_MATCHES]:
+        node = tree_model.get(item_id)
+        if node is None:
+            continue
+        shown_ids.add(item_id)
+        node = node.parent
+        while node is not None and node.item_id not in ancestor_ids:
+            ancestor_ids.add(node.item_id)
+            shown_ids.add(node.item_id)
+            node = node.parent
+    stack = [node for node in reversed(tree_model.roots) if node.item_id in shown_ids]
+    while stack:
+        node = stack.pop()
+        on_match_path = node.item_id in ancestor_ids
+        tree.insert(node.parent_id, tk.END, iid=node.item_id, open=on_match_path)
+        _materialized_items.add(node.item_id)
+        _update_item_display(tree, node.item_id)
+        if on_match_path:
+            _children_materialized.add(node.item_id)
+            stack.extend(child for child in reversed(node.children) if child.item_id in shown_ids)
+        elif node.children:
+            _ensure_placeholder(tree, node.item_id)
+
+def _show_unfiltered_rows(tree):
+    """The normal tree, with the folders that were expanded before filtering expanded again."""
+    for root_node in tree_model.roots:
+        _materialize_node(tree, root_node.item_id)
+    for node in tree_model.iter_preorder():
+        if node.item_id in _unfiltered_open_ids and node.item_id in _materialized_items:
+            _materialize_children(tree, node.item_id)
+            tree.item(node.item_id, open=True)
+    _unfiltered_open_ids.clear()
+
+def apply_tree_filter(tree, query):
+    """
+    Shows only the items whose path matches query (substring, glob or '~fuzzy', see
+    PathIndex.search) and their folders; an empty query or one shorter than
+    FILTER_MIN_QUERY_LENGTH restores the whole tree.
+    Returns (mode, match_count), or None when the filter was cleared.
+    """
+    global filter_query, filter_match_ids
+    filter_query = query.strip()
+    if len(filter_query) < FILTER_MIN_QUERY_LENGTH:
+        filter_query = ""
+        if filter_match_ids is not None:
+            filter_match_ids = None
+            _clear_rows(tree)
+            _show_unfiltered_rows(tree)
+        return None
+
+    if filter_match_ids is None:
+        _unfiltered_open_ids.update(
+            item_id for item_id in _children_materialized
+            if item_id and item_id in _materialized_items and tree.tk.getboolean(tree.item(item_id, 'open'))
+        )
+    mode, filter_match_ids = _get_path_index().search(filter_query)
+    _clear_rows(tree)
+    _show_filtered_rows(tree, filter_match_ids)
+    return mode, len(filter_match_ids)
+
+def check_filter_matches(tree, tokens_label):
+    """Checks every file the active filter matched, including files inside matched folders, in one batch."""
+    if not filter_match_ids:
+        return 0
+    file_ids = set()
+    for item_id in filter_match_ids:
+        node = tree_model.get(item_id)
+        if node is None:
+            continue
+        if node.is_file:
+            file_ids.add(item_id)
+        elif node.is_dir:
+            file_ids.update(child.item_id for child in tree_model.iter_preorder(item_id) if child.is_file)
+    tree_model.set_file_check_states(dict.fromkeys(file_ids, True))
+    _render_changed(tree)
+    update_selected_tokens_display(tree, tokens_label)
+    return len(file_ids)
+
+
+def set_selection_presets(per_project_map):
+    """per_project_map is kept by reference (it is saved with the app config) and updated in place."""
+    global selection_presets
+    selection_presets = per_project_map
+
+def _project_presets(create=False):
+    if not last_processed_dir_path_str:
+        return None
+    project_key = os.path.normcase(last_processed_dir_path_str)
+    if create:
+        return selection_presets.setdefault(project_key, {"active": None, "presets": {}})
+    return selection_presets.get(project_key)
+
+def get_selection_preset_names():
+    project_presets = _project_presets()
+    return sorted(project_presets["presets"]) if project_presets else []
+
+def _refresh_selection_preset_choices(tree):
+    preset_combobox = getattr(tree, 'selection_preset_combobox_ref', None)
+    if preset_combobox is None:
+        return
+    project_presets = _project_presets()
+    preset_combobox.config(values=get_selection_preset_names())
+    preset_combobox.set((project_presets or {}).get("active") or "")
+
+def _log_missing_preset_entries(log_widget, preset_label, missing_entries):
+    if not missing_entries or not log_widget or not log_widget.winfo_exists():
+        return
+    more_str = f" и еще {len(missing_entries) - LOG_REPORT_MAX_NAMES}" if len(missing_entries) > LOG_REPORT_MAX_NAMES else ""
+    log_widget.insert(tk.END, (
+        f"{preset_label}: не найдены в дереве ({len(missing_entries)}): "
+        f"{', '.join(missing_entries[:LOG_REPORT_MAX_NAMES])}{more_str}\n"
+    ), ('warning',))
+
+def _restore_selection_after_scan(tree, tokens_label, log_widget):
+    """After a scan: the selection from before the rescan, else the project's active preset, else everything."""
+    global _selection_to_restore
+    entries, preset_label = _selection_to_restore, "Прежнее выделение"
+    _selection_to_restore = None
+    if entries is None:
+        project_presets = _project_presets()
+        active_name = project_presets["active"] if project_presets else None
+        if active_name in (project_presets or {}).get("presets", {}):
+            entries, preset_label = project_presets["presets"][active_name], f"Набор '{active_name}'"
+    if entries is None:
+        set_all_tree_check_state(tree, True, tokens_label)
+        return
+    missing_entries = apply_selection(tree_model, entries)
+    _render_changed(tree)
+    update_selected_tokens_display(tree, tokens_label)
+    _log_missing_preset_entries(log_widget, preset_label, missing_entries)
+
+def save_selection_preset(tree, name, log_widget):
+    """Saves the current selection of the shown project under name (replacing a preset with that name)."""
+    name = name.strip()
+    project_presets = _project_presets(create=True) if name else None
+    if project_presets is None:
+        return False
+    entries = capture_selection(tree_model)
+    project_presets["presets"][name] = entries
+    project_presets["active"] = name
+    _refresh_selection_preset_choices(tree)
+    if log_widget and log_widget.winfo_exists():
+        log_widget.insert(tk.END, f"Набор выделения '{name}' сохранен ({len(entries)} записей).\n", ('success',))
+    return True
+
+def apply_selection_preset(tree, name, tokens_label, log_widget):
+    """Replaces the selection with a saved preset in one batch; entries missing from the tree are logged."""
+    project_presets = _project_presets()
+    if not project_presets or name not in project_presets["presets"]:
+        return False
+    missing_entries = apply_selection(tree_model, project_presets["presets"][name])
+    project_presets["active"] = name
+    _render_changed(tree)
+    update_selected_tokens_display(tree, tokens_label)
+    _log_missing_preset_entries(log_widget, f"Набор '{name}'", missing_entries)
+    return True
+
+def delete_selection_preset(tree, name, log_widget):
+    project_presets = _project_presets()
+    if not project_presets or project_presets["presets"].pop(name, None) is None:
+        return False
+    if project_presets["active"] == name:
+        project_presets["active"] = None
+    if not project_presets["presets"]:
+        selection_presets.pop(os.path.normcase(last_processed_dir_path_str), None)
+    _refresh_selection_preset_choices(tree)
+    if log_widget and log_widget.winfo_exists():
+        log_widget.insert(tk.END, f"Набор выделения '{name}' удален.\n", ('info',))
+    return True
@@ -1,78 +1,321 @@
 # core/treeview_scanner.py
 import os
+import sqlite3
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
 from core.fs_scanner_utils import (
-    should_exclude_item, get_item_status_info,
+    should_exclude_item, get_item_status_info, scan_directory_entries, get_scan_settings_key,
+    should_descend_directory, directory_key, get_symlink_policy, SYMLINK_FOLLOW,
     DISABLED_LOOK_TAGS_UI, TOO_MANY_TOKENS_STATUS_TAG,
     ERROR_STATUS_TAG, BINARY_STATUS_TAG
 )
-from core.vendor.gitignore_parser import Matcher
+from core.gitignore_rules import GitignoreRules
 from core.treeview_constants import CHECKED_TAG, UNCHECKED_TAG
-from core.file_processing import count_file_tokens, MAX_TOKENS_FOR_DISPLAY
+from core import file_processing
+from core.file_processing import count_file_tokens, wait_for_tokenizer, MAX_TOKENS_FOR_DISPLAY
+from core.scan_index import load_scan_index, load_sniff_verdicts
+from core.token_cache import get_token_cache
+from core.token_estimator import get_token_estimator
+from core.token_pool import (
+    get_token_pool, shutdown_token_pool, count_tokens_in_chunk, split_into_chunks, TOKEN_POOL_MIN_FILES
+)
 
-def _populate_recursive_scan(
-    cur_dir_obj: Path,
-    parent_id_str: str,
-    root_dir_obj: Path,
-    update_queue,
+DEFAULT_SCAN_WORKERS = 8
+ADD_NODES_BATCH_SIZE = 500
+# Статусы папок, в которые обход не заходит; по ним же индекс узнает, что проверять их не нужно.
+SYMLINK_NOT_FOLLOWED_MSG = "ссылка, не раскрыта"
+DUPLICATE_DIR_MSG = "уже показана"
+NOT_DESCENDED_DIR_MSGS = (SYMLINK_NOT_FOLLOWED_MSG, DUPLICATE_DIR_MSG)
+
+class JobCancelled(Exception):
+    """Raised inside a worker when it tries to report progress after being cancelled."""
+
+class WorkerJob:
+    """
+    Queue-like handle that one background job posts its messages through.
+    Every message is tagged with the job's generation id, so the GUI can drop
+    messages of jobs it no longer cares about. Once cancel() is called the next
+    put() raises JobCancelled, which unwinds the worker cooperatively.
+    """
+    def __init__(self, generation, update_queue):
+        self.generation = generation
+        self._update_queue = update_queue
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def put(self, message):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        action, data = message
+        self._update_queue.put((self.generation, action, data))
+
+def _list_directory_nodes(
+    cur_dir_path_str: str,
+    cur_rel_path: str,
     log_widget_ref,
     gitignore_matcher_func
 ):
-    update_queue.put(("progress_step", cur_dir_obj.name))
-
+    """
+    Lists and classifies one directory level. Safe to run on a pool worker.
+    Returns (nodes, error_message); nodes are (item_id, tags, data_dict) in display order.
+    """
     try:
-        if not (os.access(str(cur_dir_obj), os.R_OK) and os.access(str(cur_dir_obj), os.X_OK)):
-            raise PermissionError(f"Отказ в доступе к '{cur_dir_obj.name}'")
-        
-        items = sorted(cur_dir_obj.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower()))
-    except (PermissionError, OSError) as e:
-        perm_err_msg = str(e)
-        update_queue.put(("log_message", (f"LOG_REC_SCAN: ПРЕДУПРЕЖДЕНИЕ: {perm_err_msg}", ('warning',))))
-        update_queue.put(("update_node_data", (parent_id_str, 0, "ошибка доступа")))
-        return
+        entries = scan_directory_entries(cur_dir_path_str)
+    except OSError as e:
+        if isinstance(e, PermissionError):
+            return None, f"Отказ в доступе к '{os.path.basename(cur_dir_path_str)}'"
+        return None, str(e)
 
-    for item_path_obj in items:
-        item_name, is_dir, item_id_str = item_path_obj.name, item_path_obj.is_dir(), str(item_path_obj)
+    estimator = get_token_estimator()
+    nodes = []
+    for entry in entries:
+        item_name, is_dir, item_id_str = entry.name, entry.is_dir, entry.path
 
-        if should_exclude_item(item_path_obj, item_name, is_dir, gitignore_matcher_func):
+        if should_exclude_item(item_id_str, item_name, is_dir, gitignore_matcher_func):
             continue
 
-        status_tags, status_msg, file_tokens = get_item_status_info(item_path_obj, item_name, is_dir, log_widget_ref)
+        status_tags, status_msg, file_tokens = get_item_status_info(
+            item_id_str, item_name, is_dir, log_widget_ref, file_size=entry.size, file_mtime_ns=entry.mtime_ns
+        )
         
         if not DISABLED_LOOK_TAGS_UI.intersection(status_tags):
             status_tags.add(CHECKED_TAG)
         else:
             status_tags.add(UNCHECKED_TAG)
 
-        rel_path = str(item_path_obj.relative_to(root_dir_obj)) if root_dir_obj in item_path_obj.parents else item_name
+        # Пока токены не посчитаны, показывается оценка по размеру файла.
+        tokens_estimated = not is_dir and file_tokens == 0 and entry.size > 0
+        if tokens_estimated:
+            file_tokens = estimator.estimate(item_name, entry.size)
+
+        rel_path = cur_rel_path + os.sep + item_name if cur_rel_path else item_name
         data_dict = {
             'name_only': item_name, 'is_dir': is_dir, 'is_file': not is_dir,
-            'rel_path': rel_path, 'tokens': file_tokens,
-            'status_msg': status_msg
+            'rel_path': rel_path, 'tokens': file_tokens, 'tokens_estimated': tokens_estimated,
+            'status_msg': status_msg, 'size': entry.size, 'mtime': entry.mtime
         }
-        update_queue.put(("add_node", (parent_id_str, item_id_str, tuple(status_tags), str(item_path_obj), data_dict)))
-
         if is_dir:
-            _populate_recursive_scan(
-                item_path_obj, item_id_str, root_dir_obj, update_queue, log_widget_ref, gitignore_matcher_func
+            data_dict['dir_key'] = entry.dir_key
+            if entry.is_symlink:
+                data_dict['is_symlink'] = True
+        nodes.append((item_id_str, tuple(status_tags), data_dict))
+    return nodes, None
+
+class DirectoryLister:
+    """
+    Hands out directory listings to the scan thread. With more than one worker,
+    subdirectories are listed ahead of time on a bounded thread pool, so the
+    I/O latency of many directories overlaps while the emit order stays fixed.
+    """
+    def __init__(self, max_workers, log_widget_ref, gitignore_matcher_func):
+        self._list_args = (log_widget_ref, gitignore_matcher_func)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+        self._pending = {}
+
+    def prefetch(self, dir_path_str, rel_path):
+        if self._executor is not None and dir_path_str not in self._pending:
+            self._pending[dir_path_str] = self._executor.submit(
+                _list_directory_nodes, dir_path_str, rel_path, *self._list_args
             )
 
-def scan_directory_and_populate_queue(abs_dir_path_str, update_queue, log_widget_ref):
-    root_dir_obj = Path(abs_dir_path_str)
-    local_gitignore_matcher = None
+    def get(self, dir_path_str, rel_path):
+        future = self._pending.pop(dir_path_str, None)
+        if future is not None:
+            return future.result()
+        return _list_directory_nodes(dir_path_str, rel_path, *self._list_args)
 
-    gi_file = root_dir_obj / ".gitignore"
-    if gi_file.is_file():
-        try:
-            with gi_file.open('r', encoding='utf-8') as f:
-                lines = f.readlines()
-            base_dir = str(gi_file.parent.resolve())
-            local_gitignore_matcher = Matcher(lines, base_dir)
-        except Exception as e:
-            update_queue.put(("log_message", (f"Не удалось прочитать .gitignore: {e}", ('warning',))))
+    def close(self):
+        if self._executor is not None:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown(wait=True)
+
+def _not_descended_dir_msg(data_dict):
+    if data_dict.get('is_symlink') and get_symlink_policy() != SYMLINK_FOLLOW:
+        return SYMLINK_NOT_FOLLOWED_MSG
+    return DUPLICATE_DIR_MSG
+
+def _seed_visited_dir_keys(dir_path_str):
+    try:
+        return {directory_key(dir_path_str)}
+    except OSError:
+        return set()
+
+def _walk_and_populate(
+    start_dir_path_str: str,
+    start_rel_path: str,
+    update_queue,
+    lister,
+    listing_sink=None,
+    visited_dir_keys=None
+):
+    """
+    Walks the tree under start_dir_path_str with an explicit stack (no recursion
+    depth limit) and posts its nodes; start_dir_path_str itself is the parent id
+    of its children. visited_dir_keys holds (st_dev, st_ino) of directories
+    already entered, so symlink loops and duplicate mounts are walked only once.
+    """
+    if visited_dir_keys is None:
+        visited_dir_keys = _seed_visited_dir_keys(start_dir_path_str)
+
+    stack = [(start_dir_path_str, start_rel_path)]
+    while stack:
+        cur_dir_path_str, cur_rel_path = stack.pop()
+        update_queue.put(("progress_step", os.path.basename(cur_dir_path_str)))
+
+        nodes, error_msg = lister.get(cur_dir_path_str, cur_rel_path)
+        if error_msg is not None:
+            update_queue.put(("log_message", (f"LOG_REC_SCAN: ПРЕДУПРЕЖДЕНИЕ: {error_msg}", ('warning',))))
+            update_queue.put(("update_node_data", (cur_dir_path_str, 0, "ошибка доступа")))
+            continue
+        if listing_sink is not None:
+            listing_sink[cur_dir_path_str] = {item_id_str: data_dict for item_id_str, _, data_dict in nodes}
+
+        # Подпапки отдаем пулу заранее, пока выводится текущий уровень.
+        subdirs = []
+        for item_id_str, _, data_dict in nodes:
+            if not data_dict['is_dir']:
+                continue
+            if should_descend_directory(data_dict.get('is_symlink', False), data_dict.get('dir_key'), visited_dir_keys):
+                subdirs.append((item_id_str, data_dict['rel_path']))
+                lister.prefetch(item_id_str, data_dict['rel_path'])
+            elif not data_dict['status_msg']:
+                data_dict['status_msg'] = _not_descended_dir_msg(data_dict)
+
+        # Весь уровень уходит в GUI пачками, затем обходятся подпапки: родители по-прежнему
+        # вставляются раньше потомков, а порядок среди соседей сохраняется.
+        batch = [(cur_dir_path_str, item_id_str, status_tags, item_id_str, data_dict) for item_id_str, status_tags, data_dict in nodes]
+        for start in range(0, len(batch), ADD_NODES_BATCH_SIZE):
+            update_queue.put(("add_nodes", batch[start:start + ADD_NODES_BATCH_SIZE]))
+
+        stack.extend(reversed(subdirs))
+
+def load_gitignore_rules(root_dir_obj: Path, update_queue):
+    """Ignore rules for the whole tree under root_dir_obj; nested .gitignore files are read as the walk reaches them."""
+    def warn(message):
+        update_queue.put(("log_message", (message, ('warning',))))
+    return GitignoreRules(str(root_dir_obj), warn)
+
+def _strip_check_tags(tags):
+    return tuple(t for t in tags if t not in (CHECKED_TAG, UNCHECKED_TAG))
+
+def _drop_listing_subtree(children_by_dir, dir_id_str):
+    stack = [dir_id_str]
+    while stack:
+        children = children_by_dir.pop(stack.pop(), None)
+        if children:
+            stack.extend(child_id for child_id, child_data in children.items() if child_data['is_dir'])
+
+def patch_changed_directory(dir_id_str, rel_path, children_by_dir, update_queue, lister):
+    """
+    Re-lists one directory and posts only the differences against what
+    children_by_dir ({dir_id: {item_id: data_dict}}) knows about it: new entries
+    (with their subtrees), removed entries and files whose size/mtime changed.
+    children_by_dir is brought up to date along the way.
+    """
+    known_children = children_by_dir.get(dir_id_str, {})
+    visited_dir_keys = None
+    nodes, error_msg = lister.get(dir_id_str, rel_path)
+    if error_msg is not None:
+        update_queue.put(("log_message", (f"LOG_REC_SCAN: ПРЕДУПРЕЖДЕНИЕ: {error_msg}", ('warning',))))
+        return
+
+    fresh_children = {}
+    for item_id_str, status_tags, data_dict in nodes:
+        fresh_children[item_id_str] = data_dict
+        old_data = known_children.get(item_id_str)
+        if old_data is not None and old_data['is_dir'] != data_dict['is_dir']:
+            update_queue.put(("remove_node", item_id_str))
+            _drop_listing_subtree(children_by_dir, item_id_str)
+            old_data = None
+
+        if old_data is None:
+            if data_dict['is_dir']:
+                if visited_dir_keys is None:
+                    visited_dir_keys = _seed_visited_dir_keys(dir_id_str)
+                descend = should_descend_directory(data_dict.get('is_symlink', False), data_dict.get('dir_key'), visited_dir_keys)
+                if not descend and not data_dict['status_msg']:
+                    data_dict['status_msg'] = _not_descended_dir_msg(data_dict)
+            update_queue.put(("insert_node", (dir_id_str, item_id_str, status_tags, item_id_str, data_dict)))
+            if data_dict['is_dir'] and descend:
+                _walk_and_populate(
+                    item_id_str, data_dict['rel_path'], update_queue, lister, children_by_dir, visited_dir_keys
+                )
+        elif not data_dict['is_dir'] and (old_data.get('size'), old_data.get('mtime')) != (data_dict['size'], data_dict['mtime']):
+            changed_fields = {
+                'size': data_dict['size'], 'mtime': data_dict['mtime'],
+                'tokens': data_dict['tokens'], 'tokens_estimated': data_dict['tokens_estimated'],
+                'status_msg': data_dict['status_msg']
+            }
+            update_queue.put(("refresh_node", (item_id_str, _strip_check_tags(status_tags), changed_fields)))
 
+    for item_id_str, old_data in known_children.items():
+        if item_id_str not in fresh_children:
+            update_queue.put(("remove_node", item_id_str))
+            if old_data['is_dir']:
+                _drop_listing_subtree(children_by_dir, item_id_str)
+
+    children_by_dir[dir_id_str] = fresh_children
+
+def _restore_from_index_and_validate(abs_dir_path_str, index_nodes, update_queue, log_widget_ref, max_workers):
+    update_queue.put(("progress_start", None))
+
+    children_by_dir = {}
+    batch = []
+    for parent_id_str, item_id_str, status_tags, data_dict in index_nodes:
+        ui_tags = set(status_tags)
+        ui_tags.add(UNCHECKED_TAG if DISABLED_LOOK_TAGS_UI.intersection(ui_tags) else CHECKED_TAG)
+        batch.append((parent_id_str, item_id_str, tuple(ui_tags), item_id_str, data_dict))
+        if len(batch) >= ADD_NODES_BATCH_SIZE:
+            update_queue.put(("add_nodes", batch))
+            batch = []
+        children_by_dir.setdefault(parent_id_str, {})[item_id_str] = data_dict
+    if batch:
+        update_queue.put(("add_nodes", batch))
+
+    update_queue.put(("log_message", (f"Дерево восстановлено из индекса ({len(index_nodes)} элементов). Проверка изменений...", ('info',))))
+
+    gitignore_rules = load_gitignore_rules(Path(abs_dir_path_str), update_queue)
+    lister = DirectoryLister(max_workers, log_widget_ref, gitignore_rules)
+    changed_dirs_count = 0
+    try:
+        for _, item_id_str, status_tags, data_dict in index_nodes:
+            if not data_dict['is_dir']:
+                continue
+            if data_dict['status_msg'] in NOT_DESCENDED_DIR_MSGS:
+                continue
+            try:
+                dir_mtime = os.stat(item_id_str).st_mtime
+            except OSError:
+                continue  # Папка удалена: это обнаружится при проверке ее родителя.
+            if dir_mtime == data_dict.get('mtime'):
+                continue
+
+            changed_dirs_count += 1
+            update_queue.put(("progress_step", data_dict['name_only']))
+            patch_changed_directory(item_id_str, data_dict['rel_path'], children_by_dir, update_queue, lister)
+            update_queue.put(("refresh_node", (item_id_str, status_tags, {'mtime': dir_mtime})))
+    finally:
+        lister.close()
+
+    if changed_dirs_count:
+        update_queue.put(("log_message", (f"Индекс обновлен: изменившихся папок: {changed_dirs_count}.", ('info',))))
+    update_queue.put(("recalculate_folder_tokens", None))
+    update_queue.put(("finished", "initial_scan"))
+
+def scan_directory_and_populate_queue(abs_dir_path_str, update_queue, log_widget_ref, max_workers=DEFAULT_SCAN_WORKERS):
+    root_dir_obj = Path(abs_dir_path_str)
+    gitignore_rules = load_gitignore_rules(root_dir_obj, update_queue)
 
     update_queue.put(("progress_start", None))
     root_name, root_id = root_dir_obj.name, str(root_dir_obj)
@@ -81,22 +324,97 @@ def scan_directory_and_populate_queue(abs_dir_path_str, update_queue, log_widget
     
     root_data = {
         'name_only': root_name, 'is_dir': True, 'is_file': False, 'rel_path': "",
-        'tokens': 0, 'status_msg': root_status
+        'tokens': 0, 'status_msg': root_status, 'size': 0, 'mtime': os.stat(root_id).st_mtime
     }
     update_queue.put(("add_node", ("", root_id, tuple(root_ui_tags), str(root_dir_obj), root_data)))
 
-    _populate_recursive_scan(
-        root_dir_obj, root_id, root_dir_obj, update_queue, log_widget_ref, local_gitignore_matcher
-    )
+    lister = DirectoryLister(max_workers, log_widget_ref, gitignore_rules)
+    try:
+        _walk_and_populate(root_id, "", update_queue, lister)
+    finally:
+        lister.close()
     
     update_queue.put(("finished", "initial_scan"))
 
-def token_calculation_worker(item_ids_to_process, update_queue, log_widget_ref):
+def restore_or_scan_directory(abs_dir_path_str, job, log_widget_ref, max_workers=DEFAULT_SCAN_WORKERS):
+    """
+    Populates the tree from the on-disk scan index when one exists for this root and
+    then patches in directories whose mtime changed; falls back to a full scan otherwise.
+    job is the WorkerJob that messages go through; cancelling it stops the walk.
+    """
+    try:
+        load_sniff_verdicts(abs_dir_path_str)
+        index_nodes = load_scan_index(abs_dir_path_str, get_scan_settings_key())
+        if index_nodes is None:
+            scan_directory_and_populate_queue(abs_dir_path_str, job, log_widget_ref, max_workers)
+        else:
+            _restore_from_index_and_validate(abs_dir_path_str, index_nodes, job, log_widget_ref, max_workers)
+    except JobCancelled:
+        pass
+
+TOKEN_RESULTS_BATCH_SIZE = 200
+# Шаг прогресса (в процентах) внутри одного большого файла, который токенизируется потоково.
+LARGE_FILE_PROGRESS_STEP_PERCENT = 5
+_POOL_WAIT_SLICE_SEC = 0.2
+
+def token_calculation_worker(item_ids_to_process, job, log_widget_ref, token_workers=1):
     """
     Worker thread function to calculate tokens for a given list of file item IDs.
+    With token_workers > 1 and a large enough selection the files are tokenized
+    in the shared process pool (see core/token_pool.py).
+    """
+    token_cache = get_token_cache()
+    try:
+        use_pool = (
+            token_workers > 1 and len(item_ids_to_process) >= TOKEN_POOL_MIN_FILES
+            and wait_for_tokenizer() is None
+        )
+        if use_pool:
+            try:
+                _count_tokens_in_pool(item_ids_to_process, job, token_cache, token_workers)
+                return
+            except BrokenProcessPool:
+                shutdown_token_pool()
+                job.put(("log_message", ("Пул процессов токенизации недоступен, подсчет в одном потоке.", ('warning',))))
+        _count_tokens_for_items(item_ids_to_process, job, log_widget_ref, token_cache)
+    except JobCancelled:
+        pass
+    finally:
+        if token_cache is not None:
+            try:
+                token_cache.flush()
+            except sqlite3.Error:
+                pass
+        # GUI ждет "finished" при любом исходе, иначе задача так и считается идущей.
+        if not job.cancelled:
+            try:
+                job.put(("recalculate_folder_tokens", None))
+                job.put(("finished", "token_count"))
+            except JobCancelled:
+                pass
+
+def _token_count_event(item_id, token_val, token_err_msg, fresh=True):
     """
-    from core.treeview_logic import tree_item_paths 
+    (item_id, tokens, status_msg, status_tags, fresh) for the GUI; fresh is False
+    for counts answered by the token cache, which the estimator has already seen.
+    """
+    new_status_msg = ""
+    new_tags_to_add = set()
+
+    if token_err_msg:
+        new_status_msg = token_err_msg
+        if "бинарный" in token_err_msg:
+            new_tags_to_add.add(BINARY_STATUS_TAG)
+        else:
+            new_tags_to_add.add(ERROR_STATUS_TAG)
+    elif token_val is not None:
+        if token_val > MAX_TOKENS_FOR_DISPLAY:
+            new_tags_to_add.add(TOO_MANY_TOKENS_STATUS_TAG)
+            formatted_max = f"{MAX_TOKENS_FOR_DISPLAY:,}".replace(",", " ")
+            new_status_msg = f"токенов > {formatted_max}"
+    return (item_id, token_val, new_status_msg, new_tags_to_add, fresh)
 
+def _count_tokens_for_items(item_ids_to_process, update_queue, log_widget_ref, token_cache=None):
     update_queue.put(("progress_start", None))
     update_queue.put(("log_message", ("Начат подсчет токенов для выбранных файлов...", ('info',))))
     
@@ -105,32 +423,99 @@ def token_calculation_worker(item_ids_to_process, update_queue, log_widget_ref):
 
     for item_id in item_ids_to_process:
         processed_count += 1
-        file_path_str = tree_item_paths.get(item_id)
-        if not file_path_str:
-            continue
+        file_path_str = item_id  # id файла в дереве - его абсолютный путь
 
         file_path_obj = Path(file_path_str)
-        update_queue.put(("progress_step", f"({processed_count}/{total_count}) {file_path_obj.name}"))
+        progress_label = f"({processed_count}/{total_count}) {file_path_obj.name}"
+        update_queue.put(("progress_step", progress_label))
 
-        token_val, token_err_msg = count_file_tokens(file_path_str, log_widget_ref)
-        
-        new_status_msg = ""
-        new_tags_to_add = set()
-
-        if token_err_msg:
-            new_status_msg = token_err_msg
-            if "бинарный" in token_err_msg:
-                new_tags_to_add.add(BINARY_STATUS_TAG)
-            else:
-                new_tags_to_add.add(ERROR_STATUS_TAG)
-        elif token_val is not None:
-            if token_val > MAX_TOKENS_FOR_DISPLAY:
-                new_tags_to_add.add(TOO_MANY_TOKENS_TAG_UI)
-                formatted_max = f"{MAX_TOKENS_FOR_DISPLAY:,}".replace(",", " ")
-                new_status_msg = f"токенов > {formatted_max}"
-
-        update_queue.put(("update_node_after_token_count", (item_id, token_val, new_status_msg, new_tags_to_add)))
+        reported_percent = [0]
+        def report_file_progress(bytes_read, total_bytes):
+            percent = bytes_read * 100 // max(total_bytes, 1)
+            if percent >= reported_percent[0] + LARGE_FILE_PROGRESS_STEP_PERCENT:
+                reported_percent[0] = percent
+                update_queue.put(("progress_step", f"{progress_label}: {percent}%"))
+
+        token_val, token_err_msg, from_cache = count_file_tokens(
+            file_path_str, log_widget_ref, token_cache=token_cache, progress_callback=report_file_progress
+        )
+        update_queue.put(("update_node_after_token_count", _token_count_event(item_id, token_val, token_err_msg, not from_cache)))
+
+    update_queue.put(("log_message", ("Подсчет токенов для файлов завершен. Обновление папок...", ('info',))))
+
+def _count_tokens_in_pool(item_ids_to_process, update_queue, token_cache, token_workers):
+    """
+    Answers what it can from the token cache on this thread, sends the rest to the
+    process pool in chunks and streams results back as batched update events.
+    """
+    update_queue.put(("progress_start", None))
+    update_queue.put(("log_message", (f"Начат подсчет токенов для выбранных файлов ({token_workers} процессов)...", ('info',))))
+
+    tokenizer_backend = file_processing.tokenizer
+    total_count = len(item_ids_to_process)
+    events = []
+
+    def post_events(force=False):
+        while len(events) >= TOKEN_RESULTS_BATCH_SIZE or (force and events):
+            batch = events[:TOKEN_RESULTS_BATCH_SIZE]
+            del events[:TOKEN_RESULTS_BATCH_SIZE]
+            update_queue.put(("update_nodes_after_token_count", batch))
+
+    item_ids_by_path = {}
+    to_tokenize = []
+    for item_id in item_ids_to_process:
+        file_path_str = item_id  # id файла в дереве - его абсолютный путь
+        try:
+            st = os.stat(file_path_str)
+        except OSError:
+            to_tokenize.append((file_path_str, 0))
+            item_ids_by_path[file_path_str] = item_id
+            continue
+        cached_tokens = None
+        if token_cache is not None:
+            try:
+                cached_tokens = token_cache.lookup_by_stat(file_path_str, st.st_size, st.st_mtime_ns, tokenizer_backend.tokenizer_id)
+            except sqlite3.Error:
+                token_cache = None
+        if cached_tokens is not None:
+            events.append(_token_count_event(item_id, cached_tokens, None, fresh=False))
+        else:
+            to_tokenize.append((file_path_str, st.st_size))
+            item_ids_by_path[file_path_str] = item_id
+    processed_count = len(events)
+    post_events(force=True)
+
+    pool = get_token_pool(token_workers, tokenizer_backend.name)
+    chunks_by_future = {pool.submit(count_tokens_in_chunk, chunk): chunk for chunk in split_into_chunks(to_tokenize)}
+    pending = set(chunks_by_future)
+    try:
+        while pending:
+            if update_queue.cancelled:
+                raise JobCancelled()
+            done, pending = wait(pending, timeout=_POOL_WAIT_SLICE_SEC, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    chunk_results = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    # Сбой одной пачки не останавливает остальные: ее файлы помечаются ошибкой.
+                    update_queue.put(("log_message", (f"Ошибка подсчета токенов в процессе пула: {e}", ('error',))))
+                    chunk_results = [(path, None, "ошибка токенизации", None, None, None) for path in chunks_by_future[future]]
+                for path, token_val, token_err_msg, size, mtime_ns, content_hash in chunk_results:
+                    if token_cache is not None and token_err_msg is None:
+                        try:
+                            token_cache.remember_file(path, size, mtime_ns, content_hash)
+                            token_cache.store_tokens(content_hash, tokenizer_backend.tokenizer_id, token_val)
+                        except sqlite3.Error:
+                            token_cache = None
+                    events.append(_token_count_event(item_ids_by_path[path], token_val, token_err_msg))
+                    processed_count += 1
+            if done:
+                post_events(force=True)
+                update_queue.put(("progress_step", f"({processed_count}/{total_count})"))
+    finally:
+        for future in pending:
+            future.cancel()
 
     update_queue.put(("log_message", ("Подсчет токенов для файлов завершен. Обновление папок...", ('info',))))
-    update_queue.put(("recalculate_folder_tokens", None))
-    update_queue.put(("finished", "token_count"))
\ No newline at end of file
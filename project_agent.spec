@@ -5,8 +5,8 @@ a = Analysis(
     ['D:\\Projects\\project_agent\\core\\main.py'],
     pathex=['.'],
     binaries=[],
-    datas=[('D:\\Projects\\project_agent\\app_icon.ico', '.'), ('D:\\Projects\\project_agent\\doc\\diffmatchpatch_method.md', 'doc'), ('D:\\Projects\\project_agent\\doc\\git_method.md', 'doc'), ('D:\\Projects\\project_agent\\doc\\json_method.md', 'doc'), ('D:\\Projects\\project_agent\\doc\\markdown_method.md', 'doc')],
-    hiddenimports=['pyperclip', 'tkinter.ttk', 'diff_match_patch', 'fnmatch', 'transformers', 'transformers.models', 'transformers.tokenization_utils', 'transformers.tokenization_utils_fast', 'tokenizers', 'tokenizers.models', 'tokenizers.pre_tokenizers', 'tokenizers.processors', 'tokenizers.decoders', 'tokenizers.normalizers', 'safetensors', 'huggingface_hub', 'regex', 'requests', 'packaging', 'filelock', 'numpy', 'pyyaml', 'tqdm'],
+    datas=[('D:\\Projects\\project_agent\\app_icon.ico', '.'), ('D:\\Projects\\project_agent\\doc\\diffmatchpatch_method.md', 'doc'), ('D:\\Projects\\project_agent\\doc\\git_method.md', 'doc'), ('D:\\Projects\\project_agent\\doc\\json_method.md', 'doc'), ('D:\\Projects\\project_agent\\doc\\markdown_method.md', 'doc'), ('D:\\Projects\\project_agent\\tokenizer\\gpt2_vocab.bpe', 'tokenizer')],
+    hiddenimports=['pyperclip', 'tkinter.ttk', 'diff_match_patch', 'fnmatch', 'tiktoken', 'transformers', 'transformers.models', 'transformers.tokenization_utils', 'transformers.tokenization_utils_fast', 'tokenizers', 'tokenizers.models', 'tokenizers.pre_tokenizers', 'tokenizers.processors', 'tokenizers.decoders', 'tokenizers.normalizers', 'safetensors', 'huggingface_hub', 'regex', 'requests', 'packaging', 'filelock', 'numpy', 'pyyaml', 'tqdm'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,19 @@
+import hashlib
+from pathlib import Path
+
+from core.bpe_tokenizer import BytePairEncoder, load_bpe_ranks
+from core.fetch_tokenizer_vocab import GPT2_VOCAB_BPE_SHA256, GPT2_VOCAB_SIZE
+from core.file_processing import BUNDLED_BPE_VOCAB_RELATIVE_PATH
+
+VOCAB_PATH = Path(__file__).resolve().parent.parent / BUNDLED_BPE_VOCAB_RELATIVE_PATH
+
+
+def test_bundled_vocab_is_the_original_gpt2_file():
+    assert hashlib.sha256(VOCAB_PATH.read_bytes()).hexdigest() == GPT2_VOCAB_BPE_SHA256
+    assert len(load_bpe_ranks(VOCAB_PATH)) == GPT2_VOCAB_SIZE
+
+
+def test_bundled_vocab_counts_offline():
+    encoder = BytePairEncoder(load_bpe_ranks(VOCAB_PATH))
+    assert encoder.count_tokens("Hello world") == 2
+    assert encoder.count_tokens(" tokenization") == 2
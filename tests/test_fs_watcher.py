@@ -0,0 +1,137 @@
+import os
+import queue
+
+import pytest
+
+from core.fs_watcher import PollingWatcher, build_watch_snapshot
+from core.tree_model import CHECKED, UNCHECKED, TreeModel
+from core.treeview_scanner import WorkerJob, scan_directory_and_populate_queue
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+def _apply_messages(model, job_queue):
+    """Feeds queued worker messages into the model the way the GUI queue processor does."""
+    actions = []
+    while not job_queue.empty():
+        _generation, action, data = job_queue.get()
+        actions.append(action)
+        if action == "add_node":
+            parent_id, item_id, tags, _text, node_data = data
+            model.add(parent_id, item_id, tags, node_data)
+        elif action == "add_nodes":
+            for parent_id, item_id, tags, _text, node_data in data:
+                model.add(parent_id, item_id, tags, node_data)
+        elif action == "insert_node":
+            parent_id, item_id, tags, _text, node_data = data
+            model.insert_sorted(parent_id, item_id, tags, node_data)
+        elif action == "remove_node":
+            model.remove(data)
+        elif action == "refresh_node":
+            model.refresh(*data)
+    return actions
+
+
+def _touch_dir(path):
+    """Moves a directory's mtime forward so the poll sees it changed even on coarse clocks."""
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    (root / "a").mkdir(parents=True)
+    (root / "a" / "x.py").write_text("x = 1\n")
+    (root / "b.py").write_text("b = 2\n")
+    (root / "gone.py").write_text("gone = 3\n")
+    return root
+
+
+def _scan_and_watch(root):
+    job_queue = queue.Queue()
+    scan_directory_and_populate_queue(str(root), WorkerJob(1, job_queue), None, max_workers=1)
+    model = TreeModel()
+    _apply_messages(model, job_queue)
+    return model, job_queue
+
+
+def _start_watcher(model, root, job_queue):
+    snapshot = build_watch_snapshot(
+        str(root), ((parent_id, item_id, data) for parent_id, item_id, _, data in model.export_nodes())
+    )
+    return PollingWatcher(str(root), snapshot, model.get(str(root)).mtime, WorkerJob(2, job_queue), None)
+
+
+def test_snapshot_lists_children_of_every_scanned_dir(project):
+    model, _ = _scan_and_watch(project)
+    snapshot = build_watch_snapshot(
+        str(project), ((parent_id, item_id, data) for parent_id, item_id, _, data in model.export_nodes())
+    )
+    assert set(snapshot) == {str(project), str(project / "a")}
+    assert set(snapshot[str(project)]) == {str(project / "a"), str(project / "b.py"), str(project / "gone.py")}
+    assert snapshot[str(project / "a")][str(project / "a" / "x.py")]['rel_path'] == os.path.join("a", "x.py")
+
+
+def test_poll_reports_added_removed_and_modified_files(project):
+    model, job_queue = _scan_and_watch(project)
+    model.set_subtree_check(str(project / "b.py"), False)
+    watcher = _start_watcher(model, project, job_queue)
+
+    watcher.poll_once()
+    assert _apply_messages(model, job_queue) == []
+
+    (project / "c.py").write_text("c = 3\n")
+    (project / "gone.py").unlink()
+    (project / "b.py").write_text("b = 2\nb += 1\n")
+    _touch_dir(project)
+    watcher.poll_once()
+    actions = _apply_messages(model, job_queue)
+
+    assert sorted(actions) == ["insert_node", "refresh_node", "remove_node"]
+    assert str(project / "gone.py") not in model
+    assert [node.name for node in model.children(str(project))] == ["a", "b.py", "c.py"]
+    assert model.get(str(project / "b.py")).size == len("b = 2\nb += 1\n")
+    # Выделение пережило изменения: b.py остался снятым, новый файл выделен как соседи.
+    assert model.get(str(project / "b.py")).check_state == UNCHECKED
+    assert model.checked_file_ids() == [str(project / "a" / "x.py"), str(project / "c.py")]
+
+    watcher.poll_once()
+    assert _apply_messages(model, job_queue) == []
+
+
+def test_new_folder_inside_unchecked_folder_comes_in_unchecked(project):
+    model, job_queue = _scan_and_watch(project)
+    model.set_subtree_check(str(project / "a"), False)
+    selected_before = model.selected_tokens_total
+    watcher = _start_watcher(model, project, job_queue)
+
+    (project / "a" / "new").mkdir()
+    (project / "a" / "new" / "f.py").write_text("f = 1\n")
+    _touch_dir(project / "a")
+    watcher.poll_once()
+    _apply_messages(model, job_queue)
+
+    new_file = model.get(str(project / "a" / "new" / "f.py"))
+    assert new_file is not None and new_file.check_state == UNCHECKED
+    assert model.get(str(project / "a" / "new")).check_state == UNCHECKED
+    assert model.get(str(project / "a")).check_state == UNCHECKED
+    assert model.checked_file_ids() == [str(project / "b.py"), str(project / "gone.py")]
+    assert model.selected_tokens_total == selected_before
+
+
+def test_new_folder_inside_checked_folder_comes_in_checked(project):
+    model, job_queue = _scan_and_watch(project)
+    watcher = _start_watcher(model, project, job_queue)
+
+    (project / "a" / "new").mkdir()
+    (project / "a" / "new" / "f.py").write_text("f = 1\n")
+    _touch_dir(project / "a")
+    watcher.poll_once()
+    _apply_messages(model, job_queue)
+
+    assert model.get(str(project / "a" / "new")).check_state == CHECKED
+    assert str(project / "a" / "new" / "f.py") in model.checked_file_ids()
@@ -0,0 +1,62 @@
+import queue
+
+import pytest
+
+from core import file_processing, treeview_scanner
+from core.file_processing import STREAMING_TOKENIZE_THRESHOLD_BYTES, TokenizerBackend
+from core.tree_model import TreeModel
+from core.treeview_scanner import WorkerJob, scan_directory_and_populate_queue, token_calculation_worker
+
+
+class WordCountBackend(TokenizerBackend):
+    """One token per whitespace-separated word: exact across any safe split."""
+    name = "words"
+    tokenizer_id = "test-words"
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+
+@pytest.fixture
+def word_tokenizer(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(file_processing, "tokenizer", WordCountBackend())
+    monkeypatch.setattr(treeview_scanner, "get_token_cache", lambda: None)
+
+
+def _drain(job_queue):
+    messages = []
+    while not job_queue.empty():
+        _generation, action, data = job_queue.get()
+        messages.append((action, data))
+    return messages
+
+
+def test_file_over_4mb_is_selected_and_counted(word_tokenizer, tmp_path):
+    project = tmp_path / "project"
+    project.mkdir()
+    line = "insert into t values (1, 'abc');\n"
+    repeats = STREAMING_TOKENIZE_THRESHOLD_BYTES // len(line) + 1000
+    (project / "dump.sql").write_text(line * repeats)
+    (project / "small.py").write_text("print('hi')\n")
+
+    job_queue = queue.Queue()
+    scan_directory_and_populate_queue(str(project), WorkerJob(1, job_queue), None, max_workers=1)
+    model = TreeModel()
+    for action, data in _drain(job_queue):
+        for parent_id, item_id, tags, _text, node_data in {"add_node": [data], "add_nodes": data}.get(action, ()):
+            model.add(parent_id, item_id, tags, node_data)
+
+    big_id = str(project / "dump.sql")
+    assert not model.get(big_id).disabled
+    assert big_id in model.checked_file_ids()
+
+    token_calculation_worker(model.checked_file_ids(), WorkerJob(2, job_queue), None, token_workers=1)
+    messages = _drain(job_queue)
+    for action, data in messages:
+        if action == "update_node_after_token_count":
+            model.apply_token_count(*data[:4])
+
+    assert ("finished", "token_count") in messages
+    assert model.get(big_id).tokens == 6 * repeats
+    assert model.get(str(project / "small.py")).tokens == 1
@@ -0,0 +1,20 @@
+from core.path_index import MATCH_GLOB, MATCH_SUBSTRING, PathIndex
+
+
+def _index(paths):
+    return PathIndex((path, path) for path in paths)
+
+
+def test_double_star_matches_zero_directories():
+    index = _index(["src/test_x.py", "src/a/test_y.py", "lib/test_z.py"])
+    assert index.search("src/**/test_*") == (MATCH_GLOB, ["src/test_x.py", "src/a/test_y.py"])
+
+
+def test_leading_double_star_matches_top_level():
+    index = _index(["foo.py", "a/b/foo.py", "a/bar.py"])
+    assert index.search("**/foo*") == (MATCH_GLOB, ["foo.py", "a/b/foo.py"])
+
+
+def test_substring_lists_each_path_once():
+    index = _index(["aaa/aa.txt", "b.txt", "ca"])
+    assert index.search("a") == (MATCH_SUBSTRING, ["aaa/aa.txt", "ca"])
@@ -0,0 +1,45 @@
+import os
+import threading
+
+import pytest
+
+from core import scan_index
+from core.scan_index import load_scan_index, save_scan_index
+
+ROOT = os.sep + "project"
+
+
+def _nodes(file_count):
+    nodes = [("", ROOT, (), {'name_only': 'project', 'is_dir': True, 'tokens': 0})]
+    for i in range(file_count):
+        nodes.append((ROOT, os.path.join(ROOT, f"f{i}.py"), (), {'name_only': f"f{i}.py", 'is_dir': False, 'tokens': i}))
+    return nodes
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+
+def test_overlapping_saves_leave_one_complete_index():
+    threads = [threading.Thread(target=save_scan_index, args=(ROOT, _nodes(200 + i))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    loaded = load_scan_index(ROOT)
+    assert loaded is not None and 201 <= len(loaded) <= 208
+    index_dir = os.path.dirname(scan_index._index_file_path(ROOT))
+    assert [name for name in os.listdir(index_dir) if name.endswith(".tmp")] == []
+
+
+def test_failed_write_raises_and_leaves_no_temp_file(monkeypatch):
+    def failing_dump(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(scan_index.json, "dump", failing_dump)
+
+    with pytest.raises(OSError):
+        save_scan_index(ROOT, _nodes(1))
+    index_dir = os.path.dirname(scan_index._index_file_path(ROOT))
+    assert os.listdir(index_dir) == []
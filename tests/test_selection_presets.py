@@ -0,0 +1,38 @@
+from core.selection_presets import apply_selection, capture_selection
+from core.tree_model import TreeModel
+from core.treeview_constants import CHECKED_TAG, UNCHECKED_TAG
+
+
+def _model(file_paths):
+    model = TreeModel()
+    model.add("", "/p", (CHECKED_TAG,), {'name_only': 'p', 'is_dir': True})
+    for rel_path in file_paths:
+        parent_id = "/p"
+        *dir_names, file_name = rel_path.split("/")
+        for dir_name in dir_names:
+            dir_id = f"{parent_id}/{dir_name}"
+            if dir_id not in model:
+                model.add(parent_id, dir_id, (UNCHECKED_TAG,), {'name_only': dir_name, 'is_dir': True})
+            parent_id = dir_id
+        model.add(parent_id, f"{parent_id}/{file_name}", (UNCHECKED_TAG,),
+                  {'name_only': file_name, 'is_file': True, 'tokens': 1})
+    return model
+
+
+def test_preset_round_trip():
+    model = _model(["a/x.py", "a/y.py", "b/z.py", "top.md"])
+    missing = apply_selection(model, ["a/", "top.md", "gone.py"])
+    assert missing == ["gone.py"]
+    assert model.checked_file_ids() == ["/p/a/x.py", "/p/a/y.py", "/p/top.md"]
+    assert capture_selection(model) == ["a/", "top.md"]
+
+
+def test_apply_touches_only_files_that_differ():
+    model = _model(["a/x.py", "a/y.py", "b/z.py"])
+    apply_selection(model, ["a/x.py", "b/z.py"])
+    model.drain_changed_ids()
+    apply_selection(model, ["a/x.py", "a/y.py"])
+    changed = model.drain_changed_ids()
+    assert "/p/a/x.py" not in changed
+    assert {"/p/a/y.py", "/p/b/z.py"} <= changed
+    assert model.checked_file_ids() == ["/p/a/x.py", "/p/a/y.py"]
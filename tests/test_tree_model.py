@@ -0,0 +1,174 @@
+import os
+
+import pytest
+
+from core.scan_index import load_scan_index, save_scan_index
+from core.tree_model import CHECKED, TRISTATE, UNCHECKED, TreeModel
+from core.treeview_constants import BINARY_TAG_UI, CHECKED_TAG, ERROR_TAG_UI, UNCHECKED_TAG
+
+ROOT = os.sep + "p"
+
+
+def _id(rel_path):
+    return os.path.join(ROOT, *rel_path.split("/")) if rel_path else ROOT
+
+
+def _data(name, is_dir, tokens=None, rel_path=""):
+    data = {'name_only': name, 'is_dir': is_dir, 'is_file': not is_dir, 'rel_path': rel_path,
+            'status_msg': '', 'size': 10, 'mtime': 1.0}
+    if not is_dir:
+        data['tokens'] = tokens
+    return data
+
+
+def _build(files, checked=True):
+    """files: {rel_path: tokens}; folders are created on the way, in the order given."""
+    model = TreeModel()
+    check_tag = CHECKED_TAG if checked else UNCHECKED_TAG
+    model.add("", ROOT, (check_tag,), _data("p", True))
+    for rel_path, tokens in files.items():
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts)):
+            dir_rel = "/".join(parts[:depth])
+            if _id(dir_rel) not in model:
+                model.add(_id("/".join(parts[:depth - 1])), _id(dir_rel), (check_tag,), _data(parts[depth - 1], True))
+        model.add(_id("/".join(parts[:-1])), _id(rel_path), (check_tag,), _data(parts[-1], False, tokens))
+    return model
+
+
+def _assert_consistent(model):
+    """Recomputes every aggregate from scratch and compares it with the incremental one."""
+    selected_total = 0
+    for node in model.iter_preorder():
+        if node.is_dir:
+            files = [child for child in model.iter_preorder(node.item_id) if child.is_file]
+            assert node.tokens == sum(f.tokens or 0 for f in files), node.item_id
+            counts = [0, 0, 0]
+            for child in node.children:
+                if not child.disabled:
+                    counts[child.check_state] += 1
+            assert node.child_check_counts == counts, node.item_id
+        elif model.is_checked_active_file(node):
+            selected_total += node.tokens or 0
+    assert model.selected_tokens_total == selected_total
+
+
+def test_add_inherits_unchecked_parent():
+    model = _build({"a/x.py": 1})
+    model.set_subtree_check(_id("a"), False)
+    model.add(_id("a"), _id("a/y.py"), (CHECKED_TAG,), _data("y.py", False, 5))
+    assert model.get(_id("a/y.py")).check_state == UNCHECKED
+    assert model.checked_file_ids() == []
+    _assert_consistent(model)
+
+
+def test_insert_sorted_keeps_order_and_inherits():
+    model = _build({"a/x.py": 1, "b.py": 2})
+    model.set_subtree_check(_id("a"), False)
+    assert model.insert_sorted(_id("a"), _id("a/w.py"), (CHECKED_TAG,), _data("w.py", False, 3)) == 0
+    assert model.get(_id("a/w.py")).check_state == UNCHECKED
+    # Папки идут перед файлами, а новая выделенная папка в частично выделенном корне остается выделенной.
+    assert model.insert_sorted(ROOT, _id("c"), (CHECKED_TAG,), _data("c", True)) == 1
+    assert [node.name for node in model.children(ROOT)] == ["a", "c", "b.py"]
+    assert model.get(_id("c")).check_state == CHECKED
+    assert model.get(ROOT).check_state == TRISTATE
+    _assert_consistent(model)
+
+
+def test_set_subtree_check_updates_children_and_ancestors():
+    model = _build({"a/b/x.py": 1, "a/y.py": 2, "z.py": 4})
+    model.set_subtree_check(_id("a/b"), False)
+    model.update_ancestor_check_states(_id("a/b"))
+    assert model.get(_id("a/b/x.py")).check_state == UNCHECKED
+    assert model.get(_id("a")).check_state == TRISTATE
+    assert model.get(ROOT).check_state == TRISTATE
+    assert model.selected_tokens_total == 6
+
+    model.set_subtree_check(ROOT, True)
+    assert all(node.check_state == CHECKED for node in model.iter_preorder())
+    assert model.selected_tokens_total == 7
+    _assert_consistent(model)
+
+
+def test_set_subtree_check_leaves_disabled_items_unchecked():
+    model = _build({"a/x.py": 1})
+    model.add(_id("a"), _id("a/img.png"), (UNCHECKED_TAG, BINARY_TAG_UI), _data("img.png", False))
+    model.set_subtree_check(_id("a"), True)
+    assert model.get(_id("a/img.png")).check_state == UNCHECKED
+    assert model.get(_id("a")).check_state == CHECKED
+    _assert_consistent(model)
+
+
+def test_set_file_check_states_rederives_folders():
+    model = _build({"a/x.py": 1, "a/y.py": 2, "b/z.py": 4}, checked=False)
+    model.set_file_check_states({_id("a/x.py"): True, _id("b/z.py"): True})
+    assert model.get(_id("a")).check_state == TRISTATE
+    assert model.get(_id("b")).check_state == CHECKED
+    assert model.get(ROOT).check_state == TRISTATE
+
+    model.set_file_check_states({_id("a/y.py"): True})
+    assert model.get(_id("a")).check_state == CHECKED
+    assert model.get(ROOT).check_state == CHECKED
+    assert model.selected_tokens_total == 7
+    _assert_consistent(model)
+
+
+def test_remove_keeps_totals_and_counts():
+    model = _build({"a/b/x.py": 1, "a/y.py": 2, "z.py": 4})
+    model.set_file_check_states({_id("a/y.py"): False})
+    removed = model.remove(_id("a/b"))
+    assert set(removed) == {_id("a/b"), _id("a/b/x.py")}
+    assert _id("a/b/x.py") not in model
+    assert model.get(ROOT).tokens == 6
+    assert model.selected_tokens_total == 4
+    # В "a" остался только снятый y.py, поэтому папка и ее родитель пересчитаны.
+    assert model.get(_id("a")).check_state == UNCHECKED
+    assert model.get(ROOT).check_state == TRISTATE
+    _assert_consistent(model)
+
+    model.remove(_id("z.py"))
+    assert model.get(ROOT).tokens == 2
+    assert model.selected_tokens_total == 0
+    _assert_consistent(model)
+
+
+def test_apply_token_count_updates_totals():
+    model = _build({"a/x.py": None, "a/y.py": 2})
+    model.get(_id("a/x.py")).tokens_estimated = True
+    model.apply_token_count(_id("a/x.py"), 10, "", set())
+    node = model.get(_id("a/x.py"))
+    assert (node.tokens, node.tokens_estimated) == (10, False)
+    assert model.get(_id("a")).tokens == 12
+    assert model.get(ROOT).tokens == 12
+    assert model.selected_tokens_total == 12
+
+    model.apply_token_count(_id("a/y.py"), None, "ошибка чтения", {ERROR_TAG_UI})
+    assert model.get(_id("a/y.py")).disabled
+    assert model.get(ROOT).tokens == 10
+    assert model.selected_tokens_total == 10
+    _assert_consistent(model)
+
+
+def test_export_nodes_round_trips_through_scan_index(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    model = _build({"a/b/x.py": 1, "a/y.py": 2, "z.py": 4})
+    exported = model.export_nodes()
+    assert [item_id for _, item_id, _, _ in exported] == [node.item_id for node in model.iter_preorder()]
+    assert exported[3][3]['rel_path'] == os.path.join("a", "b", "x.py")
+
+    save_scan_index(ROOT, exported, "profile")
+    loaded = load_scan_index(ROOT, "profile")
+    assert load_scan_index(ROOT, "another-profile") is None
+
+    restored = TreeModel()
+    for parent_id, item_id, status_tags, data in loaded:
+        restored.add(parent_id, item_id, tuple(status_tags) + (CHECKED_TAG,), data)
+    assert restored.export_nodes() == exported
+    _assert_consistent(restored)
+
+
+@pytest.mark.parametrize("rel_path", ["a", "a/b", "a/b/x.py"])
+def test_rel_path_matches_iter_rel_paths(rel_path):
+    model = _build({"a/b/x.py": 1})
+    paths = dict((node.item_id, path) for node, path in model.iter_rel_paths())
+    assert model.get(_id(rel_path)).rel_path == paths[_id(rel_path)] == os.path.join(*rel_path.split("/"))